@@ -0,0 +1,215 @@
+"""
+Batched delivery of anomaly alerts to Alertmanager.
+
+The detection loop hands anomalies to an AlertDispatcher instead of posting
+them one at a time. The dispatcher buffers them and a background task posts
+each batch as a single ``/api/v2/alerts`` array, either every
+ALERT_FLUSH_INTERVAL_SECONDS or as soon as ALERT_BATCH_SIZE anomalies are
+waiting. Connection errors, 429 and 5xx responses are retried with
+exponential backoff; a batch still failing is requeued behind newer alerts so
+it cannot hold them back. A batch Alertmanager rejects with any other 4xx
+would fail again, so it is dropped. An anomaly is only marked ``alerted`` once
+Alertmanager has accepted it.
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+ALERTMANAGER_URL = os.getenv("ALERTMANAGER_URL", "http://prometheus-kube-prometheus-alertmanager.fawkes.svc:9093")
+ALERT_FLUSH_INTERVAL_SECONDS = float(os.getenv("ALERT_FLUSH_INTERVAL_SECONDS", "5"))
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", "50"))
+ALERT_BUFFER_MAX = int(os.getenv("ALERT_BUFFER_MAX", "1000"))
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", "3"))
+ALERT_RETRY_BACKOFF_SECONDS = float(os.getenv("ALERT_RETRY_BACKOFF_SECONDS", "1"))
+
+
+def build_alert(anomaly_detection) -> dict:
+    """
+    Build the Alertmanager alert for an anomaly.
+
+    Args:
+        anomaly_detection: AnomalyDetection object
+
+    Returns:
+        Alert in the ``/api/v2/alerts`` format
+    """
+    anomaly = anomaly_detection.anomaly
+
+    return {
+        "labels": {
+            "alertname": "AnomalyDetected",
+            "severity": anomaly.severity,
+            "metric": anomaly.metric,
+            "anomaly_id": anomaly_detection.id,
+        },
+        "annotations": {
+            "summary": f"Anomaly detected in {anomaly.metric}",
+            "description": (
+                f"Anomaly detected: {anomaly.metric}\n"
+                f"Score: {anomaly.score:.2f}\n"
+                f"Confidence: {anomaly.confidence:.2%}\n"
+                f"Expected: {anomaly.expected_value:.2f}\n"
+                f"Actual: {anomaly.value:.2f}\n"
+            ),
+        },
+        "startsAt": anomaly.timestamp.isoformat(),
+    }
+
+
+class AlertDispatcher:
+    """Buffers anomalies and posts them to Alertmanager in batches."""
+
+    def __init__(
+        self,
+        http_client,
+        alertmanager_url: str = ALERTMANAGER_URL,
+        flush_interval_seconds: float = ALERT_FLUSH_INTERVAL_SECONDS,
+        batch_size: int = ALERT_BATCH_SIZE,
+        buffer_max: int = ALERT_BUFFER_MAX,
+        max_retries: int = ALERT_MAX_RETRIES,
+        retry_backoff_seconds: float = ALERT_RETRY_BACKOFF_SECONDS,
+    ):
+        """
+        Initialize the dispatcher.
+
+        Args:
+            http_client: HTTP client for posting alerts
+            alertmanager_url: Alertmanager base URL
+            flush_interval_seconds: Maximum time an anomaly waits in the buffer
+            batch_size: Maximum alerts per post; a full batch flushes immediately
+            buffer_max: Buffer cap; the oldest anomalies are dropped beyond it
+            max_retries: Retries per batch before it is requeued at the back of the buffer
+            retry_backoff_seconds: Initial retry delay, doubled on every attempt
+        """
+        self.http_client = http_client
+        self.alertmanager_url = alertmanager_url
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self.buffer_max = buffer_max
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._buffer: deque = deque()
+        self._batch_ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def enqueue(self, anomaly_detection):
+        """Queue an anomaly for delivery without waiting for Alertmanager."""
+        self._buffer.append(anomaly_detection)
+        self._enforce_cap()
+
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+
+    def _enforce_cap(self):
+        """Drop the oldest buffered anomalies beyond the buffer cap."""
+        from .main import ALERTS_DISPATCHED
+
+        while len(self._buffer) > self.buffer_max:
+            dropped = self._buffer.popleft()
+            ALERTS_DISPATCHED.labels(status="dropped").inc()
+            logger.warning(f"Alert buffer full, dropped alert for anomaly {dropped.id}")
+
+    async def flush(self) -> int:
+        """
+        Post everything currently buffered, one batch at a time.
+
+        Stops at the first batch that could not be delivered, which is
+        requeued behind the rest for the next flush.
+
+        Returns:
+            Number of anomalies delivered
+        """
+        delivered = 0
+
+        while self._buffer:
+            count = min(self.batch_size, len(self._buffer))
+            batch = [self._buffer.popleft() for _ in range(count)]
+            outcome = await self._post(batch)
+
+            if outcome == "failed":
+                # Alertmanager is unavailable; retry on the next flush, after the alerts queued behind
+                self._buffer.extend(batch)
+                self._enforce_cap()
+                break
+
+            if outcome == "delivered":
+                for anomaly_detection in batch:
+                    anomaly_detection.alerted = True
+                delivered += len(batch)
+
+        return delivered
+
+    async def _post(self, batch: list) -> str:
+        """
+        Post one batch, retrying connection errors, 429 and 5xx with exponential backoff.
+
+        Returns:
+            "delivered", "rejected" when Alertmanager refused the batch with
+            another 4xx (it is dropped), or "failed" once retries are exhausted
+        """
+        from .main import ALERTS_DISPATCHED
+
+        payload = [build_alert(anomaly_detection) for anomaly_detection in batch]
+        delay = self.retry_backoff_seconds
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.http_client.post(
+                    f"{self.alertmanager_url}/api/v2/alerts", json=payload, timeout=10.0
+                )
+                if response.status_code in [200, 202]:
+                    ALERTS_DISPATCHED.labels(status="delivered").inc(len(batch))
+                    logger.info(f"Sent {len(batch)} alerts to Alertmanager")
+                    return "delivered"
+                if response.status_code != 429 and response.status_code < 500:
+                    ALERTS_DISPATCHED.labels(status="rejected").inc(len(batch))
+                    logger.error(
+                        f"Alertmanager rejected {len(batch)} alerts with status {response.status_code}, "
+                        f"dropping: {response.text[:500]}"
+                    )
+                    return "rejected"
+                logger.warning(f"Alertmanager returned status {response.status_code} for {len(batch)} alerts")
+            except Exception as e:
+                logger.warning(f"Failed to send {len(batch)} alerts (attempt {attempt + 1}): {e}")
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+                delay *= 2
+
+        ALERTS_DISPATCHED.labels(status="failed").inc(len(batch))
+        logger.error(f"Giving up on {len(batch)} alerts after {self.max_retries + 1} attempts, requeueing")
+        return "failed"
+
+    def start(self):
+        """Start the background flush loop."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and make a final attempt to deliver buffered alerts."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        if self._buffer:
+            await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval_seconds)
+            except TimeoutError:
+                pass
+
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Alert flush failed: {e}", exc_info=True)
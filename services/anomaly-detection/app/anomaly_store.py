@@ -0,0 +1,276 @@
+"""
+Bounded, indexed store for detected anomalies.
+
+Keeps the newest anomalies in memory with:
+- a deque timeline (newest first) for O(1) insert and eviction
+- an id → record dict for O(1) lookup
+- per-severity and per-metric deques so filtered listings cost O(k)
+
+Records evicted from memory can optionally spill to a SQLite file, which is
+consulted for lookups and listings that run past the in-memory window.
+Evicted records are written in batches, on a worker thread when an event
+loop is running, and are served from memory until their batch is written.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import defaultdict, deque
+
+logger = logging.getLogger(__name__)
+
+
+class AnomalyStore:
+    """Size-limited anomaly store with secondary indexes and optional SQLite spill."""
+
+    def __init__(self, max_size: int, sqlite_path: str = ""):
+        """
+        Initialize the store.
+
+        Args:
+            max_size: Maximum anomalies kept in memory
+            sqlite_path: SQLite file receiving evicted anomalies (empty to disable)
+        """
+        self.max_size = max_size
+        self._timeline: deque[str] = deque()
+        self._by_id: dict = {}
+        self._by_severity: dict[str, deque[str]] = defaultdict(deque)
+        self._by_metric: dict[str, deque[str]] = defaultdict(deque)
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        # Evicted or updated records not yet written to SQLite, oldest first
+        self._unflushed: dict = {}
+        self._flush_task: asyncio.Task | None = None
+
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS anomalies (
+                    id TEXT PRIMARY KEY,
+                    detected_at TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    record TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_anomalies_detected_at ON anomalies (detected_at);
+                CREATE INDEX IF NOT EXISTS idx_anomalies_severity ON anomalies (severity, detected_at);
+                CREATE INDEX IF NOT EXISTS idx_anomalies_metric ON anomalies (metric, detected_at);
+                """)
+
+    def __len__(self) -> int:
+        return len(self._timeline)
+
+    def __iter__(self):
+        """Iterate in-memory anomalies, newest first."""
+        return (self._by_id[anomaly_id] for anomaly_id in self._timeline)
+
+    def add(self, anomaly_detection):
+        """Add an anomaly as the newest record, evicting the oldest if full."""
+        anomaly_id = anomaly_detection.id
+        previous = self._by_id.get(anomaly_id)
+        if previous is not None:
+            self._by_id[anomaly_id] = anomaly_detection
+            self._reindex(self._by_severity, "severity", previous.anomaly.severity, anomaly_detection.anomaly.severity)
+            self._reindex(self._by_metric, "metric", previous.anomaly.metric, anomaly_detection.anomaly.metric)
+            return
+
+        self._by_id[anomaly_id] = anomaly_detection
+        self._timeline.appendleft(anomaly_id)
+        self._by_severity[anomaly_detection.anomaly.severity].appendleft(anomaly_id)
+        self._by_metric[anomaly_detection.anomaly.metric].appendleft(anomaly_id)
+
+        while len(self._timeline) > self.max_size:
+            self._evict_oldest()
+        self._schedule_flush()
+
+    def update(self, anomaly_detection):
+        """Save changes to a stored anomaly, such as its root cause, wherever it is kept."""
+        if anomaly_detection.id in self._by_id:
+            self.add(anomaly_detection)
+        elif self._db is not None:
+            self._unflushed.pop(anomaly_detection.id, None)
+            self._unflushed[anomaly_detection.id] = anomaly_detection
+            self._schedule_flush()
+
+    def _reindex(self, index: dict[str, deque[str]], field: str, old_key: str, new_key: str):
+        """Rebuild the ``old_key`` and ``new_key`` entries of an index after a record moved between them."""
+        if old_key == new_key:
+            return
+
+        for key in (old_key, new_key):
+            ids = deque(i for i in self._timeline if getattr(self._by_id[i].anomaly, field) == key)
+            if ids:
+                index[key] = ids
+            else:
+                index.pop(key, None)
+
+    def _evict_oldest(self):
+        """Drop the oldest record from memory, queueing it for SQLite if enabled."""
+        anomaly_id = self._timeline.pop()
+        anomaly_detection = self._by_id.pop(anomaly_id)
+
+        # The oldest record overall is also the oldest in each of its indexes
+        for index, key in (
+            (self._by_severity, anomaly_detection.anomaly.severity),
+            (self._by_metric, anomaly_detection.anomaly.metric),
+        ):
+            index[key].pop()
+            if not index[key]:
+                del index[key]
+
+        if self._db is not None:
+            self._unflushed[anomaly_id] = anomaly_detection
+
+    def _schedule_flush(self):
+        """Write the unflushed records in one batch, on a worker thread when an event loop is running."""
+        if self._db is None or not self._unflushed or self._flush_task is not None:
+            return
+
+        batch = list(self._unflushed.values())
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(batch)
+            self._flushed(batch)
+            return
+
+        self._flush_task = loop.create_task(asyncio.to_thread(self._write, batch))
+        self._flush_task.add_done_callback(lambda _: self._flushed(batch))
+
+    def _flushed(self, batch: list):
+        """Forget the records of a written batch, then write any queued since."""
+        self._flush_task = None
+        for anomaly_detection in batch:
+            if self._unflushed.get(anomaly_detection.id) is anomaly_detection:
+                del self._unflushed[anomaly_detection.id]
+        self._schedule_flush()
+
+    def _write(self, batch: list):
+        """Insert or replace a batch of records in one transaction."""
+        rows = [
+            (
+                anomaly_detection.id,
+                anomaly_detection.detected_at.isoformat(),
+                anomaly_detection.anomaly.severity,
+                anomaly_detection.anomaly.metric,
+                anomaly_detection.model_dump_json(),
+            )
+            for anomaly_detection in batch
+        ]
+
+        try:
+            with self._db_lock:
+                if self._db is None:
+                    return
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO anomalies (id, detected_at, severity, metric, record)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        rows,
+                    )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to spill {len(rows)} anomalies to SQLite: {e}")
+
+    def get(self, anomaly_id: str):
+        """Return the anomaly with ``anomaly_id`` from memory or the spill file, or None."""
+        anomaly_detection = self._by_id.get(anomaly_id) or self._unflushed.get(anomaly_id)
+        if anomaly_detection is not None or self._db is None:
+            return anomaly_detection
+
+        with self._db_lock:
+            row = self._db.execute("SELECT record FROM anomalies WHERE id = ?", (anomaly_id,)).fetchone()
+
+        return self._from_json(row[0]) if row else None
+
+    def query(self, limit: int = 50, severity: str | None = None, metric: str | None = None) -> list:
+        """
+        List the newest anomalies matching the filters.
+
+        Uses the smallest matching index so only candidate records are touched.
+        """
+        if severity and metric:
+            by_severity = self._by_severity.get(severity, ())
+            by_metric = self._by_metric.get(metric, ())
+            ids = by_severity if len(by_severity) <= len(by_metric) else by_metric
+            matches = (
+                self._by_id[i]
+                for i in ids
+                if self._by_id[i].anomaly.severity == severity and self._by_id[i].anomaly.metric == metric
+            )
+        elif severity:
+            matches = (self._by_id[i] for i in self._by_severity.get(severity, ()))
+        elif metric:
+            matches = (self._by_id[i] for i in self._by_metric.get(metric, ()))
+        else:
+            matches = iter(self)
+
+        results = []
+        for anomaly_detection in matches:
+            if len(results) >= limit:
+                break
+            results.append(anomaly_detection)
+
+        # Continue into the spill file once the in-memory window is exhausted
+        if len(results) < limit and self._db is not None:
+            results.extend(self._query_spilled(limit - len(results), severity, metric))
+
+        return results
+
+    def _query_spilled(self, limit: int, severity: str | None, metric: str | None) -> list:
+        # Records waiting to be written take precedence over their stored copy
+        pending = [
+            anomaly_detection
+            for anomaly_detection in self._unflushed.values()
+            if (not severity or anomaly_detection.anomaly.severity == severity)
+            and (not metric or anomaly_detection.anomaly.metric == metric)
+        ]
+
+        clauses = []
+        params: list = []
+        if severity:
+            clauses.append("severity = ?")
+            params.append(severity)
+        if metric:
+            clauses.append("metric = ?")
+            params.append(metric)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT record FROM anomalies {where} ORDER BY detected_at DESC LIMIT ?"  # nosec B608
+
+        with self._db_lock:
+            rows = self._db.execute(sql, (*params, limit + len(pending))).fetchall()
+
+        merged = {record.id: record for record in (self._from_json(row[0]) for row in rows)}
+        merged.update((record.id, record) for record in pending)
+        return sorted(merged.values(), key=lambda record: record.detected_at, reverse=True)[:limit]
+
+    def recent(self, count: int) -> list:
+        """Return up to ``count`` newest in-memory anomalies."""
+        return [anomaly_detection for _, anomaly_detection in zip(range(count), self)]
+
+    def severity_counts(self) -> dict[str, int]:
+        """Count in-memory anomalies per severity."""
+        return {severity: len(ids) for severity, ids in self._by_severity.items()}
+
+    def clear(self):
+        """Remove all in-memory anomalies (the spill file is kept)."""
+        self._timeline.clear()
+        self._by_id.clear()
+        self._by_severity.clear()
+        self._by_metric.clear()
+
+    def close(self):
+        """Write the records still queued and close the spill file."""
+        if self._db is not None:
+            self._write(list(self._unflushed.values()))
+            self._unflushed.clear()
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+    @staticmethod
+    def _from_json(record: str):
+        from .main import AnomalyDetection
+
+        return AnomalyDetection.model_validate_json(record)
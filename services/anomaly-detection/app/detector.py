@@ -8,59 +8,185 @@ detect anomalies using ML models, and trigger alerts.
 import asyncio
 import logging
 import os
+import time
 import uuid
+from collections import deque
 from datetime import datetime, timezone
 
+from .scheduler import DetectionScheduler, ScheduledQuery
+
 logger = logging.getLogger(__name__)
 
 PROMETHEUS_URL = os.getenv("PROMETHEUS_URL", "http://prometheus-kube-prometheus-prometheus.fawkes.svc:9090")
 DETECTION_INTERVAL_SECONDS = int(os.getenv("DETECTION_INTERVAL_SECONDS", "60"))
 ALERTMANAGER_URL = os.getenv("ALERTMANAGER_URL", "http://prometheus-kube-prometheus-alertmanager.fawkes.svc:9093")
 CONFIDENCE_LOW_THRESHOLD = float(os.getenv("CONFIDENCE_LOW_THRESHOLD", "0.7"))
+DETECTION_CONCURRENCY = int(os.getenv("DETECTION_CONCURRENCY", "4"))
+# Per-cycle deadline; unset, it is 0.8 of the scheduler tick (see run_continuous_detection)
+DETECTION_CYCLE_BUDGET_SECONDS = float(os.getenv("DETECTION_CYCLE_BUDGET_SECONDS", "0")) or None
+DEBUG_CYCLE_HISTORY = int(os.getenv("DEBUG_CYCLE_HISTORY", "20"))
+
+
+# Queries monitored, with their interval and priority (0 is never shed under overload).
+# A query only detects again once QUERY_STEP_SECONDS of new samples is available,
+# so an interval below the step checks for new data more often, not more data.
+MONITORED_QUERIES = [
+    # Deployment failures (error rate spikes)
+    ScheduledQuery('rate(http_requests_total{status=~"5.."}[5m])', 30, priority=0),
+    # Log error rate spikes
+    ScheduledQuery('rate(log_messages_total{level="error"}[5m])', 30, priority=0),
+    # API latency increases
+    ScheduledQuery("http_request_duration_seconds", DETECTION_INTERVAL_SECONDS, priority=1),
+    # Resource usage spikes (CPU)
+    ScheduledQuery("rate(container_cpu_usage_seconds_total[5m])", DETECTION_INTERVAL_SECONDS, priority=1),
+    # Resource usage spikes (Memory)
+    ScheduledQuery("container_memory_usage_bytes", 300, priority=2),
+    # Build time anomalies
+    ScheduledQuery("jenkins_job_duration_seconds", 300, priority=2),
+]
+
+METRICS_TO_CHECK = [scheduled.query for scheduled in MONITORED_QUERIES]
+
+# Report of the most recent detection cycle (see run_detection_cycle)
+last_cycle_report: dict = {}
+
+# Timing breakdown of the last DEBUG_CYCLE_HISTORY cycles, served on /debug/cycle
+cycle_history: deque = deque(maxlen=DEBUG_CYCLE_HISTORY)
+
+# Batched Alertmanager delivery, set up in the app lifespan (see app.alerting)
+alert_dispatcher = None
+
+
+async def run_detection_cycle(
+    queries: list[str], http_client, budget_seconds: float | None = None
+) -> tuple[list, dict]:
+    """
+    Run detection for all queries concurrently within the cycle time budget.
+
+    At most DETECTION_CONCURRENCY queries are in flight at once. Queries still
+    running when the budget elapses are cancelled and reported as skipped, so
+    one slow query cannot stall the whole cycle.
+
+    Args:
+        queries: PromQL queries to run
+        http_client: HTTP client for querying Prometheus
+        budget_seconds: Cycle deadline; the detection loop passes DETECTION_CYCLE_BUDGET_SECONDS,
+            or 0.8 of the scheduler tick when that is unset. Defaults to 0.8 of
+            DETECTION_INTERVAL_SECONDS when called without one.
+
+    Returns:
+        Tuple of (detected AnomalyScore objects, cycle report)
+    """
+    from models import detector
+
+    from .main import DETECTION_QUERIES_SKIPPED
+
+    budget_seconds = budget_seconds or DETECTION_CYCLE_BUDGET_SECONDS or DETECTION_INTERVAL_SECONDS * 0.8
+    start_time = datetime.now(timezone.utc)
+    report = {"started_at": start_time.isoformat(), "completed": [], "skipped": [], "failed": [], "queries": {}}
+
+    # Ticks where no query is due (e.g. a 15s tick for 45s and 60s intervals) have nothing to run
+    if not queries:
+        report["duration_seconds"] = 0.0
+        return [], report
+
+    semaphore = asyncio.Semaphore(DETECTION_CONCURRENCY)
+
+    async def _detect(query: str) -> list:
+        async with semaphore:
+            return await detector.detect_anomalies(query, http_client)
+
+    detector.query_stats.clear()
+    tasks = {asyncio.create_task(_detect(query)): query for query in queries}
+    _, pending = await asyncio.wait(tasks, timeout=budget_seconds)
+
+    # Cancel stragglers and wait for them to unwind
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    detected_anomalies = []
+
+    # Iterate in query order so results are deterministic
+    for task, query in tasks.items():
+        if task in pending:
+            report["skipped"].append(query)
+            DETECTION_QUERIES_SKIPPED.labels(query=query).inc()
+            continue
+
+        error = task.exception()
+        if error:
+            logger.error(f"Error detecting anomalies for {query}: {error}")
+            report["failed"].append(query)
+            continue
+
+        report["completed"].append(query)
+        report["queries"][query] = detector.query_stats.get(query, {})
+        anomalies = task.result()
+        if anomalies:
+            detected_anomalies.extend(anomalies)
+            logger.info(f"Detected {len(anomalies)} anomalies for query: {query}")
+
+    report["duration_seconds"] = (datetime.now(timezone.utc) - start_time).total_seconds()
+
+    if report["skipped"]:
+        logger.warning(f"Cycle budget of {budget_seconds}s exceeded, skipped queries: {report['skipped']}")
+
+    return detected_anomalies, report
 
 
 async def run_continuous_detection():
     """
     Main loop for continuous anomaly detection.
 
-    Queries Prometheus for metrics, applies ML models to detect anomalies,
-    and triggers alerts when anomalies are detected.
+    Runs the queries that are due on each wall-clock aligned tick (see
+    app.scheduler), applies ML models to detect anomalies, and triggers
+    alerts when anomalies are detected. When a cycle overruns its tick, the
+    overlapped ticks are skipped and lower-priority queries are shed.
     """
-    logger.info(f"Starting continuous anomaly detection (interval: {DETECTION_INTERVAL_SECONDS}s)")
+    global last_cycle_report
+
+    from .main import (
+        ANOMALIES_DETECTED,
+        DETECTION_DURATION,
+        FALSE_POSITIVE_RATE_GAUGE,
+        SCHEDULER_ADMITTED_PRIORITY,
+        SCHEDULER_LAG,
+        SCHEDULER_QUERIES_SHED,
+        SCHEDULER_TICKS_MISSED,
+        http_client,
+        recent_anomalies,
+    )
 
-    from .main import ANOMALIES_DETECTED, FALSE_POSITIVE_RATE_GAUGE, http_client, recent_anomalies
-    from .models import detector
+    scheduler = DetectionScheduler(MONITORED_QUERIES)
+    cycle_budget = DETECTION_CYCLE_BUDGET_SECONDS or scheduler.tick_seconds * 0.8
+    logger.info(f"Starting continuous anomaly detection (tick: {scheduler.tick_seconds}s, budget: {cycle_budget}s)")
 
     while True:
         try:
+            # Wait for the next aligned tick; after an overrun it is already due
+            first_tick = scheduler.last_tick is None
+            tick, missed = scheduler.next_tick(time.time())
+            await asyncio.sleep(max(0.0, tick - time.time()))
+
+            lag = 0.0 if first_tick else max(0.0, time.time() - tick)
+            SCHEDULER_LAG.observe(lag)
+            if missed:
+                SCHEDULER_TICKS_MISSED.inc(missed)
+                logger.warning(f"Detection overran, missed {missed} tick(s)")
+
+            queries, shed = scheduler.start(tick)
+            for query in shed:
+                SCHEDULER_QUERIES_SHED.labels(query=query).inc()
+            if shed:
+                logger.warning(f"Shedding queries above priority {scheduler.admitted_priority}: {shed}")
+
             start_time = datetime.now(timezone.utc)
 
-            # Query Prometheus for metrics to monitor
-            metrics_to_check = [
-                # Deployment failures (error rate spikes)
-                'rate(http_requests_total{status=~"5.."}[5m])',
-                # Build time anomalies
-                "jenkins_job_duration_seconds",
-                # Resource usage spikes (CPU)
-                "rate(container_cpu_usage_seconds_total[5m])",
-                # Resource usage spikes (Memory)
-                "container_memory_usage_bytes",
-                # API latency increases
-                "http_request_duration_seconds",
-                # Log error rate spikes
-                'rate(log_messages_total{level="error"}[5m])',
-            ]
-
-            detected_anomalies = []
-
-            for metric_query in metrics_to_check:
-                try:
-                    anomalies = await detector.detect_anomalies(metric_query, http_client)
-                    if anomalies:
-                        detected_anomalies.extend(anomalies)
-                        logger.info(f"Detected {len(anomalies)} anomalies for query: {metric_query}")
-                except Exception as e:
-                    logger.error(f"Error detecting anomalies for {metric_query}: {e}")
+            # Query Prometheus for the metrics due this tick
+            detected_anomalies, last_cycle_report = await run_detection_cycle(queries, http_client, cycle_budget)
+            processing_start = time.perf_counter()
+            rca_seconds = 0.0
 
             # Process detected anomalies
             for anomaly_score in detected_anomalies:
@@ -71,82 +197,137 @@ async def run_continuous_detection():
                 )
 
                 # Add to recent anomalies
-                recent_anomalies.insert(0, anomaly_detection)
-                if len(recent_anomalies) > 100:  # Keep only last 100
-                    recent_anomalies.pop()
+                recent_anomalies.add(anomaly_detection)
 
                 # Track metrics
                 ANOMALIES_DETECTED.labels(metric=anomaly_score.metric, severity=anomaly_score.severity).inc()
 
                 # Send alert if severity is high or critical
                 if anomaly_score.severity in ["critical", "high"]:
-                    try:
-                        await send_alert(anomaly_detection, http_client)
-                        anomaly_detection.alerted = True
-                    except Exception as e:
-                        logger.error(f"Failed to send alert: {e}")
+                    if alert_dispatcher:
+                        alert_dispatcher.enqueue(anomaly_detection)
+                    else:
+                        try:
+                            await send_alert(anomaly_detection, http_client)
+                            anomaly_detection.alerted = True
+                        except Exception as e:
+                            logger.error(f"Failed to send alert: {e}")
 
                 # Trigger RCA for critical anomalies
                 if anomaly_score.severity == "critical":
+                    rca_start = time.perf_counter()
                     try:
                         from . import rca as rca_module
 
                         await rca_module.perform_root_cause_analysis(anomaly_detection, recent_anomalies)
+                        # Saved explicitly in case the anomaly was evicted to the spill file meanwhile
+                        recent_anomalies.update(anomaly_detection)
                     except Exception as e:
                         logger.error(f"Failed to perform RCA: {e}")
+                    rca_seconds += time.perf_counter() - rca_start
 
             # Update false positive rate estimate
             if len(recent_anomalies) > 10:
                 # Simple heuristic: anomalies with low confidence are likely false positives
                 low_confidence = sum(
-                    1 for a in recent_anomalies[:50] if a.anomaly.confidence < CONFIDENCE_LOW_THRESHOLD
+                    1 for a in recent_anomalies.recent(50) if a.anomaly.confidence < CONFIDENCE_LOW_THRESHOLD
                 )
                 fp_rate = low_confidence / min(50, len(recent_anomalies))
                 FALSE_POSITIVE_RATE_GAUGE.set(fp_rate)
 
             duration = (datetime.now(timezone.utc) - start_time).total_seconds()
+            DETECTION_DURATION.observe(duration)
+            last_cycle_report.update(
+                anomalies=len(detected_anomalies),
+                processing_seconds=time.perf_counter() - processing_start,
+                rca_seconds=rca_seconds,
+                total_seconds=duration,
+                lag_seconds=lag,
+                ticks_missed=missed,
+                shed=shed,
+            )
+            cycle_history.append(last_cycle_report)
             logger.debug(f"Detection cycle completed in {duration:.2f}s")
 
-            # Wait for next interval
-            await asyncio.sleep(DETECTION_INTERVAL_SECONDS)
+            scheduler.finish(time.time())
+            SCHEDULER_ADMITTED_PRIORITY.set(scheduler.admitted_priority)
 
         except asyncio.CancelledError:
             logger.info("Continuous detection cancelled")
             break
         except Exception as e:
             logger.error(f"Error in continuous detection loop: {e}", exc_info=True)
-            await asyncio.sleep(DETECTION_INTERVAL_SECONDS)
+            if scheduler.last_tick is not None:
+                scheduler.finish(time.time())
+
+
+async def run_baseline_updates():
+    """
+    Keep the seasonal baselines of the monitored queries current.
+
+    Builds the profiles on first run, then folds in each completed day every
+    BASELINE_UPDATE_INTERVAL_SECONDS.
+    """
+    from models import detector
+    from models.baseline import BASELINE_UPDATE_INTERVAL_SECONDS
+
+    from .main import http_client
+
+    while True:
+        try:
+            for query in METRICS_TO_CHECK:
+                await detector.update_baselines(query, http_client)
+        except asyncio.CancelledError:
+            logger.info("Baseline updates cancelled")
+            break
+        except Exception as e:
+            logger.error(f"Error updating seasonal baselines: {e}", exc_info=True)
+
+        await asyncio.sleep(BASELINE_UPDATE_INTERVAL_SECONDS)
+
+
+async def run_model_pruning():
+    """
+    Periodically delete persisted models that are too old to be reused.
+
+    A model older than MODEL_RETRAIN_INTERVAL_SECONDS is refitted on its next
+    use anyway, so its file only takes disk space. Without pruning, series that
+    stop reporting would leave their models in MODEL_REGISTRY_DIR until the
+    next restart.
+    """
+    from models import detector
+
+    while True:
+        await asyncio.sleep(detector.MODEL_RETRAIN_INTERVAL_SECONDS)
+
+        try:
+            if detector.model_registry is not None:
+                removed = await asyncio.to_thread(
+                    detector.model_registry.prune, detector.MODEL_RETRAIN_INTERVAL_SECONDS
+                )
+                if removed:
+                    logger.info(f"Pruned {removed} stale persisted models")
+        except asyncio.CancelledError:
+            logger.info("Model pruning cancelled")
+            break
+        except Exception as e:
+            logger.error(f"Error pruning persisted models: {e}", exc_info=True)
 
 
 async def send_alert(anomaly_detection, http_client):
     """
-    Send alert to Alertmanager.
+    Send a single alert to Alertmanager immediately.
+
+    Used when no AlertDispatcher is running; otherwise anomalies are queued
+    with ``alert_dispatcher.enqueue`` and delivered in batches.
 
     Args:
         anomaly_detection: AnomalyDetection object
         http_client: HTTP client for sending requests
     """
-    anomaly = anomaly_detection.anomaly
-
-    alert = {
-        "labels": {
-            "alertname": "AnomalyDetected",
-            "severity": anomaly.severity,
-            "metric": anomaly.metric,
-            "anomaly_id": anomaly_detection.id,
-        },
-        "annotations": {
-            "summary": f"Anomaly detected in {anomaly.metric}",
-            "description": (
-                f"Anomaly detected: {anomaly.metric}\n"
-                f"Score: {anomaly.score:.2f}\n"
-                f"Confidence: {anomaly.confidence:.2%}\n"
-                f"Expected: {anomaly.expected_value:.2f}\n"
-                f"Actual: {anomaly.value:.2f}\n"
-            ),
-        },
-        "startsAt": anomaly.timestamp.isoformat(),
-    }
+    from .alerting import build_alert
+
+    alert = build_alert(anomaly_detection)
 
     try:
         response = await http_client.post(f"{ALERTMANAGER_URL}/api/v2/alerts", json=[alert], timeout=10.0)
@@ -0,0 +1,147 @@
+"""
+Streaming Loki client for RCA error-log context.
+
+Error logs around an anomaly are fetched with a ``query_range`` call whose
+label selector is derived from the anomaly's metric labels. The response is
+read incrementally and parsed entry by entry, so a broad query never holds
+more than one chunk in memory, and reading stops once LOKI_MAX_LINES entries
+or LOKI_MAX_BYTES of response have been consumed. Lines are grouped by a
+template with numbers, IDs, addresses and quoted values masked, and the most
+frequent templates are returned with their counts.
+"""
+
+import json
+import logging
+import os
+import re
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+LOKI_URL = os.getenv("LOKI_URL", "http://loki.fawkes.svc:3100")
+LOKI_WINDOW_MINUTES = int(os.getenv("LOKI_WINDOW_MINUTES", "15"))
+LOKI_MAX_LINES = int(os.getenv("LOKI_MAX_LINES", "5000"))
+LOKI_MAX_BYTES = int(os.getenv("LOKI_MAX_BYTES", str(2 * 1024 * 1024)))
+LOKI_TOP_TEMPLATES = int(os.getenv("LOKI_TOP_TEMPLATES", "10"))
+LOKI_TIMEOUT_SECONDS = float(os.getenv("LOKI_TIMEOUT_SECONDS", "10"))
+LOKI_ERROR_PATTERN = os.getenv("LOKI_ERROR_PATTERN", "(?i)(error|exception|fatal|panic)")
+
+# Metric labels that identify the same workload in Loki (Prometheus ``job`` and ``instance`` do not)
+SELECTOR_LABELS = ("namespace", "pod", "container")
+
+# Longest partial entry kept between chunks; longer lines are dropped
+MAX_ENTRY_BYTES = 64 * 1024
+MAX_TEMPLATE_LENGTH = 300
+
+METRIC_LABEL_PATTERN = re.compile(r"(\w+)=([^,}]+)")
+
+# The start of a ["<timestamp>", "<line>", ...] entry of a stream's ``values`` array, up to the line
+ENTRY_PATTERN = re.compile(rb'\["\d+",\s*"((?:[^"\\]|\\.)*)"')
+
+# Applied in order; earlier masks protect their matches from later ones
+TEMPLATE_MASKS = (
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE), "<uuid>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<ip>"),
+    (re.compile(r"\b(?=[0-9a-f]*\d)[0-9a-f]{8,}\b", re.IGNORECASE), "<id>"),
+    (re.compile(r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'"), "<str>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<num>"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def label_selector(metric: str) -> str | None:
+    """
+    Build a LogQL stream selector from a formatted metric name.
+
+    Args:
+        metric: Metric as reported on anomalies, e.g. ``name{namespace=ns,pod=api-1}``
+
+    Returns:
+        Selector such as ``{namespace="ns",pod="api-1"}``, or None when the
+        metric carries no label that identifies a workload
+    """
+    labels = dict(METRIC_LABEL_PATTERN.findall(metric.partition("{")[2]))
+    matchers = [f"{name}={json.dumps(labels[name])}" for name in SELECTOR_LABELS if name in labels]
+    if not matchers:
+        return None
+    return "{" + ",".join(matchers) + "}"
+
+
+def log_template(line: str) -> str:
+    """Normalize a log line into a template with variable parts masked."""
+    for pattern, mask in TEMPLATE_MASKS:
+        line = pattern.sub(mask, line)
+    return line.strip()[:MAX_TEMPLATE_LENGTH]
+
+
+async def stream_log_lines(http_client, params: dict, max_lines: int = LOKI_MAX_LINES, max_bytes: int = LOKI_MAX_BYTES):
+    """
+    Yield log lines of a Loki ``query_range`` response as it arrives.
+
+    Stops after ``max_lines`` lines or ``max_bytes`` of response body,
+    whichever comes first, and closes the response.
+    """
+    from .main import LOKI_BUDGET_EXHAUSTED
+
+    lines = 0
+    received = 0
+    buffer = b""
+
+    async with http_client.stream(
+        "GET", f"{LOKI_URL}/loki/api/v1/query_range", params=params, timeout=LOKI_TIMEOUT_SECONDS
+    ) as response:
+        if response.status_code != 200:
+            logger.warning(f"Loki query failed with status {response.status_code}")
+            return
+
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            buffer += chunk
+
+            consumed = 0
+            for match in ENTRY_PATTERN.finditer(buffer):
+                consumed = match.end()
+                yield json.loads(b'"' + match.group(1) + b'"')
+                lines += 1
+                if lines >= max_lines:
+                    LOKI_BUDGET_EXHAUSTED.labels(budget="lines").inc()
+                    return
+
+            buffer = buffer[consumed:][-MAX_ENTRY_BYTES:]
+
+            if received >= max_bytes:
+                LOKI_BUDGET_EXHAUSTED.labels(budget="bytes").inc()
+                logger.info(f"Loki response truncated at {received} bytes")
+                return
+
+
+async def top_error_templates(
+    http_client,
+    selector: str,
+    start: datetime,
+    end: datetime,
+    top_k: int = LOKI_TOP_TEMPLATES,
+    max_lines: int = LOKI_MAX_LINES,
+    max_bytes: int = LOKI_MAX_BYTES,
+) -> list[tuple[str, int]]:
+    """
+    Return the most frequent error-log templates of ``selector`` between ``start`` and ``end``.
+
+    Returns:
+        List of (template, count), most frequent first
+    """
+    params = {
+        "query": f"{selector} |~ {json.dumps(LOKI_ERROR_PATTERN)}",
+        "start": int(start.timestamp() * 1e9),
+        "end": int(end.timestamp() * 1e9),
+        "limit": max_lines,
+        "direction": "backward",
+    }
+
+    counts = Counter()
+    async for line in stream_log_lines(http_client, params, max_lines, max_bytes):
+        counts[log_template(line)] += 1
+
+    return counts.most_common(top_k)
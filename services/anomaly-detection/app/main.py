@@ -16,6 +16,8 @@ from fastapi import BackgroundTasks, FastAPI, HTTPException
 from prometheus_client import Counter, Gauge, Histogram, make_asgi_app
 from pydantic import BaseModel, Field
 
+from .anomaly_store import AnomalyStore
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -28,6 +30,8 @@ LLM_API_URL = os.getenv("LLM_API_URL", "https://api.openai.com/v1/chat/completio
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4")
 FALSE_POSITIVE_THRESHOLD = float(os.getenv("FALSE_POSITIVE_THRESHOLD", "0.05"))
 DETECTION_INTERVAL_SECONDS = int(os.getenv("DETECTION_INTERVAL_SECONDS", "60"))
+ANOMALY_STORE_MAX_SIZE = int(os.getenv("ANOMALY_STORE_MAX_SIZE", "10000"))
+ANOMALY_STORE_SQLITE_PATH = os.getenv("ANOMALY_STORE_SQLITE_PATH", "")  # Empty disables spilling to disk
 
 # Global HTTP client
 http_client: httpx.AsyncClient | None = None
@@ -99,27 +103,87 @@ async def lifespan(app: FastAPI):
 
     # Initialize ML models
     try:
-        from .models import detector
+        from models import detector
 
         detector.initialize_models()
         logger.info("✅ ML models initialized successfully")
     except Exception as e:
         logger.error(f"❌ Failed to initialize ML models: {e}")
 
-    # Start background anomaly detection
-    import asyncio
+    # Start the worker pool for CPU-bound detection work
+    detection_executor = None
+    try:
+        from models import detector
+        from models.executor import DETECTION_BATCH_SIZE, DETECTION_EXECUTOR, DETECTION_WORKERS, DetectionExecutor
+
+        detection_executor = DetectionExecutor(
+            DETECTION_EXECUTOR,
+            DETECTION_WORKERS,
+            DETECTION_BATCH_SIZE,
+            initializer=detector.initialize_worker,
+            initargs=(DETECTION_WORKERS,),
+        )
+        detector.detection_executor = detection_executor
+        DETECTION_QUEUE_DEPTH.set_function(lambda: detection_executor.queue_depth)
+        DETECTION_WORKER_UTILIZATION.set_function(lambda: detection_executor.utilization)
+        logger.info(f"✅ Detection executor started ({DETECTION_EXECUTOR}, {DETECTION_WORKERS} workers)")
+    except Exception as e:
+        logger.error(f"❌ Failed to start detection executor, detecting inline: {e}")
+
+    # Join the shard ring so replicas split series between them
+    shard_coordinator = None
+    try:
+        from models import detector
+
+        from .sharding import create_shard_coordinator
 
+        shard_coordinator = create_shard_coordinator()
+        if shard_coordinator:
+            await shard_coordinator.start()
+            detector.shard_coordinator = shard_coordinator
+            SHARD_MEMBERS.set_function(lambda: len(shard_coordinator.members))
+            logger.info(f"✅ Joined shard ring as {shard_coordinator.replica_id}")
+    except Exception as e:
+        logger.error(f"❌ Failed to join shard ring, detecting on all series: {e}")
+
+    # Start batched alert delivery
     from . import detector as detection_module
 
+    alert_dispatcher = None
+    try:
+        from .alerting import AlertDispatcher
+
+        alert_dispatcher = AlertDispatcher(http_client)
+        alert_dispatcher.start()
+        detection_module.alert_dispatcher = alert_dispatcher
+        ALERT_BUFFER_SIZE.set_function(lambda: len(alert_dispatcher))
+        logger.info("✅ Alert dispatcher started")
+    except Exception as e:
+        logger.error(f"❌ Failed to start alert dispatcher, alerting inline: {e}")
+
+    # Start background anomaly detection
+    import asyncio
+
     detection_task = asyncio.create_task(detection_module.run_continuous_detection())
+    baseline_task = asyncio.create_task(detection_module.run_baseline_updates())
+    pruning_task = asyncio.create_task(detection_module.run_model_pruning())
 
     yield
 
     # Shutdown
     logger.info("Shutting down Anomaly Detection Service")
     detection_task.cancel()
+    baseline_task.cancel()
+    pruning_task.cancel()
+    if alert_dispatcher:
+        await alert_dispatcher.stop()
+    if detection_executor:
+        detection_executor.shutdown()
+    if shard_coordinator:
+        await shard_coordinator.stop()
     if http_client:
         await http_client.aclose()
+    recent_anomalies.close()
 
 
 # Create FastAPI app
@@ -145,13 +209,83 @@ MODELS_LOADED = Gauge("anomaly_detection_models_loaded", "Number of ML models lo
 
 ROOT_CAUSE_ANALYSES = Counter("anomaly_detection_rca_total", "Total root cause analyses performed", ["status"])
 
+DETECTION_QUEUE_DEPTH = Gauge("anomaly_detection_executor_queue_depth", "Detection tasks waiting for a free worker")
+
+DETECTION_WORKER_UTILIZATION = Gauge(
+    "anomaly_detection_executor_utilization", "Fraction of detection workers currently busy"
+)
+
+SHARD_MEMBERS = Gauge("anomaly_detection_shard_members", "Live replicas sharing detection work")
+
+DETECTION_QUERIES_SKIPPED = Counter(
+    "anomaly_detection_queries_skipped_total", "Queries cancelled for exceeding the cycle time budget", ["query"]
+)
+
+ALERTS_DISPATCHED = Counter(
+    "anomaly_detection_alerts_dispatched_total", "Alerts handled by the Alertmanager dispatcher", ["status"]
+)
+
+ALERT_BUFFER_SIZE = Gauge("anomaly_detection_alert_buffer_size", "Alerts waiting for batched delivery")
+
+LLM_SUGGESTION_CACHE = Counter(
+    "anomaly_detection_llm_cache_total", "LLM suggestion cache lookups by anomaly signature", ["result"]
+)
+
+DETECTION_QUERY_DURATION = Histogram(
+    "anomaly_detection_query_duration_seconds",
+    "Detection time per PromQL query by stage (fetch or detect)",
+    ["query", "stage"],
+    buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0],
+)
+
+DETECTION_METHOD_DURATION = Histogram(
+    "anomaly_detection_method_duration_seconds",
+    "Time spent in each detection method per query",
+    ["query", "method"],
+    buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0],
+)
+
+RCA_STAGE_DURATION = Histogram(
+    "anomaly_detection_rca_stage_duration_seconds",
+    "Root cause analysis time by stage",
+    ["stage"],
+    buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0],
+)
+
+SERIES_PROCESSED = Counter("anomaly_detection_series_processed_total", "Series run through the detectors", ["query"])
+
+SAMPLES_INGESTED = Counter(
+    "anomaly_detection_samples_ingested_total", "Samples fetched from Prometheus into the series cache", ["query"]
+)
+
+LOKI_BUDGET_EXHAUSTED = Counter(
+    "anomaly_detection_loki_budget_exhausted_total", "Loki log reads cut short by the line or byte budget", ["budget"]
+)
+
+SCHEDULER_LAG = Histogram(
+    "anomaly_detection_scheduler_lag_seconds",
+    "Delay between a scheduled tick and the start of its detection cycle",
+    buckets=[0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0],
+)
+
+SCHEDULER_TICKS_MISSED = Counter(
+    "anomaly_detection_scheduler_ticks_missed_total", "Ticks skipped because the previous cycle overran"
+)
+
+SCHEDULER_QUERIES_SHED = Counter(
+    "anomaly_detection_scheduler_queries_shed_total", "Due queries deferred to keep up after an overrun", ["query"]
+)
+
+SCHEDULER_ADMITTED_PRIORITY = Gauge(
+    "anomaly_detection_scheduler_admitted_priority", "Highest query priority value still run; queries above it are shed"
+)
+
 # Add prometheus metrics endpoint
 metrics_app = make_asgi_app()
 app.mount("/metrics", metrics_app)
 
 # Store recent anomalies
-recent_anomalies: list[AnomalyDetection] = []
-MAX_RECENT_ANOMALIES = 100
+recent_anomalies = AnomalyStore(ANOMALY_STORE_MAX_SIZE, ANOMALY_STORE_SQLITE_PATH)
 
 
 @app.get("/", include_in_schema=False)
@@ -174,7 +308,7 @@ async def health() -> HealthResponse:
         logger.debug("Prometheus health check failed", exc_info=True)
 
     try:
-        from .models import detector
+        from models import detector
 
         models_loaded = detector.models_initialized
     except Exception:
@@ -202,7 +336,7 @@ async def ready():
         raise HTTPException(status_code=503, detail=f"Prometheus not ready: {e!s}")
 
     try:
-        from .models import detector
+        from models import detector
 
         if not detector.models_initialized:
             raise HTTPException(status_code=503, detail="ML models not loaded")
@@ -224,23 +358,15 @@ async def get_anomalies(
         severity: Filter by severity (critical, high, medium, low)
         metric: Filter by metric name
     """
-    filtered = recent_anomalies
-
-    if severity:
-        filtered = [a for a in filtered if a.anomaly.severity == severity]
-
-    if metric:
-        filtered = [a for a in filtered if a.anomaly.metric == metric]
-
-    return filtered[:limit]
+    return recent_anomalies.query(limit=limit, severity=severity, metric=metric)
 
 
 @app.get("/api/v1/anomalies/{anomaly_id}")
 async def get_anomaly(anomaly_id: str) -> AnomalyDetection:
     """Get specific anomaly by ID."""
-    for anomaly in recent_anomalies:
-        if anomaly.id == anomaly_id:
-            return anomaly
+    anomaly = recent_anomalies.get(anomaly_id)
+    if anomaly:
+        return anomaly
 
     raise HTTPException(status_code=404, detail="Anomaly not found")
 
@@ -248,12 +374,7 @@ async def get_anomaly(anomaly_id: str) -> AnomalyDetection:
 @app.post("/api/v1/anomalies/{anomaly_id}/rca")
 async def trigger_rca(anomaly_id: str, background_tasks: BackgroundTasks):
     """Trigger root cause analysis for an anomaly."""
-    anomaly = None
-    for a in recent_anomalies:
-        if a.id == anomaly_id:
-            anomaly = a
-            break
-
+    anomaly = recent_anomalies.get(anomaly_id)
     if not anomaly:
         raise HTTPException(status_code=404, detail="Anomaly not found")
 
@@ -261,18 +382,25 @@ async def trigger_rca(anomaly_id: str, background_tasks: BackgroundTasks):
         return {"message": "RCA already exists", "root_cause": anomaly.root_cause}
 
     # Perform RCA in background
-    from . import rca as rca_module
-
-    background_tasks.add_task(rca_module.perform_root_cause_analysis, anomaly, recent_anomalies)
+    background_tasks.add_task(_analyze_and_save, anomaly)
 
     return {"message": "RCA triggered", "anomaly_id": anomaly_id}
 
 
+async def _analyze_and_save(anomaly):
+    """Run RCA on an anomaly and save the result, which a spilled anomaly would otherwise lose."""
+    from . import rca as rca_module
+
+    await rca_module.perform_root_cause_analysis(anomaly, recent_anomalies)
+    if anomaly.root_cause:
+        recent_anomalies.update(anomaly)
+
+
 @app.get("/api/v1/models")
 async def get_models():
     """Get information about loaded ML models."""
     try:
-        from .models import detector
+        from models import detector
 
         return {"models_loaded": detector.models_initialized, "models": detector.get_model_info()}
     except Exception as e:
@@ -284,10 +412,7 @@ async def get_stats():
     """Get detection statistics."""
     total_anomalies = len(recent_anomalies)
 
-    severity_counts = {}
-    for anomaly in recent_anomalies:
-        sev = anomaly.anomaly.severity
-        severity_counts[sev] = severity_counts.get(sev, 0) + 1
+    severity_counts = recent_anomalies.severity_counts()
 
     with_rca = sum(1 for a in recent_anomalies if a.root_cause is not None)
     alerted = sum(1 for a in recent_anomalies if a.alerted)
@@ -301,6 +426,15 @@ async def get_stats():
     }
 
 
+@app.get("/debug/cycle")
+async def debug_cycle(limit: int = 10):
+    """Get the timing breakdown of the most recent detection cycles, newest first."""
+    from . import detector as detection_module
+
+    cycles = list(detection_module.cycle_history)[::-1]
+    return {"cycles": cycles[: max(0, limit)]}
+
+
 if __name__ == "__main__":
     import uvicorn
 
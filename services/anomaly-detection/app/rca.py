@@ -9,8 +9,12 @@ This module performs root cause analysis when anomalies are detected by:
 5. Providing remediation suggestions and runbook links
 """
 
+import asyncio
 import logging
 import os
+import re
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import List
 
@@ -21,37 +25,70 @@ LLM_API_KEY = os.getenv("LLM_API_KEY", "")
 LLM_API_URL = os.getenv("LLM_API_URL", "https://api.openai.com/v1/chat/completions")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4")
 PROMETHEUS_URL = os.getenv("PROMETHEUS_URL", "http://prometheus-kube-prometheus-prometheus.fawkes.svc:9090")
-LOKI_URL = os.getenv("LOKI_URL", "http://loki.fawkes.svc:3100")
 ARGOCD_URL = os.getenv("ARGOCD_URL", "http://argocd-server.fawkes.svc:80")
-
-
-async def perform_root_cause_analysis(anomaly_detection, recent_anomalies: list):
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))  # 0 disables caching
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+
+# LLM suggestions keyed by anomaly signature: signature -> (stored_at, (likely_causes, remediation))
+_suggestion_cache: OrderedDict[str, tuple[float, tuple[list[str], list[str]]]] = OrderedDict()
+
+_PROMQL_GROUPING = re.compile(r"\b(?:by|without|on|ignoring|group_left|group_right)\s*\([^)]*\)")
+_PROMQL_SELECTORS = re.compile(r"\{[^}]*\}|\[[^\]]*\]")
+_PROMQL_IDENTIFIER = re.compile(r"[a-zA-Z_:][\w:]*(?![\w:(])")
+_PROMQL_KEYWORDS = {
+    "sum",
+    "min",
+    "max",
+    "avg",
+    "count",
+    "stddev",
+    "stdvar",
+    "topk",
+    "bottomk",
+    "quantile",
+    "count_values",
+    "group",
+    "bool",
+    "offset",
+    "and",
+    "or",
+    "unless",
+}
+
+
+async def perform_root_cause_analysis(anomaly_detection, recent_anomalies):
     """
     Perform comprehensive root cause analysis for an anomaly.
 
     Args:
         anomaly_detection: AnomalyDetection object
-        recent_anomalies: List of recent anomaly detections for correlation
+        recent_anomalies: Store (or iterable) of recent anomaly detections for correlation
     """
-    from .main import ROOT_CAUSE_ANALYSES, RootCause, http_client
+    from .main import RCA_STAGE_DURATION, ROOT_CAUSE_ANALYSES, RootCause, http_client
+
+    async def _timed(stage: str, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            RCA_STAGE_DURATION.labels(stage=stage).observe(time.perf_counter() - start)
 
     logger.info(f"Starting RCA for anomaly {anomaly_detection.id}")
 
     try:
         anomaly = anomaly_detection.anomaly
 
-        # 1. Collect recent events (deployments, config changes)
-        recent_events = await _collect_recent_events(anomaly.timestamp, http_client)
-
-        # 2. Query logs for errors around the anomaly time
-        log_errors = await _query_error_logs(anomaly.timestamp, anomaly.metric, http_client)
-
-        # 3. Check for correlated metrics
-        correlated_metrics = await _find_correlated_metrics(anomaly, recent_anomalies, http_client)
+        # 1-3. Collect recent events, error logs and correlated metrics concurrently
+        recent_events, log_errors, correlated_metrics = await asyncio.gather(
+            _timed("events", _collect_recent_events(anomaly.timestamp, http_client)),
+            _timed("logs", _query_error_logs(anomaly.timestamp, anomaly.metric, http_client)),
+            _timed("correlation", _find_correlated_metrics(anomaly, recent_anomalies, http_client)),
+        )
 
         # 4. Use LLM to generate root cause suggestions
-        likely_causes, remediation_suggestions = await _generate_llm_suggestions(
-            anomaly, recent_events, log_errors, correlated_metrics, http_client
+        likely_causes, remediation_suggestions = await _timed(
+            "suggestions",
+            _generate_llm_suggestions(anomaly, recent_events, log_errors, correlated_metrics, http_client),
         )
 
         # 5. Find relevant runbooks
@@ -129,7 +166,10 @@ async def _collect_recent_events(timestamp: datetime, http_client) -> list[str]:
 
 async def _query_error_logs(timestamp: datetime, metric: str, http_client) -> list[str]:
     """
-    Query logs for errors around the anomaly time.
+    Query Loki for the most frequent error log templates around the anomaly time.
+
+    The stream selector comes from the metric's labels (see ``app.loki``);
+    the response is streamed within a fixed line and byte budget.
 
     Args:
         timestamp: Anomaly timestamp
@@ -137,37 +177,46 @@ async def _query_error_logs(timestamp: datetime, metric: str, http_client) -> li
         http_client: HTTP client
 
     Returns:
-        List of error log entries
+        List of "<count>x <template>" entries, most frequent first
     """
+    from . import loki
+
     errors = []
 
     try:
-        # Query Loki for error logs (if available)
-        # This is a simplified version
-
-        # For now, return a placeholder
-        errors.append("Log querying requires Loki integration (pending)")
+        selector = loki.label_selector(metric)
+        if selector is None:
+            return [f"No workload labels on {metric} to select logs"]
+
+        templates = await loki.top_error_templates(
+            http_client,
+            selector,
+            timestamp - timedelta(minutes=loki.LOKI_WINDOW_MINUTES),
+            timestamp + timedelta(minutes=1),
+        )
+        errors = [f"{count}x {template}" for template, count in templates]
 
-        # In production, you would:
-        # 1. Parse metric to extract relevant labels (namespace, pod, etc.)
-        # 2. Query Loki with those labels
-        # 3. Filter for error level logs
-        # 4. Return recent errors around the timestamp
+        if not errors:
+            errors.append(f"No error logs found for {selector}")
 
     except Exception as e:
         logger.error(f"Error querying logs: {e}")
         errors.append(f"Error querying logs: {e!s}")
 
-    return errors[:10]  # Return top 10 errors
+    return errors
 
 
-async def _find_correlated_metrics(anomaly, recent_anomalies: list, http_client) -> list[str]:
+async def _find_correlated_metrics(anomaly, recent_anomalies, http_client) -> list[str]:
     """
     Find metrics that show anomalies correlated with this one.
 
+    Uses lagged correlation over the cached series (see
+    ``models.detector.find_correlated_series``) and falls back to other
+    anomalies detected within 5 minutes when the series is not cached.
+
     Args:
         anomaly: AnomalyScore object
-        recent_anomalies: List of recent anomalies
+        recent_anomalies: Store (or iterable) of recent anomalies
         http_client: HTTP client
 
     Returns:
@@ -175,8 +224,21 @@ async def _find_correlated_metrics(anomaly, recent_anomalies: list, http_client)
     """
     correlated = []
 
+    # Prefer real correlation over the series cached during detection
+    try:
+        from models import detector
+
+        matches = await detector.find_correlated_series(anomaly.metric, anomaly.timestamp)
+        if matches:
+            return [
+                f"{match['metric']} (r={match['coefficient']:+.2f}, lag={match['lag_seconds']:+.0f}s)"
+                for match in matches
+            ]
+    except Exception as e:
+        logger.error(f"Error correlating series: {e}")
+
     try:
-        # Find anomalies within 5 minutes of this one
+        # Fall back to anomalies within 5 minutes of this one
         time_window = timedelta(minutes=5)
 
         for other_detection in recent_anomalies:
@@ -206,6 +268,9 @@ async def _generate_llm_suggestions(
     """
     Use LLM to generate root cause suggestions and remediation steps.
 
+    Successful LLM answers are cached for LLM_CACHE_TTL_SECONDS under the
+    anomaly signature, so repeated incidents skip the LLM round-trip.
+
     Args:
         anomaly: AnomalyScore object
         recent_events: List of recent events
@@ -220,6 +285,15 @@ async def _generate_llm_suggestions(
         logger.warning("LLM API key not configured, using rule-based suggestions")
         return _generate_rule_based_suggestions(anomaly, recent_events, correlated_metrics)
 
+    from .main import LLM_SUGGESTION_CACHE
+
+    signature = _anomaly_signature(anomaly, recent_events)
+    cached = _get_cached_suggestions(signature)
+    if cached is not None:
+        LLM_SUGGESTION_CACHE.labels(result="hit").inc()
+        return cached
+    LLM_SUGGESTION_CACHE.labels(result="miss").inc()
+
     try:
         # Construct context for LLM
         context = f"""
@@ -285,6 +359,7 @@ REMEDIATION:
             likely_causes, remediation = _parse_llm_response(content)
 
             if likely_causes and remediation:
+                _cache_suggestions(signature, likely_causes, remediation)
                 return likely_causes, remediation
         else:
             logger.warning(f"LLM API returned status {response.status_code}")
@@ -296,6 +371,53 @@ REMEDIATION:
     return _generate_rule_based_suggestions(anomaly, recent_events, correlated_metrics)
 
 
+def _metric_family(metric: str) -> str:
+    """Reduce a PromQL query to the name of the metric family it reads."""
+    stripped = _PROMQL_SELECTORS.sub("", _PROMQL_GROUPING.sub("", metric))
+    names = [name for name in _PROMQL_IDENTIFIER.findall(stripped) if name not in _PROMQL_KEYWORDS]
+    if not names:
+        return metric
+
+    return re.sub(r"_(?:bucket|sum|count)$", "", names[0])
+
+
+def _anomaly_signature(anomaly, recent_events: list[str]) -> str:
+    """
+    Build the LLM cache key for an anomaly.
+
+    Anomalies on the same metric family, with the same severity and the same
+    recent events, get the same signature regardless of exact values and times.
+    """
+    events = "|".join(sorted({event.strip().lower() for event in recent_events}))
+    return f"{_metric_family(anomaly.metric)}:{anomaly.severity}:{events}"
+
+
+def _get_cached_suggestions(signature: str) -> tuple[list[str], list[str]] | None:
+    """Return cached suggestions for ``signature`` if present and fresh."""
+    entry = _suggestion_cache.get(signature)
+    if entry is None:
+        return None
+
+    stored_at, (likely_causes, remediation) = entry
+    if time.monotonic() - stored_at > LLM_CACHE_TTL_SECONDS:
+        del _suggestion_cache[signature]
+        return None
+
+    _suggestion_cache.move_to_end(signature)
+    return list(likely_causes), list(remediation)
+
+
+def _cache_suggestions(signature: str, likely_causes: list[str], remediation: list[str]):
+    """Store suggestions under ``signature``, evicting the least recently used beyond the cap."""
+    if LLM_CACHE_TTL_SECONDS <= 0:
+        return
+
+    _suggestion_cache[signature] = (time.monotonic(), (list(likely_causes), list(remediation)))
+    _suggestion_cache.move_to_end(signature)
+    while len(_suggestion_cache) > LLM_CACHE_MAX_ENTRIES:
+        _suggestion_cache.popitem(last=False)
+
+
 def _parse_llm_response(content: str) -> tuple[list[str], list[str]]:
     """Parse LLM response into causes and remediation lists."""
     causes = []
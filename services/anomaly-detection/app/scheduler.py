@@ -0,0 +1,98 @@
+"""
+Overrun-aware scheduling of detection queries.
+
+Each monitored query has its own interval and priority. The scheduler ticks
+on the wall clock every ``gcd`` of the intervals (so a 30s and a 5m query
+tick at :00 and :30) and runs the queries whose next slot has come due. A
+cycle that is still running at the next tick causes the ticks it overlapped
+to be missed rather than queued, and sheds the lowest priority tier from the
+following cycles until a cycle completes within its tick again. Shed queries
+stay due and run as soon as their tier is admitted again. Priority 0 is never
+shed.
+"""
+
+import math
+from typing import NamedTuple
+
+
+class ScheduledQuery(NamedTuple):
+    """A monitored PromQL query and its cadence."""
+
+    query: str
+    interval_seconds: int
+    priority: int = 0  # 0 is never shed; higher values are shed first
+
+
+class DetectionScheduler:
+    """Wall-clock aligned tick scheduler with priority shedding."""
+
+    def __init__(self, queries: list[ScheduledQuery]):
+        """
+        Initialize the scheduler.
+
+        Args:
+            queries: Monitored queries; intervals are whole seconds
+        """
+        self.queries = sorted(queries, key=lambda q: q.priority)
+        self.tick_seconds = math.gcd(*(q.interval_seconds for q in queries))
+        self.max_priority = max(q.priority for q in queries)
+        self.admitted_priority = self.max_priority
+        self.last_tick: float | None = None
+        self._next_due = {q.query: -math.inf for q in queries}
+
+    def next_tick(self, now: float) -> tuple[float, int]:
+        """
+        Return the next tick to run and how many ticks were missed before it.
+
+        The first tick is the current one. After a cycle that overran, the
+        most recent tick runs immediately and the ones it overlapped are
+        missed.
+        """
+        if self.last_tick is None:
+            return math.floor(now / self.tick_seconds) * self.tick_seconds, 0
+
+        following = self.last_tick + self.tick_seconds
+        if now <= following:
+            return following, 0
+
+        latest = math.floor(now / self.tick_seconds) * self.tick_seconds
+        return latest, int((latest - following) // self.tick_seconds)
+
+    def start(self, tick: float) -> tuple[list[str], list[str]]:
+        """
+        Begin the cycle of ``tick``.
+
+        Returns:
+            Tuple of (queries to run in priority order, due queries shed this tick)
+        """
+        self.last_tick = tick
+        run, shed = [], []
+
+        for q in self.queries:
+            if self._next_due[q.query] > tick:
+                continue
+            if q.priority > self.admitted_priority:
+                shed.append(q.query)
+                continue
+
+            run.append(q.query)
+            self._next_due[q.query] = (math.floor(tick / q.interval_seconds) + 1) * q.interval_seconds
+
+        return run, shed
+
+    def finish(self, now: float) -> bool:
+        """
+        End the current cycle and adapt shedding.
+
+        An overrunning cycle sheds one more priority tier; a cycle that ends
+        within its tick admits one back.
+
+        Returns:
+            Whether the cycle overran its tick
+        """
+        overran = now > self.last_tick + self.tick_seconds
+        if overran:
+            self.admitted_priority = max(0, self.admitted_priority - 1)
+        else:
+            self.admitted_priority = min(self.max_priority, self.admitted_priority + 1)
+        return overran
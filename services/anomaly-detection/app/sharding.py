@@ -0,0 +1,188 @@
+"""
+Horizontal sharding of anomaly detection across replicas.
+
+Every replica heartbeats into a shared membership backend and builds a
+consistent hash ring from the live members. A series is detected only by the
+replica that owns its label fingerprint on the ring, so N replicas each handle
+about 1/N of the series, and a join or leave only moves the series adjacent to
+that member on the ring.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SHARDING_BACKEND = os.getenv("SHARDING_BACKEND", "none")  # none, memory or redis
+SHARD_REDIS_URL = os.getenv("SHARD_REDIS_URL", "redis://redis.fawkes.svc:6379/0")
+SHARD_REPLICA_ID = os.getenv("SHARD_REPLICA_ID", os.getenv("HOSTNAME", f"anomaly-detection-{uuid.uuid4().hex[:8]}"))
+SHARD_HEARTBEAT_SECONDS = float(os.getenv("SHARD_HEARTBEAT_SECONDS", "10"))
+SHARD_MEMBER_TTL_SECONDS = float(os.getenv("SHARD_MEMBER_TTL_SECONDS", "30"))
+SHARD_VIRTUAL_NODES = int(os.getenv("SHARD_VIRTUAL_NODES", "64"))
+
+
+def _hash(key: str) -> int:
+    """Map a key onto the 64-bit ring."""
+    return int(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes."""
+
+    def __init__(self, members: list[str], virtual_nodes: int = SHARD_VIRTUAL_NODES):
+        """Place ``virtual_nodes`` points on the ring for each member."""
+        self.members = sorted(members)
+        points = sorted((_hash(f"{member}#{i}"), member) for member in self.members for i in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> str | None:
+        """Return the member owning ``key``, or None for an empty ring."""
+        if not self._hashes:
+            return None
+
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class InMemoryMembership:
+    """Process-local membership backend, for single-replica runs and tests."""
+
+    def __init__(self):
+        self._last_seen: dict[str, float] = {}
+
+    async def heartbeat(self, member_id: str, ttl_seconds: float):
+        self._last_seen[member_id] = time.time()
+
+    async def members(self, ttl_seconds: float) -> list[str]:
+        cutoff = time.time() - ttl_seconds
+        self._last_seen = {m: seen for m, seen in self._last_seen.items() if seen >= cutoff}
+        return sorted(self._last_seen)
+
+    async def leave(self, member_id: str):
+        self._last_seen.pop(member_id, None)
+
+
+class RedisMembership:
+    """Membership backend storing heartbeats in a Redis sorted set."""
+
+    KEY = "anomaly-detection:shard-members"
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    async def heartbeat(self, member_id: str, ttl_seconds: float):
+        await self.redis.zadd(self.KEY, {member_id: time.time()})
+
+    async def members(self, ttl_seconds: float) -> list[str]:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zremrangebyscore(self.KEY, 0, time.time() - ttl_seconds)
+        pipe.zrange(self.KEY, 0, -1)
+        _, members = await pipe.execute()
+        return sorted(m.decode() if isinstance(m, bytes) else m for m in members)
+
+    async def leave(self, member_id: str):
+        await self.redis.zrem(self.KEY, member_id)
+
+
+class ShardCoordinator:
+    """Tracks live replicas and decides which series this replica owns."""
+
+    def __init__(
+        self,
+        backend,
+        replica_id: str,
+        heartbeat_seconds: float = SHARD_HEARTBEAT_SECONDS,
+        member_ttl_seconds: float = SHARD_MEMBER_TTL_SECONDS,
+        virtual_nodes: int = SHARD_VIRTUAL_NODES,
+    ):
+        """
+        Initialize the coordinator.
+
+        Args:
+            backend: Membership backend (InMemoryMembership or RedisMembership)
+            replica_id: Unique id of this replica, normally the pod name
+            heartbeat_seconds: Interval between heartbeats and membership refreshes
+            member_ttl_seconds: Members silent for longer than this are dropped
+            virtual_nodes: Ring points per member
+        """
+        self.backend = backend
+        self.replica_id = replica_id
+        self.heartbeat_seconds = heartbeat_seconds
+        self.member_ttl_seconds = member_ttl_seconds
+        self.virtual_nodes = virtual_nodes
+        self.ring = HashRing([], virtual_nodes)
+        self.rebalances = 0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def members(self) -> list[str]:
+        return self.ring.members
+
+    def owns(self, fingerprint: str) -> bool:
+        """
+        Check whether this replica should detect on a series.
+
+        Fails open: with no known members every series is owned, so a
+        membership outage degrades to duplicate work rather than no detection.
+        """
+        owner = self.ring.owner(fingerprint)
+        return owner is None or owner == self.replica_id
+
+    async def refresh(self):
+        """Heartbeat and rebuild the ring if membership changed."""
+        try:
+            await self.backend.heartbeat(self.replica_id, self.member_ttl_seconds)
+            members = await self.backend.members(self.member_ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Shard membership refresh failed, keeping {len(self.members)} members: {e}")
+            return
+
+        if members != self.members:
+            logger.info(f"Shard membership changed: {self.members} -> {members}")
+            self.ring = HashRing(members, self.virtual_nodes)
+            self.rebalances += 1
+
+    async def start(self):
+        """Join the ring and start heartbeating."""
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop heartbeating and leave the ring so peers rebalance immediately."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        try:
+            await self.backend.leave(self.replica_id)
+        except Exception as e:
+            logger.warning(f"Failed to leave shard ring: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            await self.refresh()
+
+
+def create_shard_coordinator() -> ShardCoordinator | None:
+    """Build a coordinator from SHARDING_BACKEND, or None when sharding is off."""
+    if SHARDING_BACKEND == "none":
+        return None
+
+    if SHARDING_BACKEND == "memory":
+        backend = InMemoryMembership()
+    elif SHARDING_BACKEND == "redis":
+        import redis.asyncio as redis
+
+        backend = RedisMembership(redis.Redis.from_url(SHARD_REDIS_URL))
+    else:
+        raise ValueError(f"Unknown sharding backend: {SHARDING_BACKEND}")
+
+    return ShardCoordinator(backend, SHARD_REPLICA_ID)
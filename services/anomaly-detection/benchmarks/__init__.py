@@ -0,0 +1 @@
+"""Benchmarks for the anomaly detection service."""
@@ -0,0 +1,288 @@
+"""
+Benchmark of the continuous detection cycle against a fake Prometheus.
+
+For each scenario (number of series) a fresh process runs
+``run_continuous_detection`` against the synthetic series served by
+``benchmarks.fake_prometheus`` for a fixed number of cycles, and reports:
+
+- cold cycle time (first cycle: full window fetch and model training)
+- p50/p95 of the warm cycle times
+- CPU time per detection method per warm cycle
+- peak RSS of the detection process
+- recall of the injected anomalies and the number of clean series flagged
+
+An anomalous series counts as detected when it is reported at a spike or at
+the step after it, where rate of change flags the return to normal.
+
+Detection runs inline on the event loop thread so per-method CPU time can be
+measured with ``time.thread_time``. The detector's clock is moved one query
+step ahead before each warm cycle, so every measured cycle fetches a new step
+and runs detection as it would in production. Results are written as JSON; passing an
+earlier results file with ``--compare`` reports regressions against it.
+
+Usage:
+    python -m benchmarks.detection_cycle --output benchmark.json
+    python -m benchmarks.detection_cycle --series 1,100 --cycles 3 --compare benchmark.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import re
+import resource
+import subprocess  # nosec B404
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from .fake_prometheus import FakePrometheus, is_anomalous, is_spike
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERIES_COUNTS = (1, 100, 1000, 10000)
+LOOKBACK_MINUTES = 60
+STEP_SECONDS = 60
+
+# Higher is worse for these keys; recall is compared separately
+COMPARED_KEYS = ("cold_cycle_seconds", "cycle_p50_seconds", "cycle_p95_seconds", "peak_rss_mb")
+
+POD_PATTERN = re.compile(r"pod=pod-(\d+)")
+
+
+class MethodTimer:
+    """Accumulates the thread CPU time spent in wrapped functions."""
+
+    def __init__(self):
+        self.seconds: dict[str, float] = {}
+
+    def wrap(self, name: str, func):
+        """Return ``func`` wrapped to add its CPU time to ``name``."""
+
+        def timed(*args, **kwargs):
+            start = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds[name] = self.seconds.get(name, 0.0) + time.thread_time() - start
+
+        return timed
+
+    def reset(self):
+        self.seconds = {}
+
+
+class SteppedClock(datetime):
+    """``datetime`` whose ``now`` runs ``offset_seconds`` ahead of the wall clock."""
+
+    offset_seconds = 0.0
+
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.now(tz) + timedelta(seconds=cls.offset_seconds)
+
+
+def _environment(prometheus_url: str, model_dir: str) -> dict:
+    """Service configuration for a benchmark run; read by the app modules at import."""
+    return {
+        "PROMETHEUS_URL": prometheus_url,
+        "ALERTMANAGER_URL": prometheus_url,
+        "LOKI_URL": prometheus_url,
+        "ARGOCD_URL": prometheus_url,
+        "LLM_API_KEY": "",
+        "DETECTION_CYCLE_BUDGET_SECONDS": "3600",
+        "LOOKBACK_MINUTES": str(LOOKBACK_MINUTES),
+        "QUERY_STEP_SECONDS": str(STEP_SECONDS),
+        "BASELINE_ENABLED": "false",
+        "MODEL_REGISTRY_DIR": model_dir,
+    }
+
+
+def run_scenario(prometheus_url: str, series_count: int, cycles: int) -> dict:
+    """
+    Run ``cycles`` warm detection cycles (after one cold cycle) in this process.
+
+    Must run in a fresh process: the service reads its configuration at import.
+
+    Returns:
+        Scenario results
+    """
+    with tempfile.TemporaryDirectory() as model_dir:
+        os.environ.update(_environment(prometheus_url, model_dir))
+        logging.getLogger().setLevel(logging.WARNING)
+
+        import httpx
+        from app import detector as detection_module
+        from app import main
+        from app.scheduler import ScheduledQuery
+        from models import detector, kernel
+
+        detector.initialize_models()
+
+        timer = MethodTimer()
+        for name in ("zscore", "iqr", "rate_of_change"):
+            setattr(kernel, f"{name}_candidates", timer.wrap(name, getattr(kernel, f"{name}_candidates")))
+        kernel.pattern_deviation_candidates = timer.wrap("pattern_deviation", kernel.pattern_deviation_candidates)
+        detector._isolation_forest_candidates = timer.wrap("isolation_forest", detector._isolation_forest_candidates)
+
+        # Tick every second; cycles longer than that start straight away
+        detection_module.MONITORED_QUERIES = [ScheduledQuery("synthetic_metric", 1)]
+        reports = []
+        detected = []
+        done = asyncio.Event()
+        run_detection_cycle = detection_module.run_detection_cycle
+
+        # Series only advance once per query step; step the detector's clock so warm cycles have new samples
+        detector.datetime = SteppedClock
+
+        async def measured_cycle(queries, http_client, budget_seconds=None):
+            if len(reports) == 1:
+                timer.reset()  # Report CPU time of warm cycles only
+            if len(reports) > cycles:
+                done.set()
+                await asyncio.Future()  # Wait here until cancelled
+            if reports:
+                SteppedClock.offset_seconds += STEP_SECONDS
+
+            anomalies, report = await run_detection_cycle(queries, http_client, budget_seconds)
+            detected.extend(anomalies)
+            reports.append(report)  # Completed with the cycle's total time by the detection loop
+            return anomalies, report
+
+        detection_module.run_detection_cycle = measured_cycle
+
+        async def _run():
+            main.http_client = httpx.AsyncClient(timeout=30.0)
+            task = asyncio.create_task(detection_module.run_continuous_detection())
+            await done.wait()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await main.http_client.aclose()
+
+        asyncio.run(_run())
+
+    durations = np.array([report["total_seconds"] for report in reports])
+    warm = durations[1:]
+
+    anomalous = {i for i in range(series_count) if is_anomalous(i)}
+    found = set()
+    flagged_clean = set()
+    for anomaly in detected:
+        match = POD_PATTERN.search(anomaly.metric)
+        if not match:
+            continue
+        index = int(match.group(1))
+        timestamp = anomaly.timestamp.timestamp()
+        if index not in anomalous:
+            flagged_clean.add(index)
+        elif is_spike(timestamp - np.array([0, STEP_SECONDS]), STEP_SECONDS).any():
+            found.add(index)
+
+    return {
+        "series": series_count,
+        "samples_per_series": LOOKBACK_MINUTES * 60 // STEP_SECONDS,
+        "cycles": cycles,
+        "cold_cycle_seconds": round(float(durations[0]), 4),
+        "cycle_p50_seconds": round(float(np.percentile(warm, 50)), 4),
+        "cycle_p95_seconds": round(float(np.percentile(warm, 95)), 4),
+        "method_cpu_seconds": {name: round(seconds / cycles, 4) for name, seconds in sorted(timer.seconds.items())},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "model_fits": detector.model_registry.fits,
+        "anomalous_series": len(anomalous),
+        "recall": round(len(found) / len(anomalous), 4) if anomalous else None,
+        "clean_series_flagged": len(flagged_clean),
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    """
+    List regressions of ``current`` against ``baseline``.
+
+    A timing or memory figure regresses when it grows by more than
+    ``tolerance`` (relative); recall regresses on any drop. Scenarios missing
+    from either file are ignored.
+    """
+    regressions = []
+    for series, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(series)
+        if previous is None:
+            continue
+
+        for key in COMPARED_KEYS:
+            if previous.get(key) and result[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{series} series: {key} {previous[key]} -> {result[key]}")
+
+        if previous.get("recall") is not None and result["recall"] < previous["recall"]:
+            regressions.append(f"{series} series: recall {previous['recall']} -> {result['recall']}")
+
+    return regressions
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(  # nosec B603 B607
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the anomaly detection cycle")
+    parser.add_argument(
+        "--series",
+        default=",".join(str(count) for count in DEFAULT_SERIES_COUNTS),
+        help="Comma-separated series counts to run",
+    )
+    parser.add_argument("--cycles", type=int, default=5, help="Warm cycles measured per scenario")
+    parser.add_argument("--output", default="benchmark.json", help="Results file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before failing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "scenarios": {},
+    }
+
+    with FakePrometheus() as prometheus:
+        for series_count in (int(count) for count in args.series.split(",")):
+            logger.info(f"Running {args.cycles} cycles over {series_count} series")
+            # One process per scenario so module state and peak RSS start fresh
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(run_scenario, prometheus.url(series_count), series_count, args.cycles).result()
+            results["scenarios"][str(series_count)] = result
+            logger.info(
+                f"{series_count} series: p50 {result['cycle_p50_seconds']}s, p95 {result['cycle_p95_seconds']}s, "
+                f"peak RSS {result['peak_rss_mb']} MB, recall {result['recall']}"
+            )
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for regression in regressions:
+            logger.warning(f"Regression: {regression}")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
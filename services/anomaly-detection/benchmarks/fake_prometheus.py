@@ -0,0 +1,156 @@
+"""
+Local stand-in for the Prometheus HTTP API serving synthetic series.
+
+The server runs in its own process so its CPU and memory stay out of the
+measurements of the detection cycle. The number of series a range query
+returns is taken from the first path segment, so one server can back
+several scenarios: ``http://127.0.0.1:<port>/1000`` serves 1000 series.
+
+Values are a deterministic function of the series index and timestamp: a
+slow daily cycle around a per-series level plus small pseudo-random noise.
+Every ANOMALY_EVERY-th series carries a 5x spike on every SPIKE_PERIOD-th
+step, so a 60-step window holds two injected anomalies per anomalous series.
+Any other GET (instant queries, Loki) returns an empty result and POSTs
+(Alertmanager) are accepted.
+"""
+
+import json
+import logging
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METRIC_NAME = "synthetic_metric"
+ANOMALY_EVERY = 20
+SPIKE_PERIOD = 30
+SPIKE_OFFSET = 7
+SPIKE_FACTOR = 5.0
+
+EMPTY_RESULT = {"status": "success", "data": {"resultType": "vector", "result": []}}
+
+
+def series_labels(index: int) -> dict:
+    """Return the labels of synthetic series ``index``."""
+    return {"__name__": METRIC_NAME, "namespace": "benchmark", "pod": f"pod-{index}"}
+
+
+def is_anomalous(index: int) -> bool:
+    """Check whether synthetic series ``index`` carries injected spikes."""
+    return index % ANOMALY_EVERY == 0
+
+
+def is_spike(timestamps: np.ndarray, step_seconds: int) -> np.ndarray:
+    """Mask of the timestamps at which anomalous series spike."""
+    return np.floor_divide(timestamps, step_seconds).astype(np.int64) % SPIKE_PERIOD == SPIKE_OFFSET
+
+
+def synthetic_values(series_count: int, timestamps: np.ndarray, step_seconds: int) -> np.ndarray:
+    """
+    Generate the (series_count, len(timestamps)) value matrix.
+
+    Args:
+        series_count: Number of series
+        timestamps: Unix timestamps on the step grid
+        step_seconds: Query step, used to place the spikes
+
+    Returns:
+        Value matrix with spikes injected into the anomalous series
+    """
+    index = np.arange(series_count, dtype=np.float64)[:, None]
+    steps = np.floor_divide(timestamps, step_seconds).astype(np.float64)[None, :]
+
+    level = 100.0 + (index % 50) * 10.0
+    seasonal = 0.1 * level * np.sin(2 * np.pi * timestamps[None, :] / 86400.0 + index)
+    noise = (np.sin(index * 12.9898 + steps * 78.233) * 43758.5453) % 1.0 - 0.5
+    values = level + seasonal + 0.02 * level * noise
+
+    anomalous = np.flatnonzero(np.arange(series_count) % ANOMALY_EVERY == 0)
+    spikes = np.flatnonzero(is_spike(timestamps, step_seconds))
+    values[np.ix_(anomalous, spikes)] = level[anomalous] * SPIKE_FACTOR
+
+    return values
+
+
+def range_query_response(series_count: int, start: float, end: float, step_seconds: int) -> dict:
+    """Build a Prometheus range-query response body."""
+    # Half a step past the end includes it; a fixed epsilon is lost at epoch magnitudes
+    timestamps = np.arange(start, end + step_seconds / 2, step_seconds)
+    values = synthetic_values(series_count, timestamps, step_seconds)
+    stamps = [float(t) if t % 1 else int(t) for t in timestamps]
+
+    return {
+        "status": "success",
+        "data": {
+            "resultType": "matrix",
+            "result": [
+                {"metric": series_labels(i), "values": [[t, f"{v:.6g}"] for t, v in zip(stamps, row)]}
+                for i, row in enumerate(values)
+            ],
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        prefix, _, path = url.path.lstrip("/").partition("/")
+
+        if path == "api/v1/query_range" and prefix.isdigit():
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            step_seconds = int(float(params.get("step", "60s").rstrip("s")))
+            body = range_query_response(int(prefix), float(params["start"]), float(params["end"]), step_seconds)
+        else:
+            body = EMPTY_RESULT
+
+        self._reply(200, body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(200, {})
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(conn):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    conn.send(server.server_address[1])
+    conn.close()
+    server.serve_forever()
+
+
+class FakePrometheus:
+    """Context manager running the fake Prometheus server in a child process."""
+
+    def __init__(self):
+        self.port = None
+        self._process = None
+
+    def url(self, series_count: int) -> str:
+        """Base URL serving ``series_count`` series."""
+        return f"http://127.0.0.1:{self.port}/{series_count}"
+
+    def __enter__(self):
+        context = multiprocessing.get_context("spawn")
+        parent, child = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child,), daemon=True)
+        self._process.start()
+        self.port = parent.recv()
+        logger.info(f"Fake Prometheus listening on port {self.port}")
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
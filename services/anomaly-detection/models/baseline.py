@@ -0,0 +1,269 @@
+"""
+Precomputed seasonal baselines for the Pattern Deviation detector.
+
+Each series gets a weekly profile with one slot per BASELINE_STEP_SECONDS of
+the week (2016 slots at 5-minute resolution), so both hour-of-day and
+day-of-week seasonality are captured. Each slot holds the running mean and
+variance of the values seen at that time of week over the last
+BASELINE_HISTORY_DAYS. Profiles are built once from history, then updated
+incrementally with the samples of the previous day. They are stored per query
+as float32 arrays in a ``.npz`` file, so detection gets the expected value of
+any sample with one array lookup instead of querying weeks of data.
+"""
+
+import logging
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+
+from .series_cache import parse_samples, series_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+BASELINE_ENABLED = os.getenv("BASELINE_ENABLED", "true").lower() == "true"
+BASELINE_DIR = os.getenv("BASELINE_DIR", "/tmp/anomaly-detection/baselines")  # nosec B108
+BASELINE_HISTORY_DAYS = int(os.getenv("BASELINE_HISTORY_DAYS", "28"))
+BASELINE_STEP_SECONDS = int(os.getenv("BASELINE_STEP_SECONDS", "300"))
+BASELINE_UPDATE_INTERVAL_SECONDS = int(os.getenv("BASELINE_UPDATE_INTERVAL_SECONDS", "86400"))
+BASELINE_MIN_WEEKS = int(os.getenv("BASELINE_MIN_WEEKS", "2"))
+PATTERN_DEVIATION_THRESHOLD = float(os.getenv("PATTERN_DEVIATION_THRESHOLD", "3.0"))
+
+WEEK_SECONDS = 7 * 24 * 3600
+DAY_SECONDS = 24 * 3600
+EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday; slot 0 is Monday 00:00 UTC
+
+
+def week_slots(timestamps: np.ndarray, step_seconds: int = BASELINE_STEP_SECONDS) -> np.ndarray:
+    """Map Unix timestamps to their slot in the UTC week."""
+    slots_per_day = DAY_SECONDS // step_seconds
+    slots_per_week = WEEK_SECONDS // step_seconds
+    return (np.floor_divide(timestamps, step_seconds).astype(np.int64) + EPOCH_WEEKDAY * slots_per_day) % slots_per_week
+
+
+class QueryBaseline:
+    """
+    Weekly profiles for every series of one query.
+
+    The profile arrays are allocated with spare rows that double as series
+    are added; only the first ``len(self)`` rows are in use.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.rows: dict[str, int] = {}
+        self.mean = np.zeros((0, slots), dtype=np.float32)
+        self.var = np.zeros((0, slots), dtype=np.float32)
+        self.count = np.zeros((0, slots), dtype=np.uint16)
+        self.updated_until = -math.inf
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _row(self, fingerprint: str) -> int:
+        """Return the row of ``fingerprint``, adding an empty profile if needed."""
+        row = self.rows.get(fingerprint)
+        if row is None:
+            row = len(self.rows)
+            if row == len(self.mean):
+                self._grow(max(16, 2 * row))
+            self.rows[fingerprint] = row
+        return row
+
+    def _grow(self, capacity: int):
+        """Reallocate the profile arrays with room for ``capacity`` series."""
+        used = len(self.rows)
+        for name in ("mean", "var", "count"):
+            current = getattr(self, name)
+            grown = np.zeros((capacity, self.slots), dtype=current.dtype)
+            grown[:used] = current[:used]
+            setattr(self, name, grown)
+
+    def update(self, fingerprint: str, slots: np.ndarray, values: np.ndarray, max_weeks: int):
+        """
+        Fold one sample per slot into a series' profile.
+
+        The running mean and variance weight the newest sample by
+        ``1 / min(count, max_weeks)``, so each slot tracks roughly the last
+        ``max_weeks`` weeks.
+        """
+        keep = ~np.isnan(values)
+        slots, values = slots[keep], values[keep]
+        if not len(slots):
+            return
+
+        row = self._row(fingerprint)
+        count = np.minimum(self.count[row, slots].astype(np.int64) + 1, max_weeks)
+        mean = self.mean[row, slots].astype(np.float64)
+        var = self.var[row, slots].astype(np.float64)
+
+        delta = values - mean
+        mean += delta / count
+        var += (delta * (values - mean) - var) / count
+
+        self.mean[row, slots] = mean
+        self.var[row, slots] = var
+        self.count[row, slots] = count
+
+    def lookup(self, fingerprint: str, slots: np.ndarray, min_count: int) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Return (expected, spread) for the given slots, NaN where the profile is too thin.
+
+        Returns None when the series has no profile.
+        """
+        row = self.rows.get(fingerprint)
+        if row is None:
+            return None
+
+        known = self.count[row, slots] >= min_count
+        expected = np.where(known, self.mean[row, slots], np.nan)
+        spread = np.where(known, np.sqrt(np.maximum(self.var[row, slots], 0.0)), np.nan)
+        return expected.astype(np.float64), spread.astype(np.float64)
+
+
+class BaselineStore:
+    """Seasonal baselines for all monitored queries, persisted as float32 arrays."""
+
+    def __init__(
+        self,
+        baseline_dir: str = BASELINE_DIR,
+        history_days: int = BASELINE_HISTORY_DAYS,
+        step_seconds: int = BASELINE_STEP_SECONDS,
+        min_weeks: int = BASELINE_MIN_WEEKS,
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            baseline_dir: Directory for persisted profiles (empty to keep them in memory only)
+            history_days: History used for the initial build; also bounds slot weights
+            step_seconds: Profile resolution
+            min_weeks: Samples a slot needs before it produces an expected value
+        """
+        self.baseline_dir = Path(baseline_dir) if baseline_dir else None
+        self.history_days = history_days
+        self.step_seconds = step_seconds
+        self.min_weeks = min_weeks
+        self.slots = WEEK_SECONDS // step_seconds
+        self.max_weeks = max(1, math.ceil(history_days / 7))
+        self._baselines: dict[str, QueryBaseline] = {}
+        self._missing: set[str] = set()  # Queries with no persisted baseline, so get() checks disk once
+
+        if self.baseline_dir:
+            self.baseline_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, query: str) -> QueryBaseline | None:
+        """Return the baseline of ``query``, loading it from disk on first use."""
+        baseline = self._baselines.get(query)
+        if baseline is None and query not in self._missing:
+            baseline = self._load(query)
+            if baseline is None:
+                self._missing.add(query)
+            else:
+                self._baselines[query] = baseline
+        return baseline
+
+    def expected(self, query: str, fingerprint: str, timestamps: np.ndarray) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Look up the expected value and spread of a series at ``timestamps``.
+
+        Returns:
+            Tuple of (expected, spread) arrays, or None when no profile exists
+        """
+        baseline = self.get(query)
+        if baseline is None:
+            return None
+        return baseline.lookup(fingerprint, week_slots(timestamps, self.step_seconds), self.min_weeks)
+
+    def pending_ranges(self, query: str, now: float) -> list[tuple[float, float]]:
+        """
+        Return the day-long (start, end) ranges still to be folded into ``query``'s profiles.
+
+        The first build covers BASELINE_HISTORY_DAYS; later calls only cover the
+        days completed since the last update. Ranges never exceed one day, so a
+        range holds at most one sample per slot.
+        """
+        end = math.floor(now / DAY_SECONDS) * DAY_SECONDS
+        baseline = self.get(query)
+        start = end - self.history_days * DAY_SECONDS
+        if baseline is not None and baseline.updated_until > start:
+            start = baseline.updated_until
+
+        return [(day, day + DAY_SECONDS - self.step_seconds) for day in range(int(start), int(end), DAY_SECONDS)]
+
+    def ingest(self, query: str, results: list[dict], end: float):
+        """
+        Fold a range-query result into ``query``'s profiles.
+
+        Args:
+            query: PromQL query the results belong to
+            results: ``data.result`` list from a Prometheus range query at ``step_seconds``
+            end: End of the range that was fetched
+        """
+        baseline = self.get(query)
+        if baseline is None:
+            baseline = self._baselines[query] = QueryBaseline(self.slots)
+
+        for series in results:
+            samples = series.get("values", [])
+            if not samples:
+                continue
+
+            timestamps, values = parse_samples(samples)
+            baseline.update(
+                series_fingerprint(series.get("metric", {})),
+                week_slots(timestamps, self.step_seconds),
+                values,
+                self.max_weeks,
+            )
+
+        baseline.updated_until = end + self.step_seconds
+
+    def _path(self, query: str) -> Path:
+        return self.baseline_dir / f"{series_fingerprint({'query': query})}.npz"
+
+    def save(self, query: str):
+        """Persist ``query``'s profiles."""
+        baseline = self._baselines.get(query)
+        if not self.baseline_dir or baseline is None:
+            return
+
+        try:
+            with open(self._path(query), "wb") as f:
+                np.savez(
+                    f,
+                    fingerprints=np.array(sorted(baseline.rows, key=baseline.rows.get)),
+                    mean=baseline.mean[: len(baseline)],
+                    var=baseline.var[: len(baseline)],
+                    count=baseline.count[: len(baseline)],
+                    updated_until=np.float64(baseline.updated_until),
+                )
+        except OSError as e:
+            logger.warning(f"Failed to persist baseline for {query}: {e}")
+
+    def _load(self, query: str) -> QueryBaseline | None:
+        if not self.baseline_dir:
+            return None
+
+        path = self._path(query)
+        if not path.exists():
+            return None
+
+        try:
+            with np.load(path) as data:
+                if data["mean"].shape[1] != self.slots:
+                    logger.info(f"Discarding baseline for {query} built at a different resolution")
+                    return None
+
+                baseline = QueryBaseline(self.slots)
+                baseline.rows = {str(fingerprint): row for row, fingerprint in enumerate(data["fingerprints"])}
+                baseline.mean = data["mean"]
+                baseline.var = data["var"]
+                baseline.count = data["count"]
+                baseline.updated_until = float(data["updated_until"])
+                return baseline
+        except Exception as e:
+            logger.warning(f"Failed to load baseline for {query}: {e}")
+            return None
@@ -0,0 +1,131 @@
+"""
+Cross-series correlation for root cause analysis.
+
+Series already held in the series cache are aligned onto the query step grid
+and stacked into a ``(series x timesteps)`` matrix. Lagged Pearson or Spearman
+correlation against the anomalous series is then computed for every row at
+once, one shift of the target per lag. A time-bucketed activity index keeps the
+candidate set to series that reported samples in the window being analysed
+(see ``SeriesCache.active_series``).
+"""
+
+import os
+
+import numpy as np
+from scipy.stats import rankdata
+
+# Configuration
+CORRELATION_METHOD = os.getenv("CORRELATION_METHOD", "pearson")  # pearson or spearman
+CORRELATION_WINDOW_MINUTES = int(os.getenv("CORRELATION_WINDOW_MINUTES", "30"))
+CORRELATION_MAX_LAG_STEPS = int(os.getenv("CORRELATION_MAX_LAG_STEPS", "5"))
+CORRELATION_TOP_K = int(os.getenv("CORRELATION_TOP_K", "5"))
+CORRELATION_MIN_COEFFICIENT = float(os.getenv("CORRELATION_MIN_COEFFICIENT", "0.7"))
+
+# Minimum overlapping samples for a coefficient to count
+MIN_OVERLAP = 5
+
+
+def stack_window(series: list[tuple[np.ndarray, np.ndarray]], start: float, step: float, width: int) -> np.ndarray:
+    """
+    Align series onto a step grid and stack them into a NaN-padded matrix.
+
+    Args:
+        series: (timestamps, values) pairs
+        start: Timestamp of the first grid column
+        step: Grid resolution in seconds
+        width: Number of grid columns
+
+    Returns:
+        Array of shape (len(series), width)
+    """
+    matrix = np.full((len(series), width), np.nan, dtype=np.float64)
+
+    for row, (timestamps, values) in enumerate(series):
+        columns = np.rint((timestamps - start) / step).astype(np.int64)
+        inside = (columns >= 0) & (columns < width)
+        matrix[row, columns[inside]] = values[inside]
+
+    return matrix
+
+
+def _rank(matrix: np.ndarray) -> np.ndarray:
+    """Replace values with their per-row ranks (ties averaged), keeping NaN gaps."""
+    missing = np.isnan(matrix)
+    ranks = rankdata(np.where(missing, np.inf, matrix), axis=-1)
+    ranks[missing] = np.nan
+    return ranks
+
+
+def _pearson(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Pearson correlation of ``x`` with every row of ``y`` over pairwise-complete samples."""
+    mask = ~np.isnan(y) & ~np.isnan(x)
+    n = mask.sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        xs = np.where(mask, x, 0.0)
+        ys = np.where(mask, y, 0.0)
+        x_mean = xs.sum(axis=1) / n
+        y_mean = ys.sum(axis=1) / n
+        dx = np.where(mask, x - x_mean[:, None], 0.0)
+        dy = np.where(mask, y - y_mean[:, None], 0.0)
+        r = (dx * dy).sum(axis=1) / np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1))
+
+    r[(n < MIN_OVERLAP) | ~np.isfinite(r)] = np.nan
+    return r
+
+
+def lagged_correlation(
+    target: np.ndarray, matrix: np.ndarray, max_lag: int, method: str = "pearson"
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Correlate ``target`` against every row of ``matrix`` over a range of lags.
+
+    A positive lag means the row leads the target: ``target[t]`` is compared
+    with ``row[t - lag]``.
+
+    Args:
+        target: Anomalous series on the grid, shape (T,)
+        matrix: Candidate series on the same grid, shape (S, T)
+        max_lag: Largest shift tried in either direction, in grid steps
+        method: "pearson" or "spearman"
+
+    Returns:
+        Tuple of (coefficients, lags) with the strongest coefficient per row
+        (NaN where no lag had enough overlap)
+    """
+    if method == "spearman":
+        target = _rank(target)
+        matrix = _rank(matrix)
+    elif method != "pearson":
+        raise ValueError(f"Unknown correlation method: {method}")
+
+    width = len(target)
+    best = np.full(len(matrix), np.nan)
+    best_lag = np.zeros(len(matrix), dtype=np.int64)
+
+    for lag in range(-max_lag, max_lag + 1):
+        start, end = max(lag, 0), width + min(lag, 0)
+        if end - start < MIN_OVERLAP:
+            continue
+
+        r = _pearson(target[None, start:end], matrix[:, start - lag : end - lag])
+        better = np.abs(r) > np.nan_to_num(np.abs(best), nan=-1.0)
+        best[better] = r[better]
+        best_lag[better] = lag
+
+    return best, best_lag
+
+
+def top_correlated(
+    coefficients: np.ndarray, lags: np.ndarray, k: int, min_coefficient: float
+) -> list[tuple[int, float, int]]:
+    """
+    Pick the ``k`` rows with the strongest absolute correlation.
+
+    Returns:
+        List of (row, coefficient, lag) sorted by descending strength
+    """
+    strength = np.nan_to_num(np.abs(coefficients), nan=0.0)
+    rows = np.flatnonzero(strength >= min_coefficient)
+    rows = rows[np.argsort(-strength[rows], kind="stable")][:k]
+    return [(int(row), float(coefficients[row]), int(lags[row])) for row in rows]
@@ -4,18 +4,26 @@ ML-based anomaly detector using multiple algorithms.
 Implements:
 - Isolation Forest for general anomaly detection
 - Statistical methods (Z-score, IQR)
-- Time series forecasting (Prophet) for trend-based anomalies
+- Pattern deviation from precomputed seasonal baselines
 """
 
+import asyncio
 import logging
 import os
-from datetime import datetime, timedelta, timezone
+import time
+from datetime import datetime, timezone
 from typing import Dict, List, Tuple
 
 import numpy as np
+from sklearn.base import clone
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 
+from . import correlation, kernel
+from .baseline import BASELINE_ENABLED, BASELINE_STEP_SECONDS, PATTERN_DEVIATION_THRESHOLD, BaselineStore
+from .model_registry import ModelRegistry
+from .series_cache import SeriesCache, series_fingerprint
+
 logger = logging.getLogger(__name__)
 
 # Configuration
@@ -25,25 +33,73 @@ MIN_SAMPLES = int(os.getenv("MIN_SAMPLES", "10"))
 ZSCORE_THRESHOLD = float(os.getenv("ZSCORE_THRESHOLD", "3.0"))
 IQR_MULTIPLIER = float(os.getenv("IQR_MULTIPLIER", "1.5"))
 CONFIDENCE_LOW_THRESHOLD = float(os.getenv("CONFIDENCE_LOW_THRESHOLD", "0.7"))
+QUERY_STEP_SECONDS = int(os.getenv("QUERY_STEP_SECONDS", "60"))
+SERIES_CACHE_ENABLED = os.getenv("SERIES_CACHE_ENABLED", "true").lower() == "true"
+SERIES_VALUE_DTYPE = os.getenv("SERIES_VALUE_DTYPE", "float64")  # float64 or float32
+MODEL_RETRAIN_INTERVAL_SECONDS = int(os.getenv("MODEL_RETRAIN_INTERVAL_SECONDS", "3600"))
+MODEL_DRIFT_THRESHOLD = float(os.getenv("MODEL_DRIFT_THRESHOLD", "3.0"))
+MODEL_REGISTRY_MAX_MODELS = int(os.getenv("MODEL_REGISTRY_MAX_MODELS", "1000"))
+MODEL_REGISTRY_MAX_MB = int(os.getenv("MODEL_REGISTRY_MAX_MB", "256"))
+CORRELATION_BUCKET_SECONDS = int(os.getenv("CORRELATION_BUCKET_SECONDS", "300"))
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "/tmp/anomaly-detection/models")  # nosec B108
 
 # Global state
 models_initialized = False
 isolation_forest = None
 scaler = None
+series_cache = None
+model_registry = None
+baseline_store = None
+detection_executor = None  # Set by the app at startup; detection runs inline when None
+shard_coordinator = None  # Set by the app when sharding is enabled; all series are owned when None
+query_stats: dict[str, dict] = {}  # Timing breakdown of the latest detection run per query
+
+
+def _build_models(share: int = 1):
+    """
+    Create the estimators and the per-series model registry.
+
+    Args:
+        share: Number of registries the model caps are split across, one per
+            detection worker process
+    """
+    global isolation_forest, scaler, model_registry
+
+    # Initialize Isolation Forest
+    isolation_forest = IsolationForest(contamination=0.05, random_state=42, n_estimators=100)  # Expect 5% anomalies
+
+    # Per-series Isolation Forest models, cloned from the estimator above
+    model_registry = ModelRegistry(
+        isolation_forest,
+        retrain_interval_seconds=MODEL_RETRAIN_INTERVAL_SECONDS,
+        drift_threshold=MODEL_DRIFT_THRESHOLD,
+        max_models=max(1, MODEL_REGISTRY_MAX_MODELS // share),
+        max_bytes=MODEL_REGISTRY_MAX_MB * 1024 * 1024 // share,
+        model_dir=MODEL_REGISTRY_DIR,
+    )
+
+    # Initialize scaler
+    scaler = StandardScaler()
 
 
 def initialize_models():
     """Initialize ML models for anomaly detection."""
-    global models_initialized, isolation_forest, scaler
+    global models_initialized, series_cache, baseline_store
 
     logger.info("Initializing anomaly detection models")
 
     try:
-        # Initialize Isolation Forest
-        isolation_forest = IsolationForest(contamination=0.05, random_state=42, n_estimators=100)  # Expect 5% anomalies
+        _build_models()
+        model_registry.prune(MODEL_RETRAIN_INTERVAL_SECONDS)
 
-        # Initialize scaler
-        scaler = StandardScaler()
+        # Sliding window of fetched samples per query and series
+        series_cache = SeriesCache(
+            LOOKBACK_MINUTES * 60, QUERY_STEP_SECONDS, CORRELATION_BUCKET_SECONDS, value_dtype=SERIES_VALUE_DTYPE
+        )
+
+        # Weekly seasonal profiles for the Pattern Deviation detector
+        if BASELINE_ENABLED:
+            baseline_store = BaselineStore()
 
         models_initialized = True
         logger.info("✅ Anomaly detection models initialized successfully")
@@ -61,6 +117,19 @@ def initialize_models():
         raise
 
 
+def initialize_worker(workers: int = 1):
+    """
+    Initialize a detection worker process (see models.executor).
+
+    Each worker only sees the series routed to it, so its registry gets an
+    equal share of the model caps and the workers together stay within them.
+
+    Args:
+        workers: Number of detection worker processes
+    """
+    _build_models(workers)
+
+
 def get_model_info() -> list[dict]:
     """Get information about loaded models."""
     return [
@@ -83,7 +152,7 @@ def get_model_info() -> list[dict]:
         {
             "name": "Pattern Deviation",
             "type": "time_series",
-            "description": "Detects deviations from historical patterns",
+            "description": "Detects deviations from hour-of-day and day-of-week seasonal baselines",
         },
     ]
 
@@ -100,115 +169,152 @@ async def detect_anomalies(metric_query: str, http_client) -> list:
         List of AnomalyScore objects
     """
     try:
-        from app.main import PROMETHEUS_URL, AnomalyScore
+        from app.main import (
+            DETECTION_METHOD_DURATION,
+            DETECTION_QUERY_DURATION,
+            PROMETHEUS_URL,
+            SAMPLES_INGESTED,
+            SERIES_PROCESSED,
+            AnomalyScore,
+        )
     except ImportError:
         # During testing
-        from ..app.main import PROMETHEUS_URL, AnomalyScore
+        from ..app.main import (
+            DETECTION_METHOD_DURATION,
+            DETECTION_QUERY_DURATION,
+            PROMETHEUS_URL,
+            SAMPLES_INGESTED,
+            SERIES_PROCESSED,
+            AnomalyScore,
+        )
 
     if not models_initialized:
         logger.warning("Models not initialized, skipping detection")
         return []
 
-    try:
-        # Query Prometheus for time series data
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(minutes=LOOKBACK_MINUTES)
+    stats = query_stats[metric_query] = {
+        "fetch_seconds": 0.0,
+        "detect_seconds": 0.0,
+        "samples_ingested": 0,
+        "series_processed": 0,
+        "methods": {},
+    }
 
-        params = {
-            "query": metric_query,
-            "start": start_time.timestamp(),
-            "end": end_time.timestamp(),
-            "step": "60s",  # 1 minute resolution
-        }
+    try:
+        # Fetch only the samples added since the last cycle and merge them into the window
+        fetch_start = time.perf_counter()
+        if not SERIES_CACHE_ENABLED:
+            series_cache.invalidate(metric_query)
+
+        fetch_range = series_cache.fetch_range(metric_query, datetime.now(timezone.utc).timestamp())
+
+        if fetch_range:
+            start, end = fetch_range
+            results = await _query_range(metric_query, http_client, PROMETHEUS_URL, start, end)
+            if results is None:
+                return []
+            series_cache.ingest(metric_query, results, end)
+            stats["samples_ingested"] = sum(len(series.get("values", [])) for series in results)
+            SAMPLES_INGESTED.labels(query=metric_query).inc(stats["samples_ingested"])
+
+        stats["fetch_seconds"] = time.perf_counter() - fetch_start
+        DETECTION_QUERY_DURATION.labels(query=metric_query, stage="fetch").observe(stats["fetch_seconds"])
+
+        # Unchanged windows would only report the anomalies of the previous run again
+        if not stats["samples_ingested"]:
+            logger.debug(f"No new samples for query: {metric_query}")
+            return []
 
-        response = await http_client.get(f"{PROMETHEUS_URL}/api/v1/query_range", params=params, timeout=30.0)
+        detect_start = time.perf_counter()
+        buffers = series_cache.series(metric_query)
 
-        if response.status_code != 200:
-            logger.warning(f"Prometheus query failed with status {response.status_code}")
+        if not buffers:
+            logger.debug(f"No data returned for query: {metric_query}")
             return []
 
-        data = response.json()
+        # Collect the series with enough samples and run every method over the batch at once
+        labels = []
+        model_keys = []
+        series_timestamps = []
+        series_values = []
+        baselines = []
+        query_fingerprint = series_fingerprint({"query": metric_query})
+
+        for buffer in buffers:
+            # Other replicas detect on series they own; the window is still cached for rebalancing
+            if shard_coordinator is not None and not shard_coordinator.owns(buffer.fingerprint):
+                continue
 
-        if data.get("status") != "success":
-            logger.warning(f"Prometheus query unsuccessful: {data}")
-            return []
+            metric_label = _format_metric_name(buffer.labels, metric_query)
 
-        results = data.get("data", {}).get("result", [])
+            if len(buffer) < MIN_SAMPLES:
+                logger.debug(f"Not enough samples for {metric_label}: {len(buffer)}")
+                continue
 
-        if not results:
-            logger.debug(f"No data returned for query: {metric_query}")
+            timestamps, values = buffer.view()
+            labels.append(metric_label)
+            model_keys.append(f"{query_fingerprint}-{buffer.fingerprint}")
+            series_timestamps.append(timestamps)
+            series_values.append(values)
+            baselines.append(
+                baseline_store.expected(metric_query, buffer.fingerprint, timestamps) if baseline_store else None
+            )
+
+        if not series_values:
             return []
 
-        # Process each time series
+        # CPU-bound work runs on the detection pool so the event loop stays responsive
+        if detection_executor is not None:
+            candidates, method_seconds = await detection_executor.run_batches(_detect_batch, series_values, model_keys)
+        else:
+            candidates, method_seconds = _detect_batch(series_values, model_keys)
+
+        # Method 5: deviation from the seasonal baseline, one array lookup per series
+        if any(baseline is not None for baseline in baselines):
+            with kernel.timed(method_seconds, "pattern_deviation"):
+                expected, spread = _stack_baselines(baselines, series_values)
+                values, _ = kernel.stack_series(series_values)
+                pattern = kernel.pattern_deviation_candidates(values, expected, spread, PATTERN_DEVIATION_THRESHOLD)
+            candidates = np.concatenate([candidates, pattern])
+
+        stats["series_processed"] = len(series_values)
+        stats["methods"] = method_seconds
+        SERIES_PROCESSED.labels(query=metric_query).inc(len(series_values))
+        for method, seconds in method_seconds.items():
+            DETECTION_METHOD_DURATION.labels(query=metric_query, method=method).observe(seconds)
+
+        best, agreeing = kernel.best_per_series(candidates)
+
+        # Build one AnomalyScore per series from its most recent, highest-scoring candidate
         detected_anomalies = []
 
-        for series in results:
-            metric_name = series.get("metric", {})
-            metric_label = _format_metric_name(metric_name, metric_query)
-            values = series.get("values", [])
+        for candidate, method_count in zip(best, agreeing):
+            row = int(candidate["series"])
+            index = int(candidate["index"])
+            score = float(candidate["score"])
 
-            if len(values) < MIN_SAMPLES:
-                logger.debug(f"Not enough samples for {metric_label}: {len(values)}")
-                continue
+            # The seasonal baseline, when known, is a better expectation than the window statistics
+            expected_value = float(candidate["expected"])
+            if baselines[row] is not None and np.isfinite(baselines[row][0][index]):
+                expected_value = float(baselines[row][0][index])
+
+            # More methods agree = higher confidence
+            confidence = min(1.0, int(method_count) / 3.0)
 
-            # Extract timestamps and values
-            timestamps = [datetime.fromtimestamp(v[0], tz=timezone.utc) for v in values]
-            metric_values = [float(v[1]) for v in values]
-
-            # Run multiple detection methods
-            anomalies = []
-
-            # Method 1: Statistical Z-score
-            z_anomalies = _detect_zscore(timestamps, metric_values)
-            anomalies.extend(z_anomalies)
-
-            # Method 2: IQR method
-            iqr_anomalies = _detect_iqr(timestamps, metric_values)
-            anomalies.extend(iqr_anomalies)
-
-            # Method 3: Rate of change
-            roc_anomalies = _detect_rate_of_change(timestamps, metric_values)
-            anomalies.extend(roc_anomalies)
-
-            # Method 4: Isolation Forest (if we have enough data)
-            if len(metric_values) >= 20:
-                if_anomalies = _detect_isolation_forest(timestamps, metric_values)
-                anomalies.extend(if_anomalies)
-
-            # Deduplicate and create AnomalyScore objects
-            # Take the most recent anomaly with highest score
-            if anomalies:
-                # Sort by timestamp (descending) then score (descending)
-                anomalies.sort(key=lambda x: (x[0], x[2]), reverse=True)
-
-                # Take top anomaly
-                ts, value, score, expected, method = anomalies[0]
-
-                # Determine severity based on score
-                if score >= 0.9:
-                    severity = "critical"
-                elif score >= 0.75:
-                    severity = "high"
-                elif score >= 0.6:
-                    severity = "medium"
-                else:
-                    severity = "low"
-
-                # Calculate confidence based on agreement between methods
-                unique_methods = set(a[4] for a in anomalies)
-                confidence = min(1.0, len(unique_methods) / 3.0)  # More methods agree = higher confidence
-
-                anomaly_score = AnomalyScore(
-                    metric=metric_label,
-                    timestamp=ts,
-                    score=score,
-                    confidence=confidence,
-                    value=value,
-                    expected_value=expected,
-                    severity=severity,
-                )
-
-                detected_anomalies.append(anomaly_score)
+            anomaly_score = AnomalyScore(
+                metric=labels[row],
+                timestamp=datetime.fromtimestamp(int(series_timestamps[row][index]), tz=timezone.utc),
+                score=score,
+                confidence=confidence,
+                value=float(candidate["value"]),
+                expected_value=expected_value,
+                severity=_severity_for_score(score),
+            )
+
+            detected_anomalies.append(anomaly_score)
+
+        stats["detect_seconds"] = time.perf_counter() - detect_start
+        DETECTION_QUERY_DURATION.labels(query=metric_query, stage="detect").observe(stats["detect_seconds"])
 
         return detected_anomalies
 
@@ -217,6 +323,154 @@ async def detect_anomalies(metric_query: str, http_client) -> list:
         return []
 
 
+async def find_correlated_series(
+    metric: str,
+    timestamp: datetime,
+    top_k: int = correlation.CORRELATION_TOP_K,
+    method: str = correlation.CORRELATION_METHOD,
+) -> list[dict]:
+    """
+    Find the cached series most correlated with an anomalous series.
+
+    Only series active in the CORRELATION_WINDOW_MINUTES before ``timestamp``
+    are considered. They are stacked on the query step grid and correlated with
+    the anomalous series over lags of up to CORRELATION_MAX_LAG_STEPS. The
+    windows are copied out of the cache on the event loop; stacking and
+    ranking run in a worker thread so they do not stall detection.
+
+    Args:
+        metric: Metric name of the anomalous series, as reported on its AnomalyScore
+        timestamp: Anomaly timestamp
+        top_k: Maximum number of series returned
+        method: "pearson" or "spearman"
+
+    Returns:
+        List of dicts with ``metric``, ``coefficient`` and ``lag_seconds``
+        (positive when the other series leads), strongest first
+    """
+    if series_cache is None:
+        return []
+
+    end = timestamp.timestamp()
+    start = end - correlation.CORRELATION_WINDOW_MINUTES * 60
+
+    target = None
+    names = []
+    windows = []
+
+    for query, buffer in series_cache.active_series(start, end):
+        name = _format_metric_name(buffer.labels, query)
+        if target is None and name == metric:
+            target = buffer.view()
+            continue
+        names.append(name)
+        windows.append(buffer.view())
+
+    if target is None or not windows:
+        return []
+
+    return await asyncio.to_thread(_rank_correlated, names, [target, *windows], start, end, top_k, method)
+
+
+def _rank_correlated(
+    names: list[str], windows: list[tuple[np.ndarray, np.ndarray]], start: float, end: float, top_k: int, method: str
+) -> list[dict]:
+    """Correlate the first window against the others and return the strongest matches (see find_correlated_series)."""
+    width = int((end - start) // QUERY_STEP_SECONDS) + 1
+    grid = correlation.stack_window(windows, start, QUERY_STEP_SECONDS, width)
+    coefficients, lags = correlation.lagged_correlation(
+        grid[0], grid[1:], correlation.CORRELATION_MAX_LAG_STEPS, method=method
+    )
+
+    return [
+        {"metric": names[row], "coefficient": coefficient, "lag_seconds": lag * QUERY_STEP_SECONDS}
+        for row, coefficient, lag in correlation.top_correlated(
+            coefficients, lags, top_k, correlation.CORRELATION_MIN_COEFFICIENT
+        )
+    ]
+
+
+def _stack_baselines(baselines: list, series_values: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Stack per-series (expected, spread) lookups into NaN-padded matrices aligned with the values."""
+    missing = [np.full(len(values), np.nan) for values in series_values]
+    expected, _ = kernel.stack_series([b[0] if b is not None else m for b, m in zip(baselines, missing)])
+    spread, _ = kernel.stack_series([b[1] if b is not None else m for b, m in zip(baselines, missing)])
+    return expected, spread
+
+
+async def update_baselines(metric_query: str, http_client) -> int:
+    """
+    Fold the days not yet covered into the seasonal baselines of a query.
+
+    The first call builds profiles from BASELINE_HISTORY_DAYS of history; later
+    calls fetch only the days completed since the previous update, one day per
+    range query at BASELINE_STEP_SECONDS resolution.
+
+    Returns:
+        Number of days folded in
+    """
+    try:
+        from app.main import PROMETHEUS_URL
+    except ImportError:
+        from ..app.main import PROMETHEUS_URL
+
+    if baseline_store is None:
+        return 0
+
+    days = 0
+    try:
+        for start, end in baseline_store.pending_ranges(metric_query, datetime.now(timezone.utc).timestamp()):
+            results = await _query_range(
+                metric_query, http_client, PROMETHEUS_URL, start, end, step_seconds=BASELINE_STEP_SECONDS
+            )
+            if results is None:
+                break
+            baseline_store.ingest(metric_query, results, end)
+            days += 1
+    finally:
+        if days:
+            baseline_store.save(metric_query)
+            logger.info(f"Updated seasonal baselines for {metric_query} with {days} days")
+
+    return days
+
+
+async def _query_range(
+    metric_query: str,
+    http_client,
+    prometheus_url: str,
+    start: float,
+    end: float,
+    step_seconds: int = QUERY_STEP_SECONDS,
+) -> list | None:
+    """
+    Run a Prometheus range query.
+
+    Returns:
+        The ``data.result`` list, or None if the query failed
+    """
+    params = {
+        "query": metric_query,
+        "start": start,
+        "end": end,
+        "step": f"{step_seconds}s",
+    }
+
+    response = await http_client.get(f"{prometheus_url}/api/v1/query_range", params=params, timeout=30.0)
+
+    if response.status_code != 200:
+        logger.warning(f"Prometheus query failed with status {response.status_code}")
+        return None
+
+    data = response.json()
+
+    if data.get("status") != "success":
+        logger.warning(f"Prometheus query unsuccessful: {data}")
+        return None
+
+    return data.get("data", {}).get("result", [])
+
+
 def _format_metric_name(metric_dict: dict, query: str) -> str:
     """Format metric name from labels."""
     if not metric_dict:
@@ -236,103 +490,139 @@ def _format_metric_name(metric_dict: dict, query: str) -> str:
     return name
 
 
-def _detect_zscore(timestamps: list[datetime], values: list[float]) -> list[tuple]:
-    """
-    Detect anomalies using Z-score method.
+def _severity_for_score(score: float) -> str:
+    """Map an anomaly score to a severity level."""
+    if score >= 0.9:
+        return "critical"
+    elif score >= 0.75:
+        return "high"
+    elif score >= 0.6:
+        return "medium"
+    return "low"
 
-    Returns list of (timestamp, value, score, expected_value, method)
+
+def _detect_batch(
+    series_values: list[np.ndarray], model_keys: list[str] | None = None
+) -> tuple[np.ndarray, dict[str, float]]:
     """
-    if len(values) < MIN_SAMPLES:
-        return []
+    Run all detection methods over a batch of series.
 
-    arr = np.array(values)
-    mean = np.mean(arr)
-    std = np.std(arr)
+    Args:
+        series_values: One value array per series
+        model_keys: Registry key per series; without keys a throwaway Isolation Forest is fitted
 
-    if std == 0:
-        return []
+    Returns:
+        Tuple of (structured candidate array (see ``kernel.CANDIDATE_DTYPE``), seconds spent per method)
+    """
+    timings: dict[str, float] = {}
+    values, lengths = kernel.stack_series(series_values)
 
-    z_scores = np.abs((arr - mean) / std)
+    # Methods 1-3: z-score, IQR and rate of change, vectorized across the batch
+    candidates = [kernel.detect_candidates(values, lengths, ZSCORE_THRESHOLD, IQR_MULTIPLIER, MIN_SAMPLES, timings)]
 
-    anomalies = []
-    # Consider points with |z-score| > threshold as anomalies
-    for i, z in enumerate(z_scores):
-        if z > ZSCORE_THRESHOLD:
-            score = min(1.0, z / 5.0)  # Normalize to 0-1
-            anomalies.append((timestamps[i], values[i], score, mean, "zscore"))
+    # Method 4: Isolation Forest (if we have enough data)
+    forest_rows = np.flatnonzero(lengths >= 20)
+    if len(forest_rows):
+        with kernel.timed(timings, "isolation_forest"):
+            features = kernel.isolation_features(values, lengths)
+            for row in forest_rows:
+                model_key = model_keys[row] if model_keys else None
+                candidates.append(_isolation_forest_candidates(features[row, : lengths[row]], row, model_key))
 
-    return anomalies
+    return np.concatenate(candidates), timings
 
 
-def _detect_iqr(timestamps: list[datetime], values: list[float]) -> list[tuple]:
+def _isolation_forest_candidates(features: np.ndarray, row: int, model_key: str | None = None) -> np.ndarray:
     """
-    Detect anomalies using Interquartile Range method.
+    Score one series' feature matrix with the Isolation Forest.
 
-    Returns list of (timestamp, value, score, expected_value, method)
+    Args:
+        features: (n_samples, 3) feature matrix from ``kernel.isolation_features``
+        row: Series row in the batch, recorded on each candidate
+        model_key: Registry key of the series' model; a new model is fitted when omitted
+
+    Returns:
+        Structured candidate array
     """
-    if len(values) < MIN_SAMPLES:
-        return []
+    try:
+        # Reuse the series' trained model between retrains
+        if model_key is not None and model_registry is not None:
+            model = model_registry.get_model(model_key, features)
+        else:
+            model = clone(isolation_forest).fit(features)
 
-    arr = np.array(values)
-    q1 = np.percentile(arr, 25)
-    q3 = np.percentile(arr, 75)
-    iqr = q3 - q1
+        predictions = model.predict(features)
+        scores = model.score_samples(features)
 
-    if iqr == 0:
-        return []
+        # Normalize scores to 0-1 range
+        min_score = scores.min()
+        max_score = scores.max()
+        if max_score > min_score:
+            normalized_scores = (scores - min_score) / (max_score - min_score)
+        else:
+            normalized_scores = np.zeros_like(scores)
 
-    lower_bound = q1 - IQR_MULTIPLIER * iqr
-    upper_bound = q3 + IQR_MULTIPLIER * iqr
-    median = np.median(arr)
+        # Invert score (lower isolation forest score = more anomalous)
+        anomaly_scores = 1.0 - normalized_scores
+        hits = np.flatnonzero((predictions == -1) & (anomaly_scores >= ANOMALY_THRESHOLD))
 
-    anomalies = []
-    for i, val in enumerate(values):
-        if val < lower_bound or val > upper_bound:
-            # Calculate score based on how far outside bounds
-            if val < lower_bound:
-                deviation = (lower_bound - val) / iqr
-            else:
-                deviation = (val - upper_bound) / iqr
+        out = np.empty(len(hits), dtype=kernel.CANDIDATE_DTYPE)
+        out["series"] = row
+        out["index"] = hits
+        out["value"] = features[hits, 0]
+        out["score"] = anomaly_scores[hits]
+        out["expected"] = features[:, 0].mean()
+        out["method"] = kernel.METHOD_CODES["isolation_forest"]
 
-            score = min(1.0, deviation / 2.0)
-            anomalies.append((timestamps[i], val, score, median, "iqr"))
+        return out
 
-    return anomalies
+    except Exception as e:
+        logger.error(f"Error in isolation forest detection: {e}")
+        return kernel.empty_candidates()
 
 
-def _detect_rate_of_change(timestamps: list[datetime], values: list[float]) -> list[tuple]:
+def _to_tuples(candidates: np.ndarray, timestamps: list[datetime]) -> list[tuple]:
+    """Convert candidates for a single series to (timestamp, value, score, expected_value, method) tuples."""
+    return [
+        (
+            timestamps[int(c["index"])],
+            float(c["value"]),
+            float(c["score"]),
+            float(c["expected"]),
+            kernel.METHOD_NAMES[c["method"]],
+        )
+        for c in candidates
+    ]
+
+
+def _detect_zscore(timestamps: list[datetime], values: list[float]) -> list[tuple]:
     """
-    Detect anomalies based on sudden rate of change.
+    Detect anomalies using Z-score method.
 
     Returns list of (timestamp, value, score, expected_value, method)
     """
-    if len(values) < 2:
-        return []
+    arr, lengths = kernel.stack_series([values])
+    return _to_tuples(kernel.zscore_candidates(arr, lengths, ZSCORE_THRESHOLD, MIN_SAMPLES), timestamps)
 
-    # Calculate rate of change
-    rates = []
-    for i in range(1, len(values)):
-        rate = abs(values[i] - values[i - 1])
-        rates.append(rate)
 
-    if not rates or np.std(rates) == 0:
-        return []
+def _detect_iqr(timestamps: list[datetime], values: list[float]) -> list[tuple]:
+    """
+    Detect anomalies using Interquartile Range method.
 
-    # Use Z-score on rates
-    rates_arr = np.array(rates)
-    mean_rate = np.mean(rates_arr)
-    std_rate = np.std(rates_arr)
+    Returns list of (timestamp, value, score, expected_value, method)
+    """
+    arr, lengths = kernel.stack_series([values])
+    return _to_tuples(kernel.iqr_candidates(arr, lengths, IQR_MULTIPLIER, MIN_SAMPLES), timestamps)
 
-    anomalies = []
-    for i, rate in enumerate(rates):
-        z = abs(rate - mean_rate) / std_rate
-        if z > ZSCORE_THRESHOLD:
-            score = min(1.0, z / 5.0)
-            # i+1 because rates are offset by 1
-            expected = values[i]  # Previous value
-            anomalies.append((timestamps[i + 1], values[i + 1], score, expected, "rate_of_change"))
 
-    return anomalies
+def _detect_rate_of_change(timestamps: list[datetime], values: list[float]) -> list[tuple]:
+    """
+    Detect anomalies based on sudden rate of change.
+
+    Returns list of (timestamp, value, score, expected_value, method)
+    """
+    arr, lengths = kernel.stack_series([values])
+    return _to_tuples(kernel.rate_of_change_candidates(arr, lengths, ZSCORE_THRESHOLD), timestamps)
 
 
 def _detect_isolation_forest(timestamps: list[datetime], values: list[float]) -> list[tuple]:
@@ -344,45 +634,6 @@ def _detect_isolation_forest(timestamps: list[datetime], values: list[float]) ->
     if len(values) < 20:
         return []
 
-    try:
-        # Prepare features: value, index, moving average
-        arr = np.array(values)
-        features = []
-
-        for i, val in enumerate(values):
-            # Simple features: value, position in time series, local mean
-            window_start = max(0, i - 5)
-            window_end = min(len(values), i + 6)
-            local_mean = np.mean(arr[window_start:window_end])
-
-            features.append([val, i / len(values), local_mean])
-
-        features_arr = np.array(features)
-
-        # Fit and predict
-        predictions = isolation_forest.fit_predict(features_arr)
-        scores = isolation_forest.score_samples(features_arr)
-
-        # Normalize scores to 0-1 range
-        min_score = scores.min()
-        max_score = scores.max()
-        if max_score > min_score:
-            normalized_scores = (scores - min_score) / (max_score - min_score)
-        else:
-            normalized_scores = np.zeros_like(scores)
-
-        mean_val = np.mean(arr)
-
-        anomalies = []
-        for i, (pred, score) in enumerate(zip(predictions, normalized_scores)):
-            if pred == -1:  # Anomaly
-                # Invert score (lower isolation forest score = more anomalous)
-                anomaly_score = 1.0 - score
-                if anomaly_score >= ANOMALY_THRESHOLD:
-                    anomalies.append((timestamps[i], values[i], anomaly_score, mean_val, "isolation_forest"))
-
-        return anomalies
-
-    except Exception as e:
-        logger.error(f"Error in isolation forest detection: {e}")
-        return []
+    arr, lengths = kernel.stack_series([values])
+    features = kernel.isolation_features(arr, lengths)[0]
+    return _to_tuples(_isolation_forest_candidates(features, 0), timestamps)
@@ -0,0 +1,153 @@
+"""
+Off-loop execution of CPU-bound detection work.
+
+NumPy and scikit-learn work is submitted to a process or thread pool so the
+asyncio event loop that serves ``/health``, ``/ready`` and the API stays
+responsive during large detection cycles. Series are split into batches of
+DETECTION_BATCH_SIZE so each task pickles one array batch rather than one
+series at a time.
+
+The process executor runs one single-process pool per worker and always sends
+a given model key to the same worker, so each series' model is trained, cached
+and persisted by exactly one process.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import zlib
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from .kernel import empty_candidates
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+DETECTION_EXECUTOR = os.getenv("DETECTION_EXECUTOR", "process")  # process, thread or inline
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", "500"))
+
+
+class DetectionExecutor:
+    """Runs batched detection tasks on a worker pool and tracks its load."""
+
+    def __init__(self, kind: str, max_workers: int, batch_size: int, initializer=None, initargs: tuple = ()):
+        """
+        Initialize the executor.
+
+        Args:
+            kind: "process", "thread" or "inline" (run on the calling thread)
+            max_workers: Pool size
+            batch_size: Maximum series per submitted task
+            initializer: Callable run once in each worker process
+            initargs: Arguments passed to ``initializer``
+        """
+        self.kind = kind
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self._pools: list[Executor] = []
+        self._workers_per_pool = 1
+        self._in_flight: list[int] = []
+
+        if kind == "process":
+            # Spawn rather than fork: the parent runs an event loop and HTTP client threads
+            self._pools = [
+                ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=initializer,
+                    initargs=initargs,
+                )
+                for _ in range(max_workers)
+            ]
+        elif kind == "thread":
+            # Threads share the parent's model registry, so any thread can take any series
+            self._pools = [ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="detection")]
+            self._workers_per_pool = max_workers
+        elif kind != "inline":
+            raise ValueError(f"Unknown detection executor: {kind}")
+
+        self._in_flight = [0] * len(self._pools)
+
+    @property
+    def in_flight(self) -> int:
+        """Tasks submitted and not finished yet."""
+        return sum(self._in_flight)
+
+    @property
+    def queue_depth(self) -> int:
+        """Tasks submitted but waiting for a free worker of their pool."""
+        return sum(max(0, count - self._workers_per_pool) for count in self._in_flight)
+
+    @property
+    def utilization(self) -> float:
+        """Fraction of workers currently busy."""
+        return sum(min(count, self._workers_per_pool) for count in self._in_flight) / self.max_workers
+
+    def worker_for(self, model_key: str | None, position: int) -> int:
+        """Return the pool that runs a series: by key hash, or round-robin for series without a model key."""
+        if len(self._pools) <= 1:
+            return 0
+        if model_key is None:
+            return position % len(self._pools)
+        return zlib.crc32(model_key.encode()) % len(self._pools)
+
+    async def run_batches(
+        self, fn, series_values: list[np.ndarray], model_keys: list[str]
+    ) -> tuple[np.ndarray, dict[str, float]]:
+        """
+        Run ``fn(values, keys)`` over batches of series and merge the results.
+
+        ``fn`` must return a ``(candidates, timings)`` tuple: a candidate array
+        whose ``series`` field indexes into the batch it was given, and a dict
+        of seconds spent per detection method. Rows are mapped back to
+        positions in ``series_values`` and timings are summed over batches.
+        """
+        by_worker: dict[int, list[int]] = defaultdict(list)
+        for position, key in enumerate(model_keys):
+            by_worker[self.worker_for(key, position)].append(position)
+
+        batches = [
+            (worker, np.array(positions[i : i + self.batch_size]))
+            for worker, positions in sorted(by_worker.items())
+            for i in range(0, len(positions), self.batch_size)
+        ]
+
+        def _args(positions):
+            return [series_values[p] for p in positions], [model_keys[p] for p in positions]
+
+        if not self._pools:
+            results = [fn(*_args(positions)) for _, positions in batches]
+        else:
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(
+                *(self._submit(loop, worker, fn, *_args(positions)) for worker, positions in batches)
+            )
+
+        if not results:
+            return empty_candidates(), {}
+
+        timings: dict[str, float] = {}
+        for (_, positions), (candidates, batch_timings) in zip(batches, results):
+            candidates["series"] = positions[candidates["series"]]
+            for method, seconds in batch_timings.items():
+                timings[method] = timings.get(method, 0.0) + seconds
+
+        return np.concatenate([candidates for candidates, _ in results]), timings
+
+    async def _submit(self, loop, worker: int, fn, *args):
+        """Submit one task to a worker's pool and keep its in-flight count current."""
+        self._in_flight[worker] += 1
+        try:
+            return await loop.run_in_executor(self._pools[worker], fn, *args)
+        finally:
+            self._in_flight[worker] -= 1
+
+    def shutdown(self):
+        """Shut the worker pools down, cancelling queued tasks."""
+        for pool in self._pools:
+            pool.shutdown(wait=False, cancel_futures=True)
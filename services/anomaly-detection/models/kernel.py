@@ -0,0 +1,281 @@
+"""
+Vectorized detection kernel.
+
+Runs the statistical detectors over a whole batch of series at once. Series are
+stacked into a 2-D ``(series x timesteps)`` float array padded with NaN, and every
+reduction is NaN-aware, so the cost of a detection pass scales with the size of
+the array rather than with the number of Python-level iterations.
+
+Candidates are returned as a structured array with ``CANDIDATE_DTYPE``.
+"""
+
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Detection methods in tie-break order (lower code wins on equal timestamp and score)
+METHOD_NAMES = ("zscore", "iqr", "rate_of_change", "isolation_forest", "pattern_deviation")
+METHOD_CODES = {name: code for code, name in enumerate(METHOD_NAMES)}
+
+CANDIDATE_DTYPE = np.dtype(
+    [
+        ("series", np.int32),  # Row in the stacked batch
+        ("index", np.int32),  # Column (sample position) within the series
+        ("value", np.float64),
+        ("score", np.float64),
+        ("expected", np.float64),
+        ("method", np.uint8),  # Index into METHOD_NAMES
+    ]
+)
+
+# Half-width of the centred window used for the local-mean feature (i-5 .. i+5)
+LOCAL_MEAN_HALF_WINDOW = 5
+
+
+@contextmanager
+def timed(timings: dict | None, name: str):
+    """Add the wall time spent in the block to ``timings[name]`` (no-op when ``timings`` is None)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def stack_series(series: list) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Stack variable-length series into a NaN-padded 2-D array.
+
+    Args:
+        series: Sequence of 1-D value arrays (or lists)
+
+    Returns:
+        Tuple of (values, lengths) where values has shape (n_series, max_len)
+    """
+    lengths = np.fromiter((len(s) for s in series), dtype=np.int64, count=len(series))
+    width = int(lengths.max()) if len(lengths) else 0
+
+    values = np.full((len(series), width), np.nan, dtype=np.float64)
+    for row, s in enumerate(series):
+        values[row, : lengths[row]] = s
+
+    return values, lengths
+
+
+def empty_candidates() -> np.ndarray:
+    """Return an empty candidate array."""
+    return np.empty(0, dtype=CANDIDATE_DTYPE)
+
+
+def _pack(hits: np.ndarray, values: np.ndarray, score: np.ndarray, expected: np.ndarray, method: str) -> np.ndarray:
+    """Gather the positions flagged in ``hits`` into a candidate array."""
+    rows, cols = np.nonzero(hits)
+
+    out = np.empty(len(rows), dtype=CANDIDATE_DTYPE)
+    out["series"] = rows
+    out["index"] = cols
+    out["value"] = values[rows, cols]
+    out["score"] = score[rows, cols]
+    out["expected"] = expected[rows, cols] if expected.ndim == 2 else expected[rows]
+    out["method"] = METHOD_CODES[method]
+
+    return out
+
+
+def zscore_candidates(values: np.ndarray, lengths: np.ndarray, threshold: float, min_samples: int) -> np.ndarray:
+    """
+    Flag points whose |z-score| against their own series exceeds ``threshold``.
+
+    Expected value is the series mean; score is ``min(1, z / 5)``.
+    """
+    mask = ~np.isnan(values)
+    eligible = lengths >= min_samples
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nanmean(values, axis=1)
+        std = np.nanstd(values, axis=1)
+        z = np.abs((values - mean[:, None]) / std[:, None])
+
+    eligible &= std > 0
+    hits = mask & eligible[:, None] & (z > threshold)
+
+    return _pack(hits, values, np.minimum(1.0, z / 5.0), mean, "zscore")
+
+
+def iqr_candidates(values: np.ndarray, lengths: np.ndarray, multiplier: float, min_samples: int) -> np.ndarray:
+    """
+    Flag points outside ``[Q1 - k*IQR, Q3 + k*IQR]`` of their own series.
+
+    Expected value is the series median; score is ``min(1, deviation / 2)``.
+    """
+    mask = ~np.isnan(values)
+    eligible = lengths >= min_samples
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        q1, median, q3 = np.nanpercentile(values, [25, 50, 75], axis=1)
+        iqr = q3 - q1
+        lower = (q1 - multiplier * iqr)[:, None]
+        upper = (q3 + multiplier * iqr)[:, None]
+        deviation = np.where(values < lower, lower - values, values - upper) / iqr[:, None]
+
+    eligible &= iqr > 0
+    hits = mask & eligible[:, None] & ((values < lower) | (values > upper))
+
+    return _pack(hits, values, np.minimum(1.0, deviation / 2.0), median, "iqr")
+
+
+def rate_of_change_candidates(values: np.ndarray, lengths: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Flag sudden jumps using a z-score on absolute first differences.
+
+    A jump between samples ``i-1`` and ``i`` is reported at ``i`` with the previous
+    sample as the expected value.
+    """
+    if values.shape[1] < 2:
+        return empty_candidates()
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rates = np.abs(np.diff(values, axis=1))
+        mean = np.nanmean(rates, axis=1)
+        std = np.nanstd(rates, axis=1)
+        z = np.abs(rates - mean[:, None]) / std[:, None]
+
+    eligible = (lengths >= 2) & (std > 0)
+    hits = ~np.isnan(rates) & eligible[:, None] & (z > threshold)
+
+    # Shift back into sample coordinates: diff column j describes sample j + 1
+    rows, cols = np.nonzero(hits)
+    out = np.empty(len(rows), dtype=CANDIDATE_DTYPE)
+    out["series"] = rows
+    out["index"] = cols + 1
+    out["value"] = values[rows, cols + 1]
+    out["score"] = np.minimum(1.0, z[rows, cols] / 5.0)
+    out["expected"] = values[rows, cols]
+    out["method"] = METHOD_CODES["rate_of_change"]
+
+    return out
+
+
+def pattern_deviation_candidates(
+    values: np.ndarray, expected: np.ndarray, spread: np.ndarray, threshold: float
+) -> np.ndarray:
+    """
+    Flag points that deviate from their seasonal baseline by more than ``threshold`` spreads.
+
+    ``expected`` and ``spread`` come from the series' weekly profile (see
+    ``models.baseline``) and are NaN where no baseline is known. Score is
+    ``min(1, deviation / 5)``.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        deviation = np.abs(values - expected) / spread
+
+    hits = np.isfinite(deviation) & (spread > 0) & (deviation > threshold)
+
+    return _pack(hits, values, np.minimum(1.0, deviation / 5.0), expected, "pattern_deviation")
+
+
+def rolling_mean(values: np.ndarray, half_window: int = LOCAL_MEAN_HALF_WINDOW) -> np.ndarray:
+    """
+    Centred rolling mean over ``[i - half_window, i + half_window]``, clipped at the edges.
+
+    Computed from cumulative sums so every window costs O(1); NaN padding is
+    excluded from both the sum and the count.
+    """
+    mask = ~np.isnan(values)
+    n_rows, width = values.shape
+
+    sums = np.zeros((n_rows, width + 1))
+    counts = np.zeros((n_rows, width + 1))
+    np.cumsum(np.where(mask, values, 0.0), axis=1, out=sums[:, 1:])
+    np.cumsum(mask, axis=1, out=counts[:, 1:])
+
+    positions = np.arange(width)
+    start = np.maximum(0, positions - half_window)
+    end = np.minimum(width, positions + half_window + 1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = (sums[:, end] - sums[:, start]) / (counts[:, end] - counts[:, start])
+
+    return np.where(mask, result, np.nan)
+
+
+def isolation_features(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Build the Isolation Forest feature tensor for every series at once.
+
+    Returns an array of shape ``(n_series, max_len, 3)`` holding
+    ``[value, relative position, local mean]`` per sample.
+    """
+    width = values.shape[1]
+    features = np.empty(values.shape + (3,), dtype=np.float64)
+
+    features[..., 0] = values
+    with np.errstate(invalid="ignore", divide="ignore"):
+        features[..., 1] = np.arange(width)[None, :] / lengths[:, None]
+    features[..., 2] = rolling_mean(values)
+
+    return features
+
+
+def detect_candidates(
+    values: np.ndarray,
+    lengths: np.ndarray,
+    zscore_threshold: float,
+    iqr_multiplier: float,
+    min_samples: int,
+    timings: dict | None = None,
+) -> np.ndarray:
+    """
+    Run the z-score, IQR and rate-of-change detectors over a stacked batch.
+
+    Args:
+        values: NaN-padded (n_series, max_len) array from ``stack_series``
+        lengths: Number of valid samples per row
+        zscore_threshold: Threshold used by the z-score and rate-of-change methods
+        iqr_multiplier: Fence multiplier for the IQR method
+        min_samples: Minimum samples for the z-score and IQR methods
+        timings: Optional dict accumulating seconds spent per method
+
+    Returns:
+        Structured array of candidates in method order
+    """
+    if values.size == 0:
+        return empty_candidates()
+
+    with timed(timings, "zscore"):
+        zscore = zscore_candidates(values, lengths, zscore_threshold, min_samples)
+    with timed(timings, "iqr"):
+        iqr = iqr_candidates(values, lengths, iqr_multiplier, min_samples)
+    with timed(timings, "rate_of_change"):
+        rate_of_change = rate_of_change_candidates(values, lengths, zscore_threshold)
+
+    return np.concatenate([zscore, iqr, rate_of_change])
+
+
+def best_per_series(candidates: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pick the reported candidate for each series and count agreeing methods.
+
+    The most recent candidate wins; ties are broken by higher score and then by
+    method order.
+
+    Returns:
+        Tuple of (best candidates, number of distinct methods per best candidate's series)
+    """
+    if len(candidates) == 0:
+        return candidates, np.empty(0, dtype=np.int64)
+
+    order = np.lexsort((candidates["method"], -candidates["score"], -candidates["index"], candidates["series"]))
+    ranked = candidates[order]
+
+    first = np.ones(len(ranked), dtype=bool)
+    first[1:] = ranked["series"][1:] != ranked["series"][:-1]
+    best = ranked[first]
+
+    pairs = np.unique(np.stack([candidates["series"].astype(np.int64), candidates["method"]], axis=1), axis=0)
+    series_ids, method_counts = np.unique(pairs[:, 0], return_counts=True)
+    agreeing = method_counts[np.searchsorted(series_ids, best["series"])]
+
+    return best, agreeing
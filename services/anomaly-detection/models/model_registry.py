@@ -0,0 +1,195 @@
+"""
+Registry of trained per-series Isolation Forest models.
+
+Models are keyed by series fingerprint and reused between detection cycles,
+so a series is only refitted when its model is older than the retrain interval
+or when the series has drifted away from the data it was trained on. The
+registry keeps the most recently used models in memory under a count and byte
+cap, and persists every trained model to disk with joblib so a restarted pod
+starts warm.
+"""
+
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """LRU registry of trained estimators keyed by series fingerprint."""
+
+    def __init__(
+        self,
+        prototype,
+        retrain_interval_seconds: float,
+        drift_threshold: float,
+        max_models: int,
+        max_bytes: int,
+        model_dir: str = "",
+    ):
+        """
+        Initialize the registry.
+
+        Args:
+            prototype: Unfitted estimator cloned for every new model
+            retrain_interval_seconds: Maximum model age before it is refitted
+            drift_threshold: Refit when the window mean moves more than this many
+                training standard deviations
+            max_models: Maximum number of models kept in memory
+            max_bytes: Maximum total pickled size of models kept in memory
+            model_dir: Directory for persisted models (empty to disable)
+        """
+        self.prototype = prototype
+        self.retrain_interval_seconds = retrain_interval_seconds
+        self.drift_threshold = drift_threshold
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.model_dir = Path(model_dir) if model_dir else None
+        self.total_bytes = 0
+        self.fits = 0
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()  # Guards bookkeeping when detection runs on a thread pool
+
+        if self.model_dir:
+            self.model_dir.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get_model(self, key: str, features: np.ndarray):
+        """
+        Return a fitted model for ``key``, fitting or refitting it if needed.
+
+        Args:
+            key: Series fingerprint
+            features: Current feature matrix for the series
+
+        Returns:
+            Fitted estimator
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load(key)
+
+            if entry is not None and not self._needs_retrain(entry, features):
+                self._entries.move_to_end(key)
+                return entry["model"]
+
+        # Fit outside the lock so other series can be scored meanwhile
+        entry = self._fit(features)
+        self._save(key, entry)
+
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self.total_bytes += entry["size_bytes"]
+            self.fits += 1
+            self._evict()
+
+        return entry["model"]
+
+    def _needs_retrain(self, entry: dict, features: np.ndarray) -> bool:
+        """Check whether a model is stale or the series has drifted."""
+        if time.time() - entry["trained_at"] >= self.retrain_interval_seconds:
+            return True
+
+        values = features[:, 0]
+        shift = abs(float(values.mean()) - entry["mean"])
+        if entry["std"] > 0:
+            return shift > self.drift_threshold * entry["std"]
+        return shift > 0 or float(values.std()) > 0
+
+    def _fit(self, features: np.ndarray) -> dict:
+        """Fit a fresh model and describe the data it was trained on."""
+        model = clone(self.prototype).fit(features)
+        values = features[:, 0]
+
+        entry = {
+            "model": model,
+            "trained_at": time.time(),
+            "mean": float(values.mean()),
+            "std": float(values.std()),
+            "size_bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+        }
+
+        return entry
+
+    def _drop(self, key: str):
+        """Remove ``key`` from memory if present."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry["size_bytes"]
+
+    def _evict(self):
+        """Evict least recently used models until within the count and byte caps."""
+        while len(self._entries) > 1 and (len(self._entries) > self.max_models or self.total_bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._drop(key)
+            logger.debug(f"Evicted model {key} from registry")
+
+    def _path(self, key: str) -> Path:
+        return self.model_dir / f"{key}.joblib"
+
+    def _save(self, key: str, entry: dict):
+        """Persist a model to disk."""
+        if not self.model_dir:
+            return
+
+        try:
+            joblib.dump(entry, self._path(key))
+        except Exception as e:
+            logger.warning(f"Failed to persist model {key}: {e}")
+
+    def _load(self, key: str) -> dict | None:
+        """Load a persisted model from disk and account for it in memory."""
+        if not self.model_dir:
+            return None
+
+        path = self._path(key)
+        if not path.exists():
+            return None
+
+        try:
+            entry = joblib.load(path)
+        except Exception as e:
+            logger.warning(f"Failed to load persisted model {key}: {e}")
+            return None
+
+        self._entries[key] = entry
+        self.total_bytes += entry["size_bytes"]
+        return entry
+
+    def prune(self, max_age_seconds: float) -> int:
+        """
+        Delete persisted models older than ``max_age_seconds``.
+
+        Returns:
+            Number of files removed
+        """
+        if not self.model_dir:
+            return 0
+
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+
+        for path in self.model_dir.glob("*.joblib"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError as e:
+                logger.warning(f"Failed to prune {path}: {e}")
+
+        return removed
@@ -0,0 +1,404 @@
+"""
+Offline replay of the anomaly detectors over historical data.
+
+Reads a time range from Prometheus or from a local export, splits it into
+detection windows and runs every detection method over each window on a
+process pool. Every candidate is written to a CSV results file, and when
+labelled incidents are supplied a per-method precision/recall summary is
+written next to it, so thresholds can be tuned against past incidents.
+
+Usage:
+    python -m models.replay --input export.json --start 2026-01-01 --end 2026-02-01 \\
+        --incidents incidents.json --output results.csv --zscore-threshold 2.5
+
+    python -m models.replay --prometheus http://localhost:9090 --query 'rate(http_requests_total[5m])' \\
+        --start 2026-01-01 --end 2026-01-08 --output results.csv
+
+Input formats:
+    JSON     A Prometheus range-query response, or its ``data.result`` list
+    Parquet  One row per sample with ``timestamp`` and ``value`` columns; every
+             other column is a series label (requires pyarrow)
+
+Incidents file:
+    JSON list of ``{"start": ..., "end": ..., "labels": {...}}`` objects. Times
+    are ISO 8601 strings or epoch seconds; ``labels`` is optional and, when set,
+    limits the incident to series carrying those labels.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from . import detector, kernel
+from .series_cache import parse_samples, series_fingerprint
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 24 * 3600
+
+# Candidates with absolute timestamps instead of positions within a window
+REPLAY_DTYPE = np.dtype(
+    [
+        ("series", np.int32),
+        ("timestamp", np.int64),
+        ("value", np.float64),
+        ("score", np.float64),
+        ("expected", np.float64),
+        ("method", np.uint8),
+    ]
+)
+
+# Detector settings that can be overridden from the command line
+TUNABLE_SETTINGS = ("ZSCORE_THRESHOLD", "IQR_MULTIPLIER", "ANOMALY_THRESHOLD", "MIN_SAMPLES")
+
+# Detector state replaced by _init_worker, restored after an in-process replay
+_WORKER_STATE = ("isolation_forest", "scaler", "model_registry")
+
+# Pattern deviation needs the seasonal baselines, which replay does not load
+REPLAYED_METHODS = tuple(name for name in kernel.METHOD_CODES if name != "pattern_deviation")
+
+
+def parse_time(value) -> float:
+    """Parse epoch seconds or an ISO 8601 string (UTC when no offset is given)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def _merge_results(results: list[dict], series: dict):
+    """Merge Prometheus range-query results into ``series`` keyed by label fingerprint."""
+    for result in results:
+        labels = result.get("metric", {})
+        timestamps, values = parse_samples(result.get("values", []))
+        fingerprint = series_fingerprint(labels)
+        if fingerprint in series:
+            _, old_timestamps, old_values = series[fingerprint]
+            timestamps = np.concatenate([old_timestamps, timestamps])
+            values = np.concatenate([old_values, values])
+        series[fingerprint] = (labels, timestamps, values)
+
+
+def _sorted_series(series: dict) -> list[tuple[dict, np.ndarray, np.ndarray]]:
+    """Sort every series by time and drop duplicate timestamps."""
+    out = []
+    for labels, timestamps, values in series.values():
+        timestamps, first = np.unique(timestamps, return_index=True)
+        out.append((labels, timestamps, values[first]))
+    return out
+
+
+def load_export(path: str) -> list[tuple[dict, np.ndarray, np.ndarray]]:
+    """
+    Load series from a JSON or Parquet export.
+
+    Returns:
+        List of (labels, int64 timestamps, float64 values), sorted by time
+    """
+    series: dict = {}
+
+    if path.endswith(".parquet"):
+        import pandas as pd
+
+        frame = pd.read_parquet(path)
+        if np.issubdtype(frame["timestamp"].dtype, np.datetime64):
+            frame["timestamp"] = frame["timestamp"].astype("int64") // 10**9
+        label_columns = [c for c in frame.columns if c not in ("timestamp", "value")]
+
+        groups = frame.groupby(label_columns, sort=False) if label_columns else [((), frame)]
+        for key, group in groups:
+            key = key if isinstance(key, tuple) else (key,)
+            labels = {column: str(value) for column, value in zip(label_columns, key)}
+            series[series_fingerprint(labels)] = (
+                labels,
+                np.rint(group["timestamp"].to_numpy(dtype=np.float64)).astype(np.int64),
+                group["value"].to_numpy(dtype=np.float64),
+            )
+    else:
+        with open(path) as f:
+            data = json.load(f)
+        results = data.get("data", {}).get("result", []) if isinstance(data, dict) else data
+        _merge_results(results, series)
+
+    return _sorted_series(series)
+
+
+def fetch_prometheus(
+    prometheus_url: str, query: str, start: float, end: float, step_seconds: int
+) -> list[tuple[dict, np.ndarray, np.ndarray]]:
+    """
+    Fetch a long range from Prometheus one day per request.
+
+    Returns:
+        List of (labels, int64 timestamps, float64 values), sorted by time
+    """
+    import httpx
+
+    series: dict = {}
+
+    with httpx.Client(timeout=120.0) as client:
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(end, chunk_start + DAY_SECONDS)
+            response = client.get(
+                f"{prometheus_url}/api/v1/query_range",
+                params={"query": query, "start": chunk_start, "end": chunk_end, "step": f"{step_seconds}s"},
+            )
+            response.raise_for_status()
+            _merge_results(response.json().get("data", {}).get("result", []), series)
+            logger.info(f"Fetched {datetime.fromtimestamp(chunk_start, tz=timezone.utc):%Y-%m-%d %H:%M}")
+            chunk_start = chunk_end + step_seconds
+
+    return _sorted_series(series)
+
+
+def iter_windows(start: float, end: float, window_seconds: float, stride_seconds: float):
+    """Yield (window_start, window_end) pairs covering ``[start, end)``."""
+    window_start = start
+    while window_start < end:
+        yield window_start, min(end, window_start + window_seconds)
+        window_start += stride_seconds
+
+
+def _init_worker(settings: dict):
+    """Prepare a replay worker: build the models and apply threshold overrides."""
+    detector.initialize_worker()
+    for name, value in settings.items():
+        setattr(detector, name, value)
+
+
+def replay_window(rows: list[int], timestamps: list[np.ndarray], values: list[np.ndarray]) -> np.ndarray:
+    """
+    Run every detection method over one window.
+
+    Args:
+        rows: Series index of each window slice
+        timestamps: Timestamps of each slice
+        values: Values of each slice
+
+    Returns:
+        Candidates with absolute timestamps (see REPLAY_DTYPE)
+    """
+    candidates, _ = detector._detect_batch(values)
+
+    out = np.empty(len(candidates), dtype=REPLAY_DTYPE)
+    out["series"] = np.asarray(rows, dtype=np.int32)[candidates["series"]]
+    out["timestamp"] = [timestamps[s][i] for s, i in zip(candidates["series"], candidates["index"])]
+    for field in ("value", "score", "expected", "method"):
+        out[field] = candidates[field]
+
+    return out
+
+
+def run_replay(
+    series: list[tuple[dict, np.ndarray, np.ndarray]],
+    start: float,
+    end: float,
+    window_seconds: float,
+    stride_seconds: float,
+    workers: int,
+    settings: dict | None = None,
+) -> np.ndarray:
+    """
+    Replay detection over ``[start, end)`` in windows on a process pool.
+
+    Candidates found by more than one overlapping window are reported once,
+    with their highest score.
+
+    Returns:
+        Candidates sorted by series, timestamp and method (see REPLAY_DTYPE)
+    """
+    settings = settings or {}
+    min_samples = settings.get("MIN_SAMPLES", detector.MIN_SAMPLES)
+    tasks = []
+
+    for window_start, window_end in iter_windows(start, end, window_seconds, stride_seconds):
+        rows, window_timestamps, window_values = [], [], []
+        for row, (_, timestamps, values) in enumerate(series):
+            lo, hi = np.searchsorted(timestamps, [window_start, window_end])
+            if hi - lo >= min_samples:
+                rows.append(row)
+                window_timestamps.append(timestamps[lo:hi])
+                window_values.append(values[lo:hi])
+        if rows:
+            tasks.append((rows, window_timestamps, window_values))
+
+    logger.info(f"Replaying {len(tasks)} windows over {len(series)} series with {workers} workers")
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(settings,)) as pool:
+            results = list(pool.map(replay_window, *zip(*tasks))) if tasks else []
+    else:
+        # Replaying in this process must not leave the overrides behind for the caller
+        saved = {name: getattr(detector, name) for name in (*settings, *_WORKER_STATE)}
+        try:
+            _init_worker(settings)
+            results = [replay_window(*task) for task in tasks]
+        finally:
+            for name, value in saved.items():
+                setattr(detector, name, value)
+
+    if not results:
+        return np.empty(0, dtype=REPLAY_DTYPE)
+
+    candidates = np.concatenate(results)
+
+    # Keep the best score per (series, timestamp, method)
+    order = np.lexsort((-candidates["score"], candidates["method"], candidates["timestamp"], candidates["series"]))
+    candidates = candidates[order]
+    first = np.ones(len(candidates), dtype=bool)
+    first[1:] = np.any(
+        [candidates[key][1:] != candidates[key][:-1] for key in ("series", "timestamp", "method")], axis=0
+    )
+
+    return candidates[first]
+
+
+def load_incidents(path: str) -> list[dict]:
+    """Load labelled incidents with start/end parsed to epoch seconds."""
+    with open(path) as f:
+        incidents = json.load(f)
+
+    return [
+        {"start": parse_time(i["start"]), "end": parse_time(i["end"]), "labels": i.get("labels") or {}}
+        for i in incidents
+    ]
+
+
+def evaluate(candidates: np.ndarray, series_labels: list[dict], incidents: list[dict]) -> dict:
+    """
+    Score candidates against labelled incidents, per method and overall.
+
+    A candidate is a true positive when it falls inside an incident on a
+    matching series. Precision is the share of candidates that are true
+    positives; recall is the share of incidents hit by at least one candidate.
+    Only REPLAYED_METHODS are listed, since replay never runs pattern deviation.
+    """
+    matches = np.zeros((len(incidents), len(candidates)), dtype=bool)
+    for i, incident in enumerate(incidents):
+        in_window = (candidates["timestamp"] >= incident["start"]) & (candidates["timestamp"] <= incident["end"])
+        if incident["labels"]:
+            eligible = np.array(
+                [all(labels.get(k) == v for k, v in incident["labels"].items()) for labels in series_labels],
+                dtype=bool,
+            )
+            in_window &= eligible[candidates["series"]] if len(eligible) else False
+        matches[i] = in_window
+
+    methods = {name: candidates["method"] == kernel.METHOD_CODES[name] for name in REPLAYED_METHODS}
+    methods["all"] = np.ones(len(candidates), dtype=bool)
+
+    summary = {}
+    for name, selected in methods.items():
+        total = int(selected.sum())
+        true_positives = int((matches[:, selected].any(axis=0)).sum()) if total else 0
+        detected = int(matches[:, selected].any(axis=1).sum()) if total else 0
+        summary[name] = {
+            "candidates": total,
+            "true_positives": true_positives,
+            "precision": true_positives / total if total else None,
+            "incidents_detected": detected,
+            "recall": detected / len(incidents) if incidents else None,
+        }
+
+    return summary
+
+
+def write_results(path: str, candidates: np.ndarray, series_labels: list[dict]):
+    """Write one CSV row per candidate."""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "series", "method", "value", "expected", "score"])
+        for candidate in candidates:
+            writer.writerow(
+                [
+                    datetime.fromtimestamp(int(candidate["timestamp"]), tz=timezone.utc).isoformat(),
+                    json.dumps(series_labels[candidate["series"]], sort_keys=True),
+                    kernel.METHOD_NAMES[candidate["method"]],
+                    float(candidate["value"]),
+                    float(candidate["expected"]),
+                    round(float(candidate["score"]), 6),
+                ]
+            )
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Replay anomaly detectors over historical data")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="JSON or Parquet export to replay")
+    source.add_argument("--prometheus", help="Prometheus URL to read the range from")
+    parser.add_argument("--query", help="PromQL query (with --prometheus)")
+    parser.add_argument("--start", help="Range start, ISO 8601 or epoch seconds (default: first sample)")
+    parser.add_argument("--end", help="Range end, ISO 8601 or epoch seconds (default: last sample)")
+    parser.add_argument("--step", type=int, default=detector.QUERY_STEP_SECONDS, help="Query step in seconds")
+    parser.add_argument("--window-minutes", type=int, default=detector.LOOKBACK_MINUTES, help="Detection window")
+    parser.add_argument("--stride-minutes", type=int, help="Window stride (default: window size)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--incidents", help="JSON file of labelled incidents to score against")
+    parser.add_argument("--output", default="replay-results.csv", help="Candidates CSV file")
+    parser.add_argument("--zscore-threshold", type=float, help="Override ZSCORE_THRESHOLD")
+    parser.add_argument("--iqr-multiplier", type=float, help="Override IQR_MULTIPLIER")
+    parser.add_argument("--anomaly-threshold", type=float, help="Override ANOMALY_THRESHOLD")
+    parser.add_argument("--min-samples", type=int, help="Override MIN_SAMPLES")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    if args.prometheus:
+        if not (args.query and args.start and args.end):
+            parser.error("--prometheus requires --query, --start and --end")
+        series = fetch_prometheus(args.prometheus, args.query, parse_time(args.start), parse_time(args.end), args.step)
+    else:
+        series = load_export(args.input)
+
+    if not series:
+        logger.error("No series to replay")
+        return 1
+
+    start = parse_time(args.start) if args.start else min(int(ts[0]) for _, ts, _ in series if len(ts))
+    end = parse_time(args.end) if args.end else max(int(ts[-1]) for _, ts, _ in series if len(ts)) + 1
+    settings = {
+        name: getattr(args, name.lower()) for name in TUNABLE_SETTINGS if getattr(args, name.lower()) is not None
+    }
+
+    window_seconds = args.window_minutes * 60
+    stride_seconds = (args.stride_minutes or args.window_minutes) * 60
+    candidates = run_replay(series, start, end, window_seconds, stride_seconds, args.workers, settings)
+
+    series_labels = [labels for labels, _, _ in series]
+    write_results(args.output, candidates, series_labels)
+    logger.info(f"Wrote {len(candidates)} candidates to {args.output}")
+
+    if args.incidents:
+        summary = {
+            "settings": settings,
+            "methods": evaluate(candidates, series_labels, load_incidents(args.incidents)),
+        }
+        summary_path = Path(args.output).with_suffix(".summary.json")
+        summary_path.write_text(json.dumps(summary, indent=2))
+
+        for name, scores in summary["methods"].items():
+            precision = "-" if scores["precision"] is None else f"{scores['precision']:.2f}"
+            recall = "-" if scores["recall"] is None else f"{scores['recall']:.2f}"
+            print(f"{name:<20} candidates={scores['candidates']:<8} precision={precision:<6} recall={recall}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
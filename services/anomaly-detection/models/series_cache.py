@@ -0,0 +1,253 @@
+"""
+Incremental sliding-window cache of Prometheus range-query results.
+
+Each monitored query keeps one fixed-capacity ring buffer per series, keyed by
+the series label set. Every detection cycle only asks Prometheus for the samples
+after the last evaluated step, appends them to the buffers and evicts samples
+that have fallen out of the lookback window. Detectors read contiguous
+timestamp/value arrays straight from the buffers.
+
+Samples stay in NumPy arrays from JSON parse onwards: timestamps as int64 Unix
+seconds and values as float64 (or float32 to halve cache memory).
+"""
+
+import hashlib
+import json
+import math
+from collections import defaultdict
+from operator import itemgetter
+
+import numpy as np
+
+
+def series_fingerprint(labels: dict) -> str:
+    """Return a stable identifier for a series label set."""
+    encoded = json.dumps(labels, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.md5(encoded, usedforsecurity=False).hexdigest()
+
+
+_timestamp_of = itemgetter(0)
+_value_of = itemgetter(1)
+
+
+def parse_samples(samples: list, value_dtype=np.float64) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Convert Prometheus ``[timestamp, "value"]`` pairs into arrays.
+
+    Values are parsed straight into the array without building intermediate
+    lists; Prometheus' ``NaN`` and ``+Inf`` strings parse as their float values.
+
+    Returns:
+        Tuple of (int64 epoch-second timestamps, values of ``value_dtype``)
+    """
+    count = len(samples)
+    timestamps = np.rint(np.fromiter(map(_timestamp_of, samples), dtype=np.float64, count=count)).astype(np.int64)
+    values = np.fromiter(map(float, map(_value_of, samples)), dtype=value_dtype, count=count)
+    return timestamps, values
+
+
+class SeriesBuffer:
+    """Fixed-capacity ring buffer of (timestamp, value) samples for one series."""
+
+    __slots__ = ("_head", "_size", "fingerprint", "labels", "timestamps", "values")
+
+    def __init__(self, labels: dict, capacity: int, fingerprint: str | None = None, value_dtype=np.float64):
+        """Allocate storage for ``capacity`` samples."""
+        self.labels = labels
+        self.fingerprint = fingerprint or series_fingerprint(labels)
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=value_dtype)
+        self._head = 0  # Slot of the oldest sample
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def last_timestamp(self) -> float:
+        """Timestamp of the newest sample, or -inf when empty."""
+        if not self._size:
+            return -math.inf
+        return float(self.timestamps[(self._head + self._size - 1) % self.capacity])
+
+    def _slots(self) -> np.ndarray:
+        """Buffer slots in chronological order."""
+        return (self._head + np.arange(self._size)) % self.capacity
+
+    def append(self, timestamps: np.ndarray, values: np.ndarray):
+        """
+        Append samples in chronological order, overwriting the oldest when full.
+
+        Samples at or before the newest buffered timestamp are ignored, so
+        overlapping fetches never duplicate data.
+        """
+        keep = timestamps > self.last_timestamp
+        timestamps = timestamps[keep]
+        values = values[keep]
+
+        count = len(timestamps)
+        if not count:
+            return
+
+        capacity = self.capacity
+        if count >= capacity:
+            self.timestamps[:] = timestamps[-capacity:]
+            self.values[:] = values[-capacity:]
+            self._head = 0
+            self._size = capacity
+            return
+
+        slots = (self._head + self._size + np.arange(count)) % capacity
+        self.timestamps[slots] = timestamps
+        self.values[slots] = values
+
+        overflow = max(0, self._size + count - capacity)
+        self._head = (self._head + overflow) % capacity
+        self._size = min(capacity, self._size + count)
+
+    def evict_before(self, cutoff: float):
+        """Drop samples with timestamps older than ``cutoff``."""
+        expired = int(np.searchsorted(self.timestamps[self._slots()], cutoff, side="left"))
+        self._head = (self._head + expired) % self.capacity
+        self._size -= expired
+
+    def view(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return contiguous (timestamps, values) copies in chronological order."""
+        slots = self._slots()
+        return self.timestamps[slots], self.values[slots]
+
+
+class ActivityIndex:
+    """Maps fixed time buckets to the series that reported samples in them."""
+
+    def __init__(self, bucket_seconds: float):
+        self.bucket_seconds = bucket_seconds
+        self._buckets: dict[int, set] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def add(self, key, timestamps: np.ndarray):
+        """Record ``key`` as active in every bucket touched by ``timestamps``."""
+        for bucket in np.unique(np.floor_divide(timestamps, self.bucket_seconds)).astype(np.int64):
+            self._buckets[int(bucket)].add(key)
+
+    def active(self, start: float, end: float) -> set:
+        """Return the keys active at any point between ``start`` and ``end``."""
+        keys = set()
+        for bucket in range(int(start // self.bucket_seconds), int(end // self.bucket_seconds) + 1):
+            keys.update(self._buckets.get(bucket, ()))
+        return keys
+
+    def evict_before(self, cutoff: float):
+        """Forget buckets that end before ``cutoff``."""
+        first = int(cutoff // self.bucket_seconds)
+        for bucket in [b for b in self._buckets if b < first]:
+            del self._buckets[bucket]
+
+
+class SeriesCache:
+    """Per-query sliding windows of series buffers."""
+
+    def __init__(
+        self, window_seconds: float, step_seconds: float, activity_bucket_seconds: float = 300, value_dtype=np.float64
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            window_seconds: Lookback window kept for every series
+            step_seconds: Query resolution; fetch ranges are aligned to it
+            activity_bucket_seconds: Bucket size of the index of active series
+            value_dtype: Storage dtype of sample values (float64 or float32)
+        """
+        self.window_seconds = window_seconds
+        self.step_seconds = step_seconds
+        self.value_dtype = np.dtype(value_dtype)
+        self.capacity = int(window_seconds // step_seconds) + 2
+        self.activity = ActivityIndex(activity_bucket_seconds)
+        self._windows: dict[str, dict] = {}
+
+    def fetch_range(self, query: str, now: float) -> tuple[float, float] | None:
+        """
+        Return the (start, end) range still missing for ``query``.
+
+        Ranges are aligned to the step so consecutive fetches land on the same
+        evaluation grid. Returns None when no new step has elapsed.
+        """
+        end = math.floor(now / self.step_seconds) * self.step_seconds
+        window_start = end - self.window_seconds
+
+        state = self._windows.get(query)
+        if state is None or state["last_end"] < window_start:
+            return window_start, end
+
+        start = state["last_end"] + self.step_seconds
+        if start > end:
+            return None
+
+        return start, end
+
+    def ingest(self, query: str, results: list[dict], end: float):
+        """
+        Merge a range-query result into the query's window.
+
+        Args:
+            query: PromQL query the results belong to
+            results: ``data.result`` list from a Prometheus range query
+            end: End of the range that was fetched
+        """
+        state = self._windows.setdefault(query, {"last_end": -math.inf, "series": {}})
+        buffers = state["series"]
+
+        for series in results:
+            labels = series.get("metric", {})
+            samples = series.get("values", [])
+            if not samples:
+                continue
+
+            fingerprint = series_fingerprint(labels)
+            buffer = buffers.get(fingerprint)
+            if buffer is None:
+                buffer = buffers[fingerprint] = SeriesBuffer(labels, self.capacity, fingerprint, self.value_dtype)
+
+            timestamps, values = parse_samples(samples, self.value_dtype)
+            buffer.append(timestamps, values)
+            self.activity.add((query, fingerprint), timestamps)
+
+        state["last_end"] = end
+
+        # Evict expired samples and forget series that have gone quiet
+        cutoff = end - self.window_seconds
+        for fingerprint in list(buffers):
+            buffers[fingerprint].evict_before(cutoff)
+            if not len(buffers[fingerprint]):
+                del buffers[fingerprint]
+        self.activity.evict_before(cutoff)
+
+    def series(self, query: str) -> list[SeriesBuffer]:
+        """Return the buffers currently held for ``query``."""
+        state = self._windows.get(query)
+        if state is None:
+            return []
+        return list(state["series"].values())
+
+    def active_series(self, start: float, end: float) -> list[tuple[str, SeriesBuffer]]:
+        """Return (query, buffer) pairs for the series with samples between ``start`` and ``end``."""
+        active = []
+        for query, fingerprint in self.activity.active(start, end):
+            buffer = self._windows.get(query, {}).get("series", {}).get(fingerprint)
+            if buffer is not None:
+                active.append((query, buffer))
+        return active
+
+    def invalidate(self, query: str | None = None):
+        """Forget cached data for one query, or for all queries."""
+        if query is None:
+            self._windows.clear()
+        else:
+            self._windows.pop(query, None)
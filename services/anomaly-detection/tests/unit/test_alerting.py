@@ -0,0 +1,109 @@
+"""Unit tests for batched Alertmanager delivery."""
+
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+
+def _detection(anomaly_id):
+    from app.main import AnomalyDetection, AnomalyScore
+
+    score = AnomalyScore(
+        metric="error_rate",
+        timestamp=datetime.now(timezone.utc),
+        value=1.0,
+        expected_value=0.5,
+        score=0.9,
+        severity="critical",
+        confidence=0.8,
+    )
+    return AnomalyDetection(id=anomaly_id, anomaly=score, detected_at=datetime.now(timezone.utc))
+
+
+@pytest.mark.asyncio
+async def test_flush_posts_one_array_per_batch():
+    """Test that buffered anomalies are posted in batches and marked delivered."""
+    from app.alerting import AlertDispatcher
+
+    http_client = MagicMock()
+    http_client.post = AsyncMock(return_value=MagicMock(status_code=200))
+    dispatcher = AlertDispatcher(http_client, alertmanager_url="http://am", batch_size=2)
+
+    detections = [_detection(f"a{i}") for i in range(3)]
+    for detection in detections:
+        dispatcher.enqueue(detection)
+
+    delivered = await dispatcher.flush()
+
+    assert delivered == 3
+    assert http_client.post.await_count == 2
+    first_payload = http_client.post.await_args_list[0].kwargs["json"]
+    assert [alert["labels"]["anomaly_id"] for alert in first_payload] == ["a0", "a1"]
+    assert all(d.alerted for d in detections)
+    assert len(dispatcher) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_then_requeued():
+    """Test that a batch is retried and kept in the buffer when delivery fails."""
+    from app.alerting import AlertDispatcher
+
+    http_client = MagicMock()
+    http_client.post = AsyncMock(side_effect=RuntimeError("connection refused"))
+    dispatcher = AlertDispatcher(http_client, max_retries=2, retry_backoff_seconds=0)
+
+    detection = _detection("a0")
+    dispatcher.enqueue(detection)
+
+    assert await dispatcher.flush() == 0
+    assert http_client.post.await_count == 3
+    assert not detection.alerted
+    assert len(dispatcher) == 1
+
+
+@pytest.mark.asyncio
+async def test_rejected_batch_is_dropped_without_blocking_the_rest():
+    """Test that a batch refused with a 4xx is not retried and the following batches are still sent."""
+    from app.alerting import AlertDispatcher
+
+    http_client = MagicMock()
+    http_client.post = AsyncMock(side_effect=[MagicMock(status_code=400, text="bad label"), MagicMock(status_code=200)])
+    dispatcher = AlertDispatcher(http_client, batch_size=1, max_retries=2, retry_backoff_seconds=0)
+
+    detections = [_detection("a0"), _detection("a1")]
+    for detection in detections:
+        dispatcher.enqueue(detection)
+
+    assert await dispatcher.flush() == 1
+    assert http_client.post.await_count == 2
+    assert [d.alerted for d in detections] == [False, True]
+    assert len(dispatcher) == 0
+
+
+@pytest.mark.asyncio
+async def test_unavailable_batch_is_requeued_behind_newer_alerts():
+    """Test that 429 and 5xx responses are retried and the batch is then moved to the back of the buffer."""
+    from app.alerting import AlertDispatcher
+
+    http_client = MagicMock()
+    http_client.post = AsyncMock(side_effect=[MagicMock(status_code=503), MagicMock(status_code=429)])
+    dispatcher = AlertDispatcher(http_client, batch_size=1, max_retries=1, retry_backoff_seconds=0)
+
+    for i in range(3):
+        dispatcher.enqueue(_detection(f"a{i}"))
+
+    assert await dispatcher.flush() == 0
+    assert http_client.post.await_count == 2
+    assert [d.id for d in dispatcher._buffer] == ["a1", "a2", "a0"]
+
+
+def test_buffer_cap_drops_oldest():
+    """Test that the buffer keeps only the newest anomalies beyond its cap."""
+    from app.alerting import AlertDispatcher
+
+    dispatcher = AlertDispatcher(MagicMock(), buffer_max=2)
+    for i in range(3):
+        dispatcher.enqueue(_detection(f"a{i}"))
+
+    assert [d.id for d in dispatcher._buffer] == ["a1", "a2"]
@@ -0,0 +1,128 @@
+"""Unit tests for the indexed anomaly store."""
+
+from datetime import datetime, timedelta, timezone
+
+
+def _detection(anomaly_id, severity="high", metric="error_rate", minutes=0):
+    from app.main import AnomalyDetection, AnomalyScore
+
+    timestamp = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=minutes)
+    score = AnomalyScore(
+        metric=metric,
+        timestamp=timestamp,
+        value=1.0,
+        expected_value=0.5,
+        score=0.9,
+        severity=severity,
+        confidence=0.8,
+    )
+    return AnomalyDetection(id=anomaly_id, anomaly=score, detected_at=timestamp)
+
+
+def test_store_evicts_oldest_and_updates_indexes():
+    """Test that the size limit evicts the oldest anomaly from every index."""
+    from app.anomaly_store import AnomalyStore
+
+    store = AnomalyStore(max_size=2)
+    store.add(_detection("a", severity="critical", minutes=0))
+    store.add(_detection("b", severity="high", minutes=1))
+    store.add(_detection("c", severity="high", minutes=2))
+
+    assert [a.id for a in store] == ["c", "b"]
+    assert store.get("a") is None
+    assert store.severity_counts() == {"high": 2}
+    assert store.query(severity="critical") == []
+
+
+def test_store_filters_by_severity_and_metric():
+    """Test filtered listings return the newest matches first."""
+    from app.anomaly_store import AnomalyStore
+
+    store = AnomalyStore(max_size=10)
+    store.add(_detection("a", severity="high", metric="latency", minutes=0))
+    store.add(_detection("b", severity="low", metric="latency", minutes=1))
+    store.add(_detection("c", severity="high", metric="error_rate", minutes=2))
+    store.add(_detection("d", severity="high", metric="latency", minutes=3))
+
+    assert [a.id for a in store.query(severity="high")] == ["d", "c", "a"]
+    assert [a.id for a in store.query(metric="latency", limit=2)] == ["d", "b"]
+    assert [a.id for a in store.query(severity="high", metric="latency")] == ["d", "a"]
+
+
+def test_store_spills_evicted_anomalies_to_sqlite(tmp_path):
+    """Test that evicted anomalies remain queryable from the SQLite spill file."""
+    from app.anomaly_store import AnomalyStore
+
+    store = AnomalyStore(max_size=1, sqlite_path=str(tmp_path / "anomalies.db"))
+    store.add(_detection("a", severity="critical", minutes=0))
+    store.add(_detection("b", severity="high", minutes=1))
+    store.add(_detection("c", severity="high", minutes=2))
+
+    assert len(store) == 1
+    assert store.get("a").anomaly.severity == "critical"
+    assert [a.id for a in store.query()] == ["c", "b", "a"]
+    assert [a.id for a in store.query(severity="high")] == ["c", "b"]
+
+    store.close()
+
+
+def test_store_replacing_a_record_moves_it_between_indexes():
+    """Test that re-adding an anomaly with a new severity keeps the indexes consistent."""
+    from app.anomaly_store import AnomalyStore
+
+    store = AnomalyStore(max_size=2)
+    store.add(_detection("a", severity="high", minutes=0))
+    store.add(_detection("b", severity="high", minutes=1))
+    store.add(_detection("a", severity="critical", minutes=0))
+
+    assert store.severity_counts() == {"high": 1, "critical": 1}
+    assert [a.id for a in store.query(severity="critical")] == ["a"]
+
+    # Evicting the replaced record must not pop another record from its former index
+    store.add(_detection("c", severity="high", minutes=2))
+    assert store.severity_counts() == {"high": 2}
+
+
+def test_store_update_saves_spilled_anomaly(tmp_path):
+    """Test that changes to an anomaly read back from the spill file are written back."""
+    from app.anomaly_store import AnomalyStore
+    from app.main import RootCause
+
+    store = AnomalyStore(max_size=1, sqlite_path=str(tmp_path / "anomalies.db"))
+    store.add(_detection("a", minutes=0))
+    store.add(_detection("b", minutes=1))
+
+    spilled = store.get("a")
+    spilled.root_cause = RootCause(
+        anomaly_id="a",
+        likely_causes=["deploy"],
+        correlated_metrics=[],
+        recent_events=[],
+        remediation_suggestions=[],
+        runbook_links=[],
+    )
+    store.update(spilled)
+
+    assert store.get("a").root_cause.likely_causes == ["deploy"]
+    store.close()
+
+
+async def test_store_spills_in_batches_off_the_event_loop(tmp_path):
+    """Test that evictions are written by a worker thread and served from memory until then."""
+    import asyncio
+    import sqlite3
+
+    from app.anomaly_store import AnomalyStore
+
+    path = str(tmp_path / "anomalies.db")
+    store = AnomalyStore(max_size=1, sqlite_path=path)
+    for i in range(5):
+        store.add(_detection(str(i), minutes=i))
+
+    assert store.get("0") is not None
+    assert [a.id for a in store.query()] == ["4", "3", "2", "1", "0"]
+
+    while store._flush_task is not None:
+        await asyncio.sleep(0.01)
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM anomalies").fetchone() == (4,)
+    store.close()
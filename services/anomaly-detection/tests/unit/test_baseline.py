@@ -0,0 +1,126 @@
+"""Unit tests for seasonal baselines and the Pattern Deviation detector."""
+
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+DAY = 86400
+MONDAY = datetime(2026, 1, 5, tzinfo=timezone.utc).timestamp()
+
+
+def _day_result(labels, day_start, value_fn, step=300):
+    timestamps = range(int(day_start), int(day_start) + DAY, step)
+    return {"metric": labels, "values": [[t, str(value_fn(t))] for t in timestamps]}
+
+
+def _hourly(t):
+    """A daily cycle: 10 at night, 100 during the day."""
+    return 100.0 if 8 <= (t % DAY) // 3600 < 20 else 10.0
+
+
+def test_week_slots_start_on_monday():
+    """Test that slot 0 is Monday 00:00 UTC and slots wrap weekly."""
+    from models.baseline import week_slots
+
+    slots = week_slots(np.array([MONDAY, MONDAY + 300, MONDAY + 7 * DAY, MONDAY - 300]))
+
+    assert list(slots) == [0, 1, 0, 2015]
+
+
+def test_profiles_capture_hour_of_day_pattern(tmp_path):
+    """Test that profiles built from history give per-slot expectations."""
+    from models.baseline import BaselineStore
+    from models.series_cache import series_fingerprint
+
+    store = BaselineStore(str(tmp_path), history_days=14, min_weeks=2)
+    for day in range(14):
+        start = MONDAY + day * DAY
+        store.ingest("q", [_day_result({"pod": "a"}, start, _hourly)], start + DAY - 300)
+
+    probe = np.array([MONDAY + 21 * DAY + 3 * 3600, MONDAY + 21 * DAY + 12 * 3600])
+    expected, spread = store.expected("q", series_fingerprint({"pod": "a"}), probe)
+
+    assert list(expected) == [10.0, 100.0]
+    assert list(spread) == [0.0, 0.0]
+    assert store.get("q").mean.dtype == np.float32
+
+
+def test_profiles_persist_and_update_incrementally(tmp_path):
+    """Test the on-disk round trip and that only new days are pending."""
+    from models.baseline import BaselineStore
+
+    now = MONDAY + 10 * DAY + 3600
+    store = BaselineStore(str(tmp_path), history_days=7)
+
+    ranges = store.pending_ranges("q", now)
+    assert len(ranges) == 7
+    for start, end in ranges:
+        store.ingest("q", [_day_result({"pod": "a"}, start, _hourly)], end)
+    store.save("q")
+
+    reloaded = BaselineStore(str(tmp_path), history_days=7)
+    assert len(reloaded.get("q")) == 1
+    assert reloaded.pending_ranges("q", now) == []
+    assert reloaded.pending_ranges("q", now + DAY) == [(MONDAY + 10 * DAY, MONDAY + 11 * DAY - 300)]
+
+
+def test_profiles_grow_geometrically_and_save_only_used_rows(tmp_path):
+    """Test that adding series reallocates the profiles rarely and persists only the series added."""
+    from models.baseline import BaselineStore
+
+    store = BaselineStore(str(tmp_path), history_days=7)
+    store.ingest("q", [_day_result({"pod": str(i)}, MONDAY, _hourly) for i in range(40)], MONDAY + DAY - 300)
+    baseline = store.get("q")
+
+    assert len(baseline) == 40
+    assert len(baseline.mean) == 64
+    store.save("q")
+    assert BaselineStore(str(tmp_path), history_days=7).get("q").mean.shape == (40, baseline.slots)
+
+
+def test_missing_baseline_is_looked_up_on_disk_once(tmp_path):
+    """Test that a query without a persisted baseline does not hit the filesystem on every lookup."""
+    from models.baseline import BaselineStore
+
+    store = BaselineStore(str(tmp_path))
+    with patch.object(store, "_load", wraps=store._load) as load:
+        assert store.expected("q", "fp", np.array([MONDAY])) is None
+        assert store.expected("q", "fp", np.array([MONDAY])) is None
+
+    assert load.call_count == 1
+
+
+def test_pattern_deviation_candidates_flag_seasonal_outliers():
+    """Test flagging of values far from their seasonal expectation."""
+    from models.kernel import METHOD_CODES, pattern_deviation_candidates
+
+    values = np.array([[10.0, 100.0, 100.0, np.nan]])
+    expected = np.array([[10.0, 10.0, 100.0, 10.0]])
+    spread = np.array([[2.0, 2.0, np.nan, 2.0]])
+
+    candidates = pattern_deviation_candidates(values, expected, spread, threshold=3.0)
+
+    assert list(candidates["index"]) == [1]
+    assert candidates["expected"][0] == 10.0
+    assert candidates["method"][0] == METHOD_CODES["pattern_deviation"]
+
+
+@pytest.mark.asyncio
+async def test_update_baselines_fetches_pending_days(tmp_path):
+    """Test that baseline updates query Prometheus once per pending day at baseline resolution."""
+    from models import detector
+    from models.baseline import BaselineStore
+
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"status": "success", "data": {"result": []}}
+    http_client = MagicMock()
+    http_client.get = AsyncMock(return_value=response)
+
+    with patch.object(detector, "baseline_store", BaselineStore(str(tmp_path), history_days=3)):
+        days = await detector.update_baselines("q", http_client)
+
+    assert days == 3
+    assert http_client.get.await_count == 3
+    assert http_client.get.await_args.kwargs["params"]["step"] == "300s"
@@ -0,0 +1,84 @@
+"""Unit tests for the detection cycle benchmark helpers."""
+
+import json
+
+import numpy as np
+import pytest
+
+
+def test_synthetic_values_spike_only_anomalous_series():
+    """Test that spikes land on the anomalous series at the spike steps."""
+    from benchmarks.fake_prometheus import ANOMALY_EVERY, is_spike, synthetic_values
+
+    timestamps = np.arange(0, 3600, 60)
+    values = synthetic_values(ANOMALY_EVERY + 1, timestamps, 60)
+    spikes = is_spike(timestamps, 60)
+
+    assert values.shape == (ANOMALY_EVERY + 1, 60)
+    assert spikes.sum() == 2
+    assert np.all(values[0, spikes] > 4 * values[0, ~spikes].max())
+    assert values[1].max() < 1.2 * values[1].min()
+    assert np.array_equal(values, synthetic_values(ANOMALY_EVERY + 1, timestamps, 60))
+
+
+def test_range_query_response_follows_prometheus_format():
+    """Test the fake range-query body."""
+    from benchmarks.fake_prometheus import range_query_response
+
+    body = range_query_response(3, 600, 900, 60)
+    result = body["data"]["result"]
+
+    assert body["status"] == "success"
+    assert len(result) == 3
+    assert result[2]["metric"]["pod"] == "pod-2"
+    assert [t for t, _ in result[0]["values"]] == [600, 660, 720, 780, 840, 900]
+    assert isinstance(result[0]["values"][0][1], str)
+
+
+def test_compare_reports_slowdowns_and_recall_drops():
+    """Test regression detection between two results files."""
+    from benchmarks.detection_cycle import compare
+
+    baseline = {
+        "scenarios": {
+            "100": {
+                "cold_cycle_seconds": 10.0,
+                "cycle_p50_seconds": 1.0,
+                "cycle_p95_seconds": 1.2,
+                "peak_rss_mb": 200.0,
+                "recall": 1.0,
+            }
+        }
+    }
+    current = {
+        "scenarios": {
+            "100": {
+                "cold_cycle_seconds": 10.5,
+                "cycle_p50_seconds": 1.5,
+                "cycle_p95_seconds": 1.3,
+                "peak_rss_mb": 200.0,
+                "recall": 0.8,
+            },
+            "1000": {"cycle_p50_seconds": 9.0},
+        }
+    }
+
+    assert compare(baseline, current, tolerance=0.2) == [
+        "100 series: cycle_p50_seconds 1.0 -> 1.5",
+        "100 series: recall 1.0 -> 0.8",
+    ]
+
+
+@pytest.mark.slow
+def test_benchmark_runs_one_scenario_end_to_end(tmp_path):
+    """Test that a one-series scenario completes and its warm cycle runs detection."""
+    from benchmarks.detection_cycle import main
+
+    output = tmp_path / "benchmark.json"
+
+    assert main(["--series", "1", "--cycles", "1", "--output", str(output)]) == 0
+
+    result = json.loads(output.read_text())["scenarios"]["1"]
+    assert result["cycles"] == 1
+    assert result["method_cpu_seconds"]["zscore"] > 0
+    assert result["recall"] == 1.0
@@ -0,0 +1,110 @@
+"""Unit tests for the continuous detection loop."""
+
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_detection_cycle_runs_queries_concurrently():
+    """Test that cycle latency tracks the slowest query, not the sum."""
+    import app.main  # Imported up front so it is not timed
+    from app import detector as detection_module
+
+    async def fake_detect(query, http_client):
+        await asyncio.sleep(0.2)
+        return [query]
+
+    with (
+        patch("models.detector.detect_anomalies", side_effect=fake_detect),
+        patch.object(detection_module, "DETECTION_CONCURRENCY", 10),
+        patch.object(detection_module, "DETECTION_CYCLE_BUDGET_SECONDS", 5.0),
+    ):
+        start = time.monotonic()
+        anomalies, report = await detection_module.run_detection_cycle(["q1", "q2", "q3", "q4"], MagicMock())
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.5
+    assert anomalies == ["q1", "q2", "q3", "q4"]
+    assert report["completed"] == ["q1", "q2", "q3", "q4"]
+    assert report["skipped"] == []
+
+
+@pytest.mark.asyncio
+async def test_detection_cycle_skips_queries_over_budget():
+    """Test that queries still running at the deadline are cancelled and reported."""
+    from app import detector as detection_module
+
+    async def fake_detect(query, http_client):
+        if query == "slow":
+            await asyncio.sleep(10)
+        if query == "broken":
+            raise RuntimeError("boom")
+        return [query]
+
+    with (
+        patch("models.detector.detect_anomalies", side_effect=fake_detect),
+        patch.object(detection_module, "DETECTION_CONCURRENCY", 2),
+        patch.object(detection_module, "DETECTION_CYCLE_BUDGET_SECONDS", 0.2),
+    ):
+        anomalies, report = await detection_module.run_detection_cycle(["fast", "slow", "broken"], MagicMock())
+
+    assert anomalies == ["fast"]
+    assert report["completed"] == ["fast"]
+    assert report["skipped"] == ["slow"]
+    assert report["failed"] == ["broken"]
+
+
+@pytest.mark.asyncio
+async def test_detection_cycle_reports_per_query_timings():
+    """Test that the cycle report carries each completed query's timing breakdown."""
+    from app import detector as detection_module
+    from models import detector
+
+    async def fake_detect(query, http_client):
+        detector.query_stats[query] = {"fetch_seconds": 0.1, "methods": {"zscore": 0.01}}
+        return []
+
+    with patch("models.detector.detect_anomalies", side_effect=fake_detect):
+        _, report = await detection_module.run_detection_cycle(["q1"], MagicMock())
+
+    assert report["queries"] == {"q1": {"fetch_seconds": 0.1, "methods": {"zscore": 0.01}}}
+    assert "started_at" in report
+
+
+@pytest.mark.asyncio
+async def test_detection_cycle_without_due_queries_is_empty():
+    """Test that a tick with no query due returns an empty report instead of failing."""
+    from app import detector as detection_module
+
+    with patch("models.detector.detect_anomalies") as detect:
+        anomalies, report = await detection_module.run_detection_cycle([], MagicMock())
+
+    assert anomalies == []
+    assert report["completed"] == report["skipped"] == report["failed"] == []
+    assert report["duration_seconds"] == 0.0
+    detect.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_model_pruning_runs_every_retrain_interval():
+    """Test that stale persisted models are pruned periodically, not only at startup."""
+    from app import detector as detection_module
+    from models import detector
+
+    registry = MagicMock()
+    registry.prune.return_value = 1
+
+    with (
+        patch.object(detector, "model_registry", registry),
+        patch.object(detector, "MODEL_RETRAIN_INTERVAL_SECONDS", 0.01),
+    ):
+        task = asyncio.create_task(detection_module.run_model_pruning())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert registry.prune.call_count >= 2
+    registry.prune.assert_called_with(0.01)
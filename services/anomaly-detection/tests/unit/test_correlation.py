@@ -0,0 +1,96 @@
+"""Unit tests for cross-series correlation."""
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+
+def test_lagged_correlation_finds_leading_series():
+    """Test that a series shifted in time is matched at the right lag."""
+    from models.correlation import lagged_correlation
+
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=40)
+    target = base.copy()
+    leading = np.roll(base, -3)  # leading[t - 3] == target[t]
+    noise = rng.normal(size=40)
+
+    coefficients, lags = lagged_correlation(target, np.vstack([leading, noise]), max_lag=5)
+
+    assert coefficients[0] == pytest.approx(1.0)
+    assert lags[0] == 3
+    assert abs(coefficients[1]) < 0.7
+
+
+def test_spearman_handles_monotonic_nonlinear_relation_and_gaps():
+    """Test rank correlation with missing samples."""
+    from models.correlation import lagged_correlation
+
+    target = np.arange(20, dtype=np.float64)
+    other = np.exp(target / 4)
+    other[5] = np.nan
+
+    pearson, _ = lagged_correlation(target, other[None, :], max_lag=0)
+    spearman, _ = lagged_correlation(target, other[None, :], max_lag=0, method="spearman")
+
+    assert spearman[0] > 0.99
+    assert pearson[0] < spearman[0]
+
+
+def test_top_correlated_ranks_by_absolute_strength():
+    """Test top-k selection keeps strong negative correlations too."""
+    from models.correlation import top_correlated
+
+    coefficients = np.array([0.8, -0.95, np.nan, 0.5])
+    lags = np.array([0, 2, 0, 1])
+
+    assert top_correlated(coefficients, lags, k=5, min_coefficient=0.7) == [(1, -0.95, 2), (0, 0.8, 0)]
+
+
+def test_activity_index_limits_candidates_to_window():
+    """Test that series outside the bucketed window are not candidates."""
+    from models.series_cache import SeriesCache
+
+    cache = SeriesCache(window_seconds=7200, step_seconds=60, activity_bucket_seconds=300)
+    cache.ingest(
+        "q",
+        [
+            {"metric": {"pod": "early"}, "values": [[t, "1"] for t in range(0, 600, 60)]},
+            {"metric": {"pod": "late"}, "values": [[t, "1"] for t in range(3000, 3600, 60)]},
+        ],
+        3600,
+    )
+
+    active = cache.active_series(3000, 3600)
+
+    assert [buffer.labels["pod"] for _, buffer in active] == ["late"]
+
+
+@pytest.mark.asyncio
+async def test_find_correlated_series_uses_cached_windows():
+    """Test end-to-end correlation over the series cache."""
+    from models import detector
+    from models.series_cache import SeriesCache
+
+    end = 36000
+    timestamps = range(end - 1800, end + 1, 60)
+    rng = np.random.default_rng(1)
+    signal = rng.normal(size=len(timestamps))
+    noise = rng.normal(size=len(timestamps))
+
+    def result(pod, values):
+        return {"metric": {"pod": pod}, "values": [[t, str(v)] for t, v in zip(timestamps, values)]}
+
+    cache = SeriesCache(window_seconds=3600, step_seconds=60)
+    cache.ingest("cpu", [result("api", signal), result("noise", noise)], end)
+    cache.ingest("latency", [result("api", signal * 2 + 1)], end)
+
+    with patch.object(detector, "series_cache", cache):
+        matches = await detector.find_correlated_series("cpu{pod=api}", datetime.fromtimestamp(end, tz=timezone.utc))
+
+    assert len(matches) == 1
+    assert matches[0]["metric"] == "latency{pod=api}"
+    assert matches[0]["coefficient"] == pytest.approx(1.0)
+    assert matches[0]["lag_seconds"] == 0
@@ -125,6 +125,43 @@ async def test_detect_anomalies_integration(mock_http_client):
     # Should detect anomalies
     assert isinstance(anomalies, list)
 
+    # Should record the timing breakdown of the run
+    from models.detector import query_stats
+
+    stats = query_stats["test_query"]
+    assert stats["samples_ingested"] == 60
+    assert stats["series_processed"] == 1
+    assert {"zscore", "iqr", "rate_of_change", "isolation_forest"} <= set(stats["methods"])
+
+
+@pytest.mark.asyncio
+async def test_detect_anomalies_skips_ticks_without_new_samples(mock_http_client):
+    """Test that a tick before the next query step neither queries Prometheus nor reports anomalies again."""
+    from unittest.mock import patch
+
+    from models import detector
+
+    detector.initialize_models()
+    end = 1_700_000_040.0
+    timestamps = [end - 60 * i for i in range(59, -1, -1)]
+    values = [100.0] * 50 + [500.0] + [100.0] * 9
+
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {
+        "status": "success",
+        "data": {"result": [{"metric": {"pod": "a"}, "values": [[t, str(v)] for t, v in zip(timestamps, values)]}]},
+    }
+    mock_http_client.get = AsyncMock(return_value=mock_response)
+
+    with patch.object(detector.series_cache, "fetch_range", side_effect=[(timestamps[0], end), None]):
+        first = await detector.detect_anomalies("q", mock_http_client)
+        second = await detector.detect_anomalies("q", mock_http_client)
+
+    assert first
+    assert second == []
+    mock_http_client.get.assert_awaited_once()
+
 
 @pytest.mark.asyncio
 async def test_format_metric_name():
@@ -0,0 +1,138 @@
+"""Unit tests for the detection executor."""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+
+def _fake_batch(series_values, model_keys):
+    """Return one candidate per series, indexed within the batch."""
+    from models.kernel import CANDIDATE_DTYPE
+
+    out = np.zeros(len(series_values), dtype=CANDIDATE_DTYPE)
+    out["series"] = np.arange(len(series_values))
+    out["value"] = [values[0] for values in series_values]
+    return out, {"zscore": 0.5}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", ["inline", "thread"])
+async def test_run_batches_restores_series_offsets(kind):
+    """Test that batched results map back to the original series positions."""
+    from models.executor import DetectionExecutor
+
+    executor = DetectionExecutor(kind, max_workers=2, batch_size=3)
+    series_values = [np.array([float(i)]) for i in range(8)]
+
+    try:
+        candidates, timings = await executor.run_batches(_fake_batch, series_values, [str(i) for i in range(8)])
+    finally:
+        executor.shutdown()
+
+    assert list(candidates["series"]) == list(range(8))
+    assert timings == {"zscore": 1.5}
+    assert list(candidates["value"]) == [float(i) for i in range(8)]
+    assert executor.in_flight == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.slow
+async def test_process_pool_runs_detection_batches():
+    """Test the real detection batch function in spawned worker processes."""
+    from models import detector
+    from models.executor import DetectionExecutor
+
+    executor = DetectionExecutor("process", max_workers=1, batch_size=2, initializer=detector.initialize_worker)
+    series_values = [np.r_[np.full(30, 100.0), 900.0, np.full(9, 100.0)] for _ in range(3)]
+
+    try:
+        candidates, timings = await executor.run_batches(detector._detect_batch, series_values, [None, None, None])
+    finally:
+        executor.shutdown()
+
+    assert set(candidates["series"]) == {0, 1, 2}
+    assert set(timings) == {"zscore", "iqr", "rate_of_change", "isolation_forest"}
+
+
+@pytest.mark.asyncio
+async def test_process_executor_sends_each_key_to_one_worker():
+    """Test that every batch holds series of a single worker and results still map back to their positions."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from models.executor import DetectionExecutor
+
+    executor = DetectionExecutor("process", max_workers=3, batch_size=4)
+    keys = [f"series-{i}" for i in range(30)]
+    workers = [executor.worker_for(key, position) for position, key in enumerate(keys)]
+    batches = []
+
+    def _record(series_values, model_keys):
+        batches.append(model_keys)
+        return _fake_batch(series_values, model_keys)
+
+    # Stand the spawned pools in with threads; routing does not depend on the pool type
+    executor.shutdown()
+    executor._pools = [ThreadPoolExecutor(max_workers=1) for _ in range(3)]
+    try:
+        candidates, _ = await executor.run_batches(_record, [np.array([float(i)]) for i in range(30)], keys)
+    finally:
+        executor.shutdown()
+
+    assert set(workers) == {0, 1, 2}
+    assert workers == [executor.worker_for(key, 0) for key in keys]
+    assert all(len({workers[keys.index(key)] for key in batch}) == 1 for batch in batches)
+    assert sorted(zip(candidates["series"], candidates["value"])) == [(i, float(i)) for i in range(30)]
+
+
+@pytest.mark.asyncio
+async def test_load_metrics_count_queueing_per_worker():
+    """Test that tasks queued behind one busy worker count as queued, not as busy workers."""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from models.executor import DetectionExecutor
+
+    executor = DetectionExecutor("process", max_workers=4, batch_size=1)
+    executor.shutdown()
+    executor._pools = [ThreadPoolExecutor(max_workers=1) for _ in range(4)]
+    release = threading.Event()
+    loop = asyncio.get_running_loop()
+
+    # Four tasks that all hash to worker 0
+    tasks = [asyncio.create_task(executor._submit(loop, 0, release.wait)) for _ in range(4)]
+    await asyncio.sleep(0.05)
+
+    try:
+        assert executor.in_flight == 4
+        assert executor.queue_depth == 3
+        assert executor.utilization == 0.25
+    finally:
+        release.set()
+        await asyncio.gather(*tasks)
+        executor.shutdown()
+
+    assert executor.queue_depth == 0
+    assert executor.utilization == 0.0
+
+
+def test_worker_registries_share_the_model_caps():
+    """Test that each worker process gets an equal share of the registry caps."""
+    from unittest.mock import patch
+
+    from models import detector
+
+    with patch.multiple(detector, model_registry=None, isolation_forest=None, scaler=None):
+        detector.initialize_worker(4)
+        registry = detector.model_registry
+
+    assert registry.max_models == detector.MODEL_REGISTRY_MAX_MODELS // 4
+    assert registry.max_bytes == detector.MODEL_REGISTRY_MAX_MB * 1024 * 1024 // 4
+
+
+def test_unknown_executor_kind_rejected():
+    """Test that an unknown executor kind fails fast."""
+    from models.executor import DetectionExecutor
+
+    with pytest.raises(ValueError):
+        DetectionExecutor("gpu", max_workers=1, batch_size=1)
@@ -0,0 +1,88 @@
+"""Unit tests for the vectorized detection kernel."""
+
+import numpy as np
+import pytest
+
+
+def test_stack_series_pads_with_nan():
+    """Test that variable-length series are NaN-padded."""
+    from models.kernel import stack_series
+
+    values, lengths = stack_series([[1.0, 2.0, 3.0], [4.0]])
+
+    assert values.shape == (2, 3)
+    assert list(lengths) == [3, 1]
+    assert np.isnan(values[1, 1:]).all()
+
+
+def test_rolling_mean_matches_naive_window():
+    """Test the cumulative-sum rolling mean against a per-index slice mean."""
+    from models.kernel import rolling_mean, stack_series
+
+    rng = np.random.default_rng(0)
+    series = [rng.normal(100, 5, n) for n in (30, 12, 1)]
+    values, _ = stack_series(series)
+
+    result = rolling_mean(values)
+
+    for row, s in enumerate(series):
+        expected = [np.mean(s[max(0, i - 5) : min(len(s), i + 6)]) for i in range(len(s))]
+        np.testing.assert_allclose(result[row, : len(s)], expected)
+        assert np.isnan(result[row, len(s) :]).all()
+
+
+def test_detect_candidates_batch_matches_single_series():
+    """Test that a batch produces the same candidates as each series on its own."""
+    from models.kernel import detect_candidates, stack_series
+
+    rng = np.random.default_rng(1)
+    series = []
+    for n in (60, 45, 20):
+        s = rng.normal(100, 1, n)
+        s[n // 2] = 500.0
+        series.append(s)
+
+    values, lengths = stack_series(series)
+    batch = detect_candidates(values, lengths, 3.0, 1.5, 10)
+
+    for row, s in enumerate(series):
+        single_values, single_lengths = stack_series([s])
+        single = detect_candidates(single_values, single_lengths, 3.0, 1.5, 10)
+        from_batch = batch[batch["series"] == row]
+
+        assert len(single) == len(from_batch)
+        np.testing.assert_array_equal(single["index"], from_batch["index"])
+        np.testing.assert_allclose(single["score"], from_batch["score"])
+
+
+def test_detect_candidates_skips_short_and_flat_series():
+    """Test that short series and zero-variance series produce no candidates."""
+    from models.kernel import detect_candidates, stack_series
+
+    values, lengths = stack_series([[100.0] * 30, [1.0, 50.0]])
+
+    candidates = detect_candidates(values, lengths, 3.0, 1.5, 10)
+
+    assert len(candidates) == 0
+
+
+def test_best_per_series_prefers_latest_then_score():
+    """Test candidate selection and method agreement counting."""
+    from models.kernel import CANDIDATE_DTYPE, METHOD_CODES, best_per_series
+
+    candidates = np.array(
+        [
+            (0, 10, 5.0, 0.6, 1.0, METHOD_CODES["zscore"]),
+            (0, 12, 5.0, 0.5, 1.0, METHOD_CODES["iqr"]),
+            (0, 12, 5.0, 0.9, 1.0, METHOD_CODES["rate_of_change"]),
+            (1, 3, 2.0, 0.7, 1.0, METHOD_CODES["zscore"]),
+        ],
+        dtype=CANDIDATE_DTYPE,
+    )
+
+    best, agreeing = best_per_series(candidates)
+
+    assert list(best["series"]) == [0, 1]
+    assert best[0]["index"] == 12
+    assert best[0]["score"] == pytest.approx(0.9)
+    assert list(agreeing) == [3, 1]
@@ -0,0 +1,107 @@
+"""Unit tests for the streaming Loki client."""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+
+def _loki_client(lines, chunk_size=7, requests=None):
+    """AsyncClient whose Loki responds with ``lines`` streamed in small chunks."""
+    body = json.dumps(
+        {
+            "status": "success",
+            "data": {
+                "resultType": "streams",
+                "result": [
+                    {
+                        "stream": {"namespace": "shop", "pod": "api-1"},
+                        "values": [[str(1700000000000000000 + i), line] for i, line in enumerate(lines)],
+                    }
+                ],
+            },
+        }
+    ).encode()
+
+    async def chunks():
+        for i in range(0, len(body), chunk_size):
+            yield body[i : i + chunk_size]
+
+    def handler(request):
+        if requests is not None:
+            requests.append(request)
+        return httpx.Response(200, content=chunks())
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_label_selector_uses_workload_labels():
+    """Test selector derivation from formatted metric names."""
+    from app.loki import label_selector
+
+    assert label_selector("cpu{job=kubelet,namespace=shop,pod=api-1}") == '{namespace="shop",pod="api-1"}'
+    assert label_selector("cpu{job=kubelet,instance=10.0.0.1:9100}") is None
+    assert label_selector("rate(errors_total[5m])") is None
+
+
+def test_log_template_masks_variable_parts():
+    """Test that lines differing only in IDs and numbers share a template."""
+    from app.loki import log_template
+
+    first = log_template("ERROR request 4f1c2a9b-1d2e-4c3b-9a8f-0123456789ab failed after 312ms from 10.0.0.7:443")
+    second = log_template("ERROR request 9e8d7c6b-5a4f-4e3d-8c2b-a1b2c3d4e5f6 failed after 5ms from 10.2.3.4:443")
+
+    assert first == second == "ERROR request <uuid> failed after <num>ms from <ip>"
+    assert log_template('Exception: user "alice" not found (trace deadbeef42)') == (
+        "Exception: user <str> not found (trace <id>)"
+    )
+
+
+@pytest.mark.asyncio
+async def test_top_error_templates_streams_and_counts():
+    """Test template counting over a response streamed in small chunks."""
+    from app.loki import top_error_templates
+
+    lines = [f"ERROR timeout calling payments after {i}ms" for i in range(5)]
+    lines += ['ERROR invalid "quoted \\"value\\"" in request', "ERROR timeout calling payments after 9ms"]
+    requests = []
+    now = datetime.now(timezone.utc)
+
+    async with _loki_client(lines, requests=requests) as client:
+        templates = await top_error_templates(client, '{pod="api-1"}', now - timedelta(minutes=15), now)
+
+    assert templates == [
+        ("ERROR timeout calling payments after <num>ms", 6),
+        ("ERROR invalid <str> in request", 1),
+    ]
+    query = requests[0].url.params["query"]
+    assert query.startswith('{pod="api-1"} |~ ')
+
+
+@pytest.mark.asyncio
+async def test_stream_stops_at_line_and_byte_budgets():
+    """Test that reading stops once either budget is spent."""
+    from app.loki import stream_log_lines
+
+    lines = [f"ERROR line {i}" for i in range(100)]
+
+    async with _loki_client(lines) as client:
+        by_lines = [line async for line in stream_log_lines(client, {}, max_lines=10, max_bytes=10**6)]
+    async with _loki_client(lines) as client:
+        by_bytes = [line async for line in stream_log_lines(client, {}, max_lines=1000, max_bytes=500)]
+
+    assert by_lines == lines[:10]
+    assert 0 < len(by_bytes) < 30
+    assert by_bytes == lines[: len(by_bytes)]
+
+
+@pytest.mark.asyncio
+async def test_query_error_logs_formats_templates_with_counts():
+    """Test the RCA log context built from Loki."""
+    from app.rca import _query_error_logs
+
+    async with _loki_client(["ERROR db timeout 1", "ERROR db timeout 2"]) as client:
+        errors = await _query_error_logs(datetime.now(timezone.utc), "cpu{namespace=shop,pod=api-1}", client)
+
+    assert errors == ["2x ERROR db timeout <num>"]
@@ -67,7 +67,7 @@ async def test_get_anomalies():
             id="test-123", anomaly=anomaly_score, detected_at=datetime.now(timezone.utc), alerted=False
         )
 
-        recent_anomalies.insert(0, anomaly_detection)
+        recent_anomalies.add(anomaly_detection)
 
         client = TestClient(app)
         response = client.get("/api/v1/anomalies")
@@ -105,7 +105,7 @@ async def test_get_anomalies_with_filters():
                 id=f"test-{i}", anomaly=anomaly_score, detected_at=datetime.now(timezone.utc), alerted=False
             )
 
-            recent_anomalies.insert(0, anomaly_detection)
+            recent_anomalies.add(anomaly_detection)
 
         client = TestClient(app)
 
@@ -147,7 +147,7 @@ async def test_get_anomaly_by_id():
             id="test-specific", anomaly=anomaly_score, detected_at=datetime.now(timezone.utc), alerted=False
         )
 
-        recent_anomalies.insert(0, anomaly_detection)
+        recent_anomalies.add(anomaly_detection)
 
         client = TestClient(app)
 
@@ -189,7 +189,7 @@ async def test_get_stats():
                 id=f"test-{i}", anomaly=anomaly_score, detected_at=datetime.now(timezone.utc), alerted=(i % 3 == 0)
             )
 
-            recent_anomalies.insert(0, anomaly_detection)
+            recent_anomalies.add(anomaly_detection)
 
         client = TestClient(app)
         response = client.get("/stats")
@@ -201,6 +201,24 @@ async def test_get_stats():
         assert "alerts_sent" in data
 
 
+@pytest.mark.asyncio
+async def test_debug_cycle_returns_newest_first():
+    """Test the cycle timing breakdown endpoint."""
+    from app import detector as detection_module
+    from fastapi.testclient import TestClient
+
+    with patch("app.main.lifespan"), patch.object(detection_module, "cycle_history", []) as history:
+        from app.main import app
+
+        history.extend([{"total_seconds": 1.0}, {"total_seconds": 2.0}, {"total_seconds": 3.0}])
+        client = TestClient(app)
+
+        response = client.get("/debug/cycle?limit=2")
+
+        assert response.status_code == 200
+        assert response.json() == {"cycles": [{"total_seconds": 3.0}, {"total_seconds": 2.0}]}
+
+
 @pytest.mark.asyncio
 async def test_get_models():
     """Test get models endpoint - simplified."""
@@ -0,0 +1,80 @@
+"""Unit tests for the per-series model registry."""
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+
+def _features(mean=100.0, n=60, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(mean, 1.0, n)
+    return np.column_stack([values, np.arange(n) / n, values])
+
+
+def _registry(tmp_path, **overrides):
+    from models.model_registry import ModelRegistry
+
+    options = {
+        "retrain_interval_seconds": 3600,
+        "drift_threshold": 3.0,
+        "max_models": 10,
+        "max_bytes": 512 * 1024 * 1024,
+        "model_dir": str(tmp_path),
+    }
+    options.update(overrides)
+    return ModelRegistry(IsolationForest(n_estimators=10, random_state=42), **options)
+
+
+def test_model_reused_between_retrains(tmp_path):
+    """Test that a series model is fitted once and then reused."""
+    registry = _registry(tmp_path)
+
+    first = registry.get_model("series-a", _features())
+    second = registry.get_model("series-a", _features(seed=1))
+
+    assert first is second
+    assert registry.fits == 1
+
+
+def test_model_refitted_when_stale(tmp_path):
+    """Test that a model older than the retrain interval is refitted."""
+    registry = _registry(tmp_path, retrain_interval_seconds=0)
+
+    registry.get_model("series-a", _features())
+    registry.get_model("series-a", _features())
+
+    assert registry.fits == 2
+
+
+def test_model_refitted_on_drift(tmp_path):
+    """Test that a level shift in the series triggers a refit."""
+    registry = _registry(tmp_path)
+
+    registry.get_model("series-a", _features(mean=100.0))
+    registry.get_model("series-a", _features(mean=500.0))
+
+    assert registry.fits == 2
+
+
+def test_least_recently_used_model_evicted(tmp_path):
+    """Test LRU eviction once the model count cap is exceeded."""
+    registry = _registry(tmp_path, max_models=2, model_dir="")
+
+    registry.get_model("series-a", _features())
+    registry.get_model("series-b", _features())
+    registry.get_model("series-a", _features())
+    registry.get_model("series-c", _features())
+
+    assert len(registry) == 2
+    assert "series-a" in registry
+    assert "series-b" not in registry
+
+
+def test_persisted_models_loaded_after_restart(tmp_path):
+    """Test that a new registry reuses models saved by a previous one."""
+    _registry(tmp_path).get_model("series-a", _features())
+
+    restarted = _registry(tmp_path)
+    restarted.get_model("series-a", _features())
+
+    assert restarted.fits == 0
+    assert "series-a" in restarted
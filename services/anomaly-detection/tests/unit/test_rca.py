@@ -0,0 +1,84 @@
+"""Unit tests for root cause analysis."""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+
+def _score(metric='rate(http_requests_total{status=~"5.."}[5m])', severity="critical", value=10.0):
+    from app.main import AnomalyScore
+
+    return AnomalyScore(
+        metric=metric,
+        timestamp=datetime.now(timezone.utc),
+        value=value,
+        expected_value=1.0,
+        score=0.95,
+        severity=severity,
+        confidence=0.9,
+    )
+
+
+def test_metric_family_strips_functions_and_selectors():
+    """Test reduction of PromQL queries to their metric family."""
+    from app.rca import _metric_family
+
+    assert _metric_family('rate(http_requests_total{status=~"5.."}[5m])') == "http_requests_total"
+    assert _metric_family("sum by (le) (rate(http_request_duration_seconds_bucket[5m]))") == (
+        "http_request_duration_seconds"
+    )
+    assert _metric_family("container_memory_usage_bytes") == "container_memory_usage_bytes"
+
+
+@pytest.mark.asyncio
+async def test_context_gatherers_run_concurrently():
+    """Test that events, logs and correlated metrics are gathered in parallel."""
+    import app.main  # Imported up front so it is not timed
+    from app import rca
+    from app.main import AnomalyDetection
+
+    async def slow(*args):
+        await asyncio.sleep(0.2)
+        return []
+
+    detection = AnomalyDetection(id="a1", anomaly=_score(), detected_at=datetime.now(timezone.utc))
+
+    with (
+        patch.object(rca, "_collect_recent_events", side_effect=slow),
+        patch.object(rca, "_query_error_logs", side_effect=slow),
+        patch.object(rca, "_find_correlated_metrics", side_effect=slow),
+        patch.object(rca, "LLM_API_KEY", ""),
+    ):
+        start = time.monotonic()
+        await rca.perform_root_cause_analysis(detection, [])
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.5
+    assert detection.root_cause is not None
+
+
+@pytest.mark.asyncio
+async def test_llm_suggestions_are_cached_by_signature():
+    """Test that repeated incidents with the same signature reuse the LLM answer."""
+    from app import rca
+
+    response = MagicMock(status_code=200)
+    response.json.return_value = {
+        "choices": [{"message": {"content": "ROOT CAUSES:\n1. Bad deploy\n\nREMEDIATION:\n1. Roll back"}}]
+    }
+    http_client = MagicMock()
+    http_client.post = AsyncMock(return_value=response)
+    events = ["Deployment update: prod/api"]
+
+    rca._suggestion_cache.clear()
+    with patch.object(rca, "LLM_API_KEY", "key"):
+        first = await rca._generate_llm_suggestions(_score(value=10.0), events, [], [], http_client)
+        second = await rca._generate_llm_suggestions(_score(value=42.0), events, [], [], http_client)
+        other = await rca._generate_llm_suggestions(_score(severity="high"), events, [], [], http_client)
+
+    assert first == second == (["Bad deploy"], ["Roll back"])
+    assert other == first
+    assert http_client.post.await_count == 2
@@ -0,0 +1,66 @@
+"""Unit tests for the detection scheduler."""
+
+
+def _scheduler():
+    from app.scheduler import DetectionScheduler, ScheduledQuery
+
+    return DetectionScheduler(
+        [
+            ScheduledQuery("errors", 30, priority=0),
+            ScheduledQuery("latency", 60, priority=1),
+            ScheduledQuery("memory", 300, priority=2),
+        ]
+    )
+
+
+def test_ticks_are_wall_clock_aligned_per_query_interval():
+    """Test that each query runs on its own aligned cadence."""
+    scheduler = _scheduler()
+    assert scheduler.tick_seconds == 30
+
+    tick, missed = scheduler.next_tick(1012.5)
+    assert (tick, missed) == (990, 0)
+
+    runs = {}
+    for _ in range(10):
+        queries, shed = scheduler.start(tick)
+        runs[tick] = queries
+        assert shed == []
+        assert scheduler.finish(tick + 1) is False
+        tick, missed = scheduler.next_tick(tick + 1)
+        assert missed == 0
+
+    assert runs[990] == ["errors", "latency", "memory"]
+    assert runs[1020] == ["errors", "latency"]
+    assert runs[1050] == ["errors"]
+    assert runs[1200] == ["errors", "latency", "memory"]
+    assert sum("memory" in queries for queries in runs.values()) == 2
+
+
+def test_overrun_misses_ticks_and_sheds_lowest_priority_first():
+    """Test overrun handling: missed ticks, tiered shedding and recovery."""
+    scheduler = _scheduler()
+    scheduler.start(0)
+
+    # A 70s cycle overlaps two ticks: the latest runs straight away, the one before is missed
+    assert scheduler.finish(70) is True
+    assert scheduler.next_tick(70) == (60, 1)
+    assert scheduler.admitted_priority == 1
+
+    scheduler.start(60)
+    assert scheduler.finish(100) is True
+    assert scheduler.admitted_priority == 0
+
+    queries, shed = scheduler.start(300)
+    assert queries == ["errors"]
+    assert shed == ["latency", "memory"]
+
+    # A cycle within its tick admits one tier back; shed queries are still due
+    assert scheduler.finish(305) is False
+    queries, shed = scheduler.start(330)
+    assert queries == ["errors", "latency"]
+    assert shed == ["memory"]
+
+    scheduler.finish(331)
+    queries, _ = scheduler.start(360)
+    assert queries == ["errors", "latency", "memory"]
@@ -0,0 +1,123 @@
+"""Unit tests for the incremental series cache."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+
+
+def _result(labels, timestamps, value=1.0):
+    return {"metric": labels, "values": [[t, str(value)] for t in timestamps]}
+
+
+def test_series_buffer_wraps_and_keeps_order():
+    """Test that the ring buffer overwrites the oldest samples when full."""
+    from models.series_cache import SeriesBuffer
+
+    buffer = SeriesBuffer({}, capacity=4)
+    buffer.append(np.array([1.0, 2.0, 3.0]), np.array([10.0, 20.0, 30.0]))
+    buffer.append(np.array([3.0, 4.0, 5.0]), np.array([99.0, 40.0, 50.0]))
+
+    timestamps, values = buffer.view()
+
+    assert list(timestamps) == [2.0, 3.0, 4.0, 5.0]
+    assert list(values) == [20.0, 30.0, 40.0, 50.0]
+
+
+def test_series_buffer_evicts_expired_samples():
+    """Test eviction of samples older than the cutoff."""
+    from models.series_cache import SeriesBuffer
+
+    buffer = SeriesBuffer({}, capacity=4)
+    buffer.append(np.array([1.0, 2.0, 3.0, 4.0, 5.0]), np.arange(5.0))
+    buffer.evict_before(4.0)
+
+    timestamps, _ = buffer.view()
+
+    assert list(timestamps) == [4.0, 5.0]
+
+
+def test_fetch_range_only_requests_new_steps():
+    """Test that after the first fetch only the missing steps are requested."""
+    from models.series_cache import SeriesCache
+
+    cache = SeriesCache(window_seconds=600, step_seconds=60)
+
+    assert cache.fetch_range("q", 6030.0) == (5400.0, 6000.0)
+
+    cache.ingest("q", [_result({"pod": "a"}, range(5400, 6001, 60))], 6000.0)
+
+    assert cache.fetch_range("q", 6050.0) is None
+    assert cache.fetch_range("q", 6065.0) == (6060.0, 6060.0)
+    # A long outage falls back to a full window
+    assert cache.fetch_range("q", 9000.0) == (8400.0, 9000.0)
+
+
+def test_ingest_keys_series_by_labels_and_drops_quiet_series():
+    """Test that series are tracked per label set and forgotten once expired."""
+    from models.series_cache import SeriesCache
+
+    cache = SeriesCache(window_seconds=600, step_seconds=60)
+    cache.ingest("q", [_result({"pod": "a"}, range(5400, 6001, 60)), _result({"pod": "b"}, [5400])], 6000.0)
+    cache.ingest("q", [_result({"pod": "a"}, [6060])], 6060.0)
+
+    buffers = cache.series("q")
+
+    assert [b.labels for b in buffers] == [{"pod": "a"}]
+    timestamps, _ = buffers[0].view()
+    assert timestamps[0] == 5460.0
+    assert timestamps[-1] == 6060.0
+    assert len(buffers[0]) == 11
+
+
+@pytest.mark.asyncio
+async def test_detect_anomalies_fetches_incrementally():
+    """Test that a second cycle only requests the range since the last fetch."""
+    from models import detector
+
+    detector.initialize_models()
+
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {"status": "success", "data": {"result": []}}
+    client = MagicMock()
+    client.get = AsyncMock(return_value=response)
+
+    await detector.detect_anomalies("q", client)
+    await detector.detect_anomalies("q", client)
+
+    calls = client.get.call_args_list
+    first = calls[0].kwargs["params"]
+    assert first["end"] - first["start"] == detector.LOOKBACK_MINUTES * 60
+
+    # The second cycle either has nothing new to fetch or starts right after the first range
+    assert len(calls) <= 2
+    if len(calls) == 2:
+        assert calls[1].kwargs["params"]["start"] == first["end"] + detector.QUERY_STEP_SECONDS
+
+
+def test_parse_samples_builds_epoch_and_value_arrays():
+    """Test parsing of Prometheus sample pairs into typed arrays."""
+    from models.series_cache import parse_samples
+
+    timestamps, values = parse_samples([[1700000000.0, "1.5"], [1700000060.2, "NaN"], [1700000120, "+Inf"]])
+
+    assert timestamps.dtype == np.int64
+    assert list(timestamps) == [1700000000, 1700000060, 1700000120]
+    assert values[0] == 1.5
+    assert np.isnan(values[1])
+    assert np.isinf(values[2])
+
+
+def test_cache_can_store_float32_values():
+    """Test that the cache keeps values in the configured dtype."""
+    from models.series_cache import SeriesCache
+
+    cache = SeriesCache(window_seconds=600, step_seconds=60, value_dtype="float32")
+    cache.ingest("q", [_result({"pod": "a"}, range(5400, 6001, 60), value=2.5)], 6000.0)
+
+    timestamps, values = cache.series("q")[0].view()
+
+    assert timestamps.dtype == np.int64
+    assert values.dtype == np.float32
+    assert list(values) == [2.5] * 11
@@ -0,0 +1,99 @@
+"""Unit tests for series sharding across replicas."""
+
+import time
+
+import pytest
+
+
+def _keys(n=3000):
+    from models.series_cache import series_fingerprint
+
+    return [series_fingerprint({"pod": f"pod-{i}"}) for i in range(n)]
+
+
+def test_hash_ring_spreads_keys_evenly():
+    """Test that each member owns roughly 1/N of the keys."""
+    from app.sharding import HashRing
+
+    ring = HashRing(["a", "b", "c"])
+    keys = _keys()
+
+    counts = {member: 0 for member in ring.members}
+    for key in keys:
+        counts[ring.owner(key)] += 1
+
+    for count in counts.values():
+        assert len(keys) / 3 * 0.7 < count < len(keys) / 3 * 1.3
+
+
+def test_hash_ring_join_only_moves_keys_to_new_member():
+    """Test that a joining member only takes keys, never reshuffles the rest."""
+    from app.sharding import HashRing
+
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+
+    for key in _keys():
+        if before.owner(key) != after.owner(key):
+            assert after.owner(key) == "d"
+
+
+@pytest.mark.asyncio
+async def test_coordinators_partition_series_and_rebalance_on_leave():
+    """Test that replicas own disjoint series and absorb a leaving replica's share."""
+    from app.sharding import InMemoryMembership, ShardCoordinator
+
+    backend = InMemoryMembership()
+    replicas = [ShardCoordinator(backend, f"replica-{i}") for i in range(3)]
+    for replica in replicas:
+        await replica.refresh()
+    for replica in replicas:
+        await replica.refresh()
+
+    keys = _keys(300)
+    for key in keys:
+        assert sum(replica.owns(key) for replica in replicas) == 1
+
+    await replicas[2].stop()
+    for replica in replicas[:2]:
+        await replica.refresh()
+
+    for key in keys:
+        assert sum(replica.owns(key) for replica in replicas[:2]) == 1
+
+
+def test_coordinator_without_members_owns_everything():
+    """Test that an empty ring fails open."""
+    from app.sharding import InMemoryMembership, ShardCoordinator
+
+    coordinator = ShardCoordinator(InMemoryMembership(), "replica-0")
+
+    assert coordinator.owns("any-series")
+
+
+@pytest.mark.asyncio
+async def test_detect_anomalies_skips_series_owned_elsewhere():
+    """Test that detection ignores series owned by another replica."""
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    from models import detector
+
+    detector.initialize_models()
+
+    now = time.time()
+    values = [[now - 60 * i, "100" if i != 30 else "900"] for i in range(59, -1, -1)]
+
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {"status": "success", "data": {"result": [{"metric": {"pod": "a"}, "values": values}]}}
+    client = MagicMock()
+    client.get = AsyncMock(return_value=response)
+
+    elsewhere = MagicMock()
+    elsewhere.owns.return_value = False
+
+    with patch.object(detector, "shard_coordinator", elsewhere):
+        anomalies = await detector.detect_anomalies("q", client)
+
+    assert anomalies == []
+    elsewhere.owns.assert_called_once()
@@ -22,6 +22,68 @@ logger = logging.getLogger(__name__)
 # Configuration
 CORRELATION_TIME_WINDOW = int(os.getenv("CORRELATION_TIME_WINDOW", "300"))  # 5 minutes
 
+GROUP_MAX_ALERTS = int(os.getenv("GROUP_MAX_ALERTS", "100"))
+
+RECENT_GROUPS_KEY = "alert_groups:recent"
+
+# Atomically merge a batch of alerts into a group.
+#
+# A group is a hash of fields and counters, plus a sorted set of the
+# fingerprints of its alerts in arrival order, capped at the newest
+# GROUP_MAX_ALERTS. Each alert is stored once, in an ``alert:{fingerprint}``
+# hash tagged with the group instance it was counted in, so a re-sent alert
+# only refreshes its hash and the group never grows with duplicates.
+#
+# KEYS[1]: group hash, KEYS[2]: group fingerprints, KEYS[3]: recent groups list,
+# KEYS[4..]: alert hash of each alert
+# ARGV[1]: group ID, ARGV[2]: grouping key, ARGV[3]: now,
+# ARGV[4]: window cutoff (ISO-8601 UTC), ARGV[5]: expiration seconds,
+# ARGV[6]: maximum fingerprints kept, ARGV[7]: ingest entry ID ('' if none),
+# ARGV[8..]: alert JSON with its fingerprint, in KEYS order
+# Returns the group hash as a flat field/value list and the fingerprints kept.
+UPSERT_GROUP_SCRIPT = """
+local last_seen
+if redis.call('TYPE', KEYS[1]).ok == 'hash' then
+    last_seen = redis.call('HGET', KEYS[1], 'last_seen')
+end
+
+-- A missing group, one idle for the whole window, or a group stored by an
+-- earlier version as a JSON string is started afresh
+if not last_seen or last_seen <= ARGV[4] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    redis.call('HSET', KEYS[1], 'id', ARGV[1], 'grouping_key', ARGV[2], 'first_seen', ARGV[3],
+        'count', 0, 'occurrences', 0)
+    redis.call('LPUSH', KEYS[3], ARGV[1])
+    redis.call('LTRIM', KEYS[3], 0, 99) -- Keep last 100
+end
+
+local instance = ARGV[1] .. '@' .. redis.call('HGET', KEYS[1], 'first_seen')
+local occurrences = 0
+for i = 4, #KEYS do
+    local alert = ARGV[i + 4]
+    if redis.call('HGET', KEYS[i], 'group') ~= instance then
+        local count = redis.call('HINCRBY', KEYS[1], 'count', 1)
+        redis.call('ZADD', KEYS[2], count, cjson.decode(alert).fingerprint)
+        redis.call('HSET', KEYS[i], 'group', instance, 'first_seen', ARGV[3])
+    end
+    -- A redelivered ingest entry does not count its alerts again
+    if ARGV[7] == '' or redis.call('HGET', KEYS[i], 'entry') ~= ARGV[7] then
+        occurrences = occurrences + 1
+        redis.call('HSET', KEYS[i], 'entry', ARGV[7])
+    end
+    redis.call('HSET', KEYS[i], 'alert', alert, 'last_seen', ARGV[3])
+    redis.call('EXPIRE', KEYS[i], ARGV[5])
+end
+
+redis.call('HINCRBY', KEYS[1], 'occurrences', occurrences)
+redis.call('HSET', KEYS[1], 'last_seen', ARGV[3])
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[6]) - 1)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+
+return {redis.call('HGETALL', KEYS[1]), redis.call('ZRANGE', KEYS[2], 0, -1)}
+"""
+
 
 class AlertCorrelator:
     """Correlates and groups related alerts."""
@@ -30,20 +92,24 @@ class AlertCorrelator:
         """Initialize correlator with Redis client."""
         self.redis = redis_client
         self.time_window = timedelta(seconds=CORRELATION_TIME_WINDOW)
+        self._upsert_script = redis_client.register_script(UPSERT_GROUP_SCRIPT)
 
-    async def correlate_alerts(self, alerts: list[dict]) -> list[dict]:
+    async def correlate_alerts(self, alerts: list[dict], entry_id: str | None = None) -> list[dict]:
         """
         Correlate incoming alerts and group related ones.
 
+        Args:
+            alerts: Alerts to correlate
+            entry_id: Ingest entry the alerts come from; upserting the same
+                entry again does not count its alerts as new occurrences
+
         Returns list of alert groups.
         """
-        groups = []
-
-        # Convert alerts to dict if needed
+        # Convert alerts to JSON-compatible dicts if needed
         alert_dicts = []
         for alert in alerts:
-            if hasattr(alert, "dict"):
-                alert_dicts.append(alert.dict())
+            if hasattr(alert, "model_dump"):
+                alert_dicts.append(alert.model_dump(mode="json"))
             else:
                 alert_dicts.append(alert)
 
@@ -54,46 +120,8 @@ class AlertCorrelator:
             key = self._generate_grouping_key(alert)
             correlation_map[key].append(alert)
 
-        # Create alert groups
-        for grouping_key, grouped_alerts in correlation_map.items():
-            # Check for existing group
-            existing_group = await self._get_existing_group(grouping_key)
-
-            if existing_group:
-                # Update existing group
-                existing_group["alerts"].extend(grouped_alerts)
-                existing_group["count"] = len(existing_group["alerts"])
-                existing_group["last_seen"] = datetime.now(timezone.utc).isoformat()
-
-                # Recalculate priority
-                existing_group["priority_score"] = self._calculate_priority(existing_group["alerts"])
-
-                await self._save_group(existing_group)
-                groups.append(existing_group)
-            else:
-                # Create new group
-                group = {
-                    "id": self._generate_group_id(grouping_key),
-                    "alerts": grouped_alerts,
-                    "grouping_key": grouping_key,
-                    "priority_score": self._calculate_priority(grouped_alerts),
-                    "first_seen": datetime.now(timezone.utc).isoformat(),
-                    "last_seen": datetime.now(timezone.utc).isoformat(),
-                    "count": len(grouped_alerts),
-                    "suppressed": False,
-                    "suppression_reason": None,
-                    "routed_to": None,
-                }
-
-                await self._save_group(group)
-                groups.append(group)
-
-        # Deduplicate within groups
-        for group in groups:
-            group["alerts"] = self._deduplicate_alerts(group["alerts"])
-            group["count"] = len(group["alerts"])
-
-        return groups
+        # Upsert every group of this batch atomically in Redis
+        return await self._upsert_groups(correlation_map, entry_id)
 
     def _generate_grouping_key(self, alert: dict) -> str:
         """
@@ -156,71 +184,128 @@ class AlertCorrelator:
 
         return round(priority, 2)
 
-    def _deduplicate_alerts(self, alerts: list[dict]) -> list[dict]:
-        """Remove duplicate alerts based on fingerprint or labels."""
-        seen_fingerprints = set()
-        deduplicated = []
+    def _fingerprint(self, alert: dict) -> str:
+        """Return the alert fingerprint, or a hash of its labels when it has none."""
+        fingerprint = alert.get("fingerprint")
+        if not fingerprint:
+            labels = alert.get("labels", {})
+            fingerprint = hashlib.md5(json.dumps(labels, sort_keys=True).encode(), usedforsecurity=False).hexdigest()
+        return fingerprint
 
-        for alert in alerts:
-            # Use fingerprint if available, otherwise generate from labels
-            fingerprint = alert.get("fingerprint")
-            if not fingerprint:
-                labels = alert.get("labels", {})
-                fingerprint = hashlib.md5(
-                    json.dumps(labels, sort_keys=True).encode(), usedforsecurity=False
-                ).hexdigest()
+    def _group_keys(self, group_id: str) -> tuple[str, str]:
+        """Return the keys of a group's hash and of its fingerprint set."""
+        return f"alert_group:{group_id}", f"alert_group:{group_id}:alerts"
 
-            if fingerprint not in seen_fingerprints:
-                seen_fingerprints.add(fingerprint)
-                deduplicated.append(alert)
+    async def _load_groups(self, stored: list[tuple[dict, list[str]]]) -> list[dict]:
+        """
+        Build groups from their stored fields and fingerprints, reading their alerts in one pipeline.
 
-        return deduplicated
+        Alerts whose hash has expired are left out. Priority is scored on read.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for _, fingerprints in stored:
+            for fingerprint in fingerprints:
+                pipe.hget(f"alert:{fingerprint}", "alert")
+        values = iter(await pipe.execute())
+
+        groups = []
+        for fields, fingerprints in stored:
+            alerts = [json.loads(value) for value in (next(values) for _ in fingerprints) if value]
+            groups.append(
+                {
+                    "id": fields["id"],
+                    "grouping_key": fields["grouping_key"],
+                    "first_seen": fields["first_seen"],
+                    "last_seen": fields["last_seen"],
+                    "count": int(fields["count"]),
+                    "occurrences": int(fields["occurrences"]),
+                    "alerts": alerts,
+                    "priority_score": self._calculate_priority(alerts),
+                    "suppressed": False,
+                    "suppression_reason": None,
+                    "routed_to": None,
+                }
+            )
 
-    async def _get_existing_group(self, grouping_key: str) -> dict | None:
-        """Get existing alert group from Redis."""
-        group_id = self._generate_group_id(grouping_key)
-        group_data = await self.redis.get(f"alert_group:{group_id}")
+        return groups
+
+    async def _read_groups(self, group_ids: list[str]) -> list[dict]:
+        """Read groups with one pipeline for their fields and fingerprints and one for their alerts."""
+        pipe = self.redis.pipeline(transaction=False)
+        for group_id in group_ids:
+            group_key, fingerprints_key = self._group_keys(group_id)
+            pipe.hgetall(group_key)
+            pipe.zrange(fingerprints_key, 0, -1)
+        results = await pipe.execute()
 
-        if group_data:
-            group = json.loads(group_data)
+        stored = [(fields, fingerprints) for fields, fingerprints in zip(results[::2], results[1::2]) if fields]
+        return await self._load_groups(stored)
 
-            # Check if group is still within time window
-            last_seen = datetime.fromisoformat(group["last_seen"])
-            if datetime.now(timezone.utc) - last_seen < self.time_window:
-                return group
+    async def _upsert_groups(self, correlation_map: dict[str, list[dict]], entry_id: str | None = None) -> list[dict]:
+        """
+        Merge alerts into their groups with UPSERT_GROUP_SCRIPT, one call per group in a single pipeline.
 
-        return None
+        Each upsert is atomic on the Redis side, so concurrent batches and
+        replicas never overwrite each other's alerts. Alerts are deduplicated
+        by fingerprint as they are inserted, so re-sending a batch only
+        refreshes the stored alerts.
 
-    async def _save_group(self, group: dict):
-        """Save alert group to Redis."""
-        group_id = group["id"]
+        Returns:
+            The groups as stored after the upsert, each with ``batch_count``,
+            the number of alerts of this batch it received
+        """
+        if not correlation_map:
+            return []
 
+        now = datetime.now(timezone.utc)
+        # Stored timestamps are all UTC isoformat, so the script compares them as strings
+        cutoff = (now - self.time_window).isoformat()
         # Set with expiration (2x time window to keep history)
         expiration = int(self.time_window.total_seconds() * 2)
 
-        await self.redis.setex(f"alert_group:{group_id}", expiration, json.dumps(group))
+        pipe = self.redis.pipeline(transaction=False)
+        for grouping_key, grouped_alerts in correlation_map.items():
+            group_id = self._generate_group_id(grouping_key)
+            alerts = [{**alert, "fingerprint": self._fingerprint(alert)} for alert in grouped_alerts]
+
+            # The pipeline loads the script on execute if Redis lost it (e.g. after a restart)
+            await self._upsert_script(
+                keys=[
+                    *self._group_keys(group_id),
+                    RECENT_GROUPS_KEY,
+                    *(f"alert:{alert['fingerprint']}" for alert in alerts),
+                ],
+                args=[
+                    group_id,
+                    grouping_key,
+                    now.isoformat(),
+                    cutoff,
+                    expiration,
+                    GROUP_MAX_ALERTS,
+                    entry_id or "",
+                    *(json.dumps(alert) for alert in alerts),
+                ],
+                client=pipe,
+            )
+
+        results = await pipe.execute()
+
+        stored = [(dict(zip(fields[::2], fields[1::2])), fingerprints) for fields, fingerprints in results]
+        groups = await self._load_groups(stored)
+        for group, grouped_alerts in zip(groups, correlation_map.values()):
+            group["batch_count"] = len(grouped_alerts)
 
-        # Add to recent groups list
-        await self.redis.lpush("alert_groups:recent", group_id)
-        await self.redis.ltrim("alert_groups:recent", 0, 99)  # Keep last 100
+        return groups
 
     async def get_recent_groups(self, limit: int = 50) -> list[dict]:
         """Get recent alert groups."""
-        group_ids = await self.redis.lrange("alert_groups:recent", 0, limit - 1)
-
-        groups = []
-        for group_id in group_ids:
-            group_data = await self.redis.get(f"alert_group:{group_id}")
-            if group_data:
-                groups.append(json.loads(group_data))
+        group_ids = await self.redis.lrange(RECENT_GROUPS_KEY, 0, limit - 1)
+        if not group_ids:
+            return []
 
-        return groups
+        return await self._read_groups(group_ids)
 
     async def get_group(self, group_id: str) -> dict | None:
         """Get specific alert group."""
-        group_data = await self.redis.get(f"alert_group:{group_id}")
-
-        if group_data:
-            return json.loads(group_data)
-
-        return None
+        groups = await self._read_groups([group_id])
+        return groups[0] if groups else None
@@ -0,0 +1,180 @@
+"""
+Durable alert ingest queue backed by a Redis Stream.
+
+The ingest endpoints append each payload to the ``alerts:ingest`` stream and
+return straight away. A pool of consumers in the ``smart-alerting`` consumer
+group reads the entries and processes them. An entry is acknowledged and
+deleted only once processed, so the stream length is the backlog and a pod
+that restarts mid-processing loses nothing:
+- entries left pending by a consumer that failed or died are reclaimed by
+  another consumer after INGEST_CLAIM_IDLE_MS
+- an entry delivered INGEST_MAX_DELIVERIES times is dropped
+- ingest is refused while the backlog is at INGEST_MAX_BACKLOG, so senders
+  back off and retry
+
+Processing is at-least-once, so the handler receives the entry ID and records
+its progress under ``progress_key(entry_id)``; a redelivered entry then skips
+the work already done. The progress is deleted with the entry.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "10"))
+INGEST_BLOCK_MS = int(os.getenv("INGEST_BLOCK_MS", "5000"))
+INGEST_CLAIM_IDLE_MS = int(os.getenv("INGEST_CLAIM_IDLE_MS", "60000"))
+INGEST_MAX_DELIVERIES = int(os.getenv("INGEST_MAX_DELIVERIES", "5"))
+INGEST_MAX_BACKLOG = int(os.getenv("INGEST_MAX_BACKLOG", "50000"))
+
+INGEST_STREAM = "alerts:ingest"
+INGEST_GROUP = "smart-alerting"
+
+# Safety net for progress of entries that are never acknowledged
+INGEST_PROGRESS_TTL = 86400
+
+
+def progress_key(entry_id: str) -> str:
+    """Return the key of the hash recording the handler's progress on an entry."""
+    return f"alerts:ingest:progress:{entry_id}"
+
+
+class IngestQueue:
+    """Redis Stream queue between alert ingestion and processing."""
+
+    def __init__(self, redis_client: redis.Redis, handler: Callable[[list[dict], str, str], Awaitable[None]]):
+        """
+        Initialize ingest queue.
+
+        Args:
+            redis_client: Redis client
+            handler: Coroutine processing the alerts of one payload, its source and
+                its entry ID; the entry is redelivered when it raises
+        """
+        self.redis = redis_client
+        self.handler = handler
+        self._stopping = False
+
+    async def setup(self):
+        """Create the stream and consumer group if they do not exist."""
+        try:
+            await self.redis.xgroup_create(INGEST_STREAM, INGEST_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def enqueue(self, alerts: list, source: str) -> bool:
+        """
+        Append a payload of alerts to the stream.
+
+        Returns:
+            False when the backlog is full and the payload was not queued
+        """
+        from .main import INGEST_QUEUE_DEPTH, INGEST_REJECTED
+
+        depth = await self.redis.xlen(INGEST_STREAM)
+        INGEST_QUEUE_DEPTH.set(depth)
+
+        if depth >= INGEST_MAX_BACKLOG:
+            INGEST_REJECTED.labels(source=source).inc()
+            return False
+
+        payload = [alert.model_dump(mode="json") if hasattr(alert, "model_dump") else alert for alert in alerts]
+        await self.redis.xadd(INGEST_STREAM, {"source": source, "alerts": json.dumps(payload)})
+        return True
+
+    def stop(self):
+        """Ask consumers to return once their current batch is processed and acknowledged."""
+        self._stopping = True
+
+    async def run_consumer(self, consumer: str):
+        """Process entries as ``consumer`` until stopped."""
+        while not self._stopping:
+            try:
+                await self.reclaim(consumer)
+
+                response = await self.redis.xreadgroup(
+                    INGEST_GROUP, consumer, {INGEST_STREAM: ">"}, count=INGEST_BATCH_SIZE, block=INGEST_BLOCK_MS
+                )
+                entries = [entry for _, stream_entries in response for entry in stream_entries]
+                if entries:
+                    await self._process(entries)
+                else:
+                    await asyncio.sleep(0)  # Let other tasks run should the read return without blocking
+
+            except Exception as e:
+                logger.error(f"Error in ingest consumer {consumer}: {e}")
+                await asyncio.sleep(1)
+
+    async def reclaim(self, consumer: str) -> int:
+        """
+        Take over entries left pending for longer than INGEST_CLAIM_IDLE_MS and process them.
+
+        Entries already delivered INGEST_MAX_DELIVERIES times are dropped instead.
+
+        Returns:
+            Number of entries reclaimed
+        """
+        from .main import INGEST_DROPPED
+
+        pending = await self.redis.xpending_range(
+            INGEST_STREAM, INGEST_GROUP, min="-", max="+", count=INGEST_BATCH_SIZE, idle=INGEST_CLAIM_IDLE_MS
+        )
+        if not pending:
+            return 0
+
+        retry = []
+        for entry in pending:
+            if entry["times_delivered"] >= INGEST_MAX_DELIVERIES:
+                logger.error(f"Dropping ingest entry {entry['message_id']} after {entry['times_delivered']} deliveries")
+                INGEST_DROPPED.inc()
+                await self._ack(entry["message_id"])
+            else:
+                retry.append(entry["message_id"])
+
+        if not retry:
+            return 0
+
+        # Entries claimed by another consumer in the meantime are not returned
+        claimed = await self.redis.xclaim(INGEST_STREAM, INGEST_GROUP, consumer, INGEST_CLAIM_IDLE_MS, retry)
+        await self._process(claimed)
+        return len(claimed)
+
+    async def _process(self, entries: list):
+        """Run the handler on each entry, acknowledging those that succeed."""
+        from .main import INGEST_LAG
+
+        for entry_id, fields in entries:
+            # Stream IDs start with the millisecond timestamp at which the entry was added
+            INGEST_LAG.observe(max(0.0, time.time() - int(entry_id.split("-")[0]) / 1000))
+
+            try:
+                await self.handler(json.loads(fields["alerts"]), fields["source"], entry_id)
+            except Exception as e:
+                # Left pending; reclaimed once idle for INGEST_CLAIM_IDLE_MS
+                logger.error(f"Error processing ingest entry {entry_id}: {e}", exc_info=True)
+                continue
+
+            await self._ack(entry_id)
+
+    async def _ack(self, entry_id: str):
+        """Acknowledge and delete an entry and its progress, so the stream holds only the backlog."""
+        from .main import INGEST_QUEUE_DEPTH
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xack(INGEST_STREAM, INGEST_GROUP, entry_id)
+        pipe.xdel(INGEST_STREAM, entry_id)
+        pipe.delete(progress_key(entry_id))
+        pipe.xlen(INGEST_STREAM)
+        *_, depth = await pipe.execute()
+        INGEST_QUEUE_DEPTH.set(depth)
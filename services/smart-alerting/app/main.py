@@ -8,8 +8,10 @@ This service provides intelligent alerting that reduces noise through:
 - Intelligent routing to appropriate teams and channels
 """
 
+import asyncio
 import logging
 import os
+import socket
 import uuid
 from contextlib import asynccontextmanager
 from datetime import UTC, datetime
@@ -17,12 +19,13 @@ from typing import Any, Dict, List, Optional
 
 import httpx
 import redis.asyncio as redis
-from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException
 from prometheus_client import Counter, Gauge, Histogram, make_asgi_app
 from pydantic import BaseModel, Field
 
 from .correlation import AlertCorrelator
-from .routing import AlertRouter
+from .ingest import INGEST_PROGRESS_TTL, INGEST_WORKERS, IngestQueue, progress_key
+from .routing import BACKSTAGE_PREFETCH_INTERVAL, AlertRouter
 from .suppression import SuppressionEngine
 
 # Configure logging
@@ -46,6 +49,7 @@ http_client: httpx.AsyncClient | None = None
 correlator: AlertCorrelator | None = None
 suppression_engine: SuppressionEngine | None = None
 router: AlertRouter | None = None
+ingest_queue: IngestQueue | None = None
 
 
 # Pydantic models
@@ -90,6 +94,7 @@ class AlertGroup(BaseModel):
     first_seen: datetime
     last_seen: datetime
     count: int
+    occurrences: int = 0
     suppressed: bool = False
     suppression_reason: str | None = None
     routed_to: list[str] | None = None
@@ -149,6 +154,42 @@ ALERT_FATIGUE_REDUCTION = Gauge("smart_alerting_fatigue_reduction", "Alert fatig
 
 FALSE_ALERT_RATE = Gauge("smart_alerting_false_alert_rate", "False alert rate")
 
+NOTIFICATION_DURATION = Histogram(
+    "smart_alerting_notification_duration_seconds",
+    "Notification delivery duration",
+    ["channel", "outcome"],
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+)
+
+NOTIFICATION_RETRIES = Counter(
+    "smart_alerting_notification_retries_total", "Failed notifications queued for retry", ["channel"]
+)
+
+NOTIFICATIONS_DROPPED = Counter(
+    "smart_alerting_notifications_dropped_total", "Notifications dropped after exhausting retries", ["channel"]
+)
+
+NOTIFICATION_RETRY_QUEUE_DEPTH = Gauge(
+    "smart_alerting_notification_retry_queue_depth",
+    "Notifications waiting in the retry queue, excluding those being retried",
+)
+
+INGEST_QUEUE_DEPTH = Gauge("smart_alerting_ingest_queue_depth", "Alert payloads queued or being processed")
+
+INGEST_LAG = Histogram(
+    "smart_alerting_ingest_lag_seconds",
+    "Time from ingest to processing of an alert payload",
+    buckets=[0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0],
+)
+
+INGEST_REJECTED = Counter(
+    "smart_alerting_ingest_rejected_total", "Alert payloads rejected while the ingest backlog is full", ["source"]
+)
+
+INGEST_DROPPED = Counter(
+    "smart_alerting_ingest_dropped_total", "Alert payloads dropped after exhausting processing attempts"
+)
+
 PROCESSING_DURATION = Histogram(
     "smart_alerting_processing_duration_seconds", "Alert processing duration", buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0]
 )
@@ -158,7 +199,7 @@ PROCESSING_DURATION = Histogram(
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan."""
-    global redis_client, http_client, correlator, suppression_engine, router
+    global redis_client, http_client, correlator, suppression_engine, router, ingest_queue
 
     logger.info("Starting Smart Alerting Service")
 
@@ -183,16 +224,40 @@ async def lifespan(app: FastAPI):
         mattermost_webhook=MATTERMOST_WEBHOOK_URL,
         slack_webhook=SLACK_WEBHOOK_URL,
         pagerduty_api_key=PAGERDUTY_API_KEY,
+        redis_client=redis_client,
     )
 
     # Load suppression rules
     await suppression_engine.load_rules_from_directory("rules/")
     logger.info(f"✅ Loaded {len(suppression_engine.rules)} suppression rules")
 
+    # Ingest consumers, named after the pod so each replica has its own
+    ingest_queue = IngestQueue(redis_client, process_alerts)
+    await ingest_queue.setup()
+
+    consumers = [
+        asyncio.create_task(ingest_queue.run_consumer(f"{socket.gethostname()}-{i}")) for i in range(INGEST_WORKERS)
+    ]
+
+    # Background workers
+    workers = [asyncio.create_task(router.process_retries())]
+
+    # Keep service owners cached so routing does not wait on Backstage
+    if BACKSTAGE_PREFETCH_INTERVAL > 0:
+        workers.append(asyncio.create_task(router.refresh_owners_periodically()))
+
     yield
 
     # Shutdown
     logger.info("Shutting down Smart Alerting Service")
+
+    # Let consumers finish and acknowledge what they are processing
+    ingest_queue.stop()
+    await asyncio.gather(*consumers, return_exceptions=True)
+
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
     if redis_client:
         await redis_client.close()
     if http_client:
@@ -263,44 +328,53 @@ async def ready():
     return {"status": "READY", "service": "smart-alerting"}
 
 
+async def enqueue_alerts(alerts: list[Alert], source: str):
+    """Queue alerts for processing, or ask the sender to retry later when the backlog is full."""
+    if not ingest_queue:
+        raise HTTPException(status_code=503, detail="Ingest queue not initialized")
+
+    if not await ingest_queue.enqueue(alerts, source):
+        raise HTTPException(status_code=503, detail="Ingest backlog full", headers={"Retry-After": "30"})
+
+
 @app.post("/api/v1/alerts/prometheus")
-async def ingest_prometheus_alerts(payload: PrometheusAlertPayload, background_tasks: BackgroundTasks):
+async def ingest_prometheus_alerts(payload: PrometheusAlertPayload):
     """Ingest alerts from Prometheus."""
     ALERTS_RECEIVED.labels(source="prometheus").inc(len(payload.alerts))
 
-    background_tasks.add_task(process_alerts, payload.alerts, "prometheus")
+    await enqueue_alerts(payload.alerts, "prometheus")
 
-    return {"message": f"Received {len(payload.alerts)} alerts", "status": "processing"}
+    return {"message": f"Received {len(payload.alerts)} alerts", "status": "queued"}
 
 
 @app.post("/api/v1/alerts/grafana")
-async def ingest_grafana_alerts(alerts: list[Alert], background_tasks: BackgroundTasks):
+async def ingest_grafana_alerts(alerts: list[Alert]):
     """Ingest alerts from Grafana."""
     ALERTS_RECEIVED.labels(source="grafana").inc(len(alerts))
 
-    background_tasks.add_task(process_alerts, alerts, "grafana")
+    await enqueue_alerts(alerts, "grafana")
 
-    return {"message": f"Received {len(alerts)} alerts", "status": "processing"}
+    return {"message": f"Received {len(alerts)} alerts", "status": "queued"}
 
 
 @app.post("/api/v1/alerts/datahub")
-async def ingest_datahub_alerts(alerts: list[Alert], background_tasks: BackgroundTasks):
+async def ingest_datahub_alerts(alerts: list[Alert]):
     """Ingest alerts from DataHub."""
     ALERTS_RECEIVED.labels(source="datahub").inc(len(alerts))
 
-    background_tasks.add_task(process_alerts, alerts, "datahub")
+    await enqueue_alerts(alerts, "datahub")
 
-    return {"message": f"Received {len(alerts)} alerts", "status": "processing"}
+    return {"message": f"Received {len(alerts)} alerts", "status": "queued"}
 
 
 @app.post("/api/v1/alerts/generic")
-async def ingest_generic_alerts(alerts: list[Alert], background_tasks: BackgroundTasks):
+async def ingest_generic_alerts(alerts: list[Alert]):
     """Ingest generic alerts."""
     ALERTS_RECEIVED.labels(source="generic").inc(len(alerts))
 
-    background_tasks.add_task(process_alerts, alerts, "generic")
+    await enqueue_alerts(alerts, "generic")
 
-    return {"message": f"Received {len(alerts)} alerts", "status": "processing"}
+    return {"message": f"Received {len(alerts)} alerts", "status": "queued"}
 
 
 @app.get("/api/v1/alert-groups")
@@ -332,7 +406,8 @@ async def get_alert(alert_id: str) -> Alert:
     if not redis_client:
         raise HTTPException(status_code=503, detail="Redis not initialized")
 
-    alert_data = await redis_client.get(f"alert:{alert_id}")
+    # Alerts are stored by fingerprint by the correlator
+    alert_data = await redis_client.hget(f"alert:{alert_id}", "alert")
     if not alert_data:
         raise HTTPException(status_code=404, detail="Alert not found")
 
@@ -476,44 +551,68 @@ async def get_reduction_stats():
     }
 
 
-async def process_alerts(alerts: list[Alert], source: str):
-    """Process incoming alerts through correlation, suppression, and routing."""
-    start_time = datetime.now(UTC)
-
-    try:
-        # Correlate alerts
-        groups = await correlator.correlate_alerts(alerts)
-        ALERT_GROUPS_CREATED.inc(len(groups))
+async def process_alerts(alerts: list[dict], source: str, entry_id: str | None = None):
+    """
+    Process incoming alerts through correlation, suppression, and routing.
 
-        # Apply suppression rules
-        for group in groups:
-            suppressed, reason = await suppression_engine.should_suppress(group)
-            group.suppressed = suppressed
-            group.suppression_reason = reason
+    Raises on failure so the ingest queue retries the payload. A retried
+    entry skips the groups, and the totals, its earlier deliveries already
+    handled, so they are neither notified nor counted twice.
 
-            if suppressed:
-                ALERTS_SUPPRESSED.labels(reason=reason).inc(len(group.alerts))
-                await redis_client.incr("stats:total_suppressed", len(group.alerts))
-            else:
-                # Route non-suppressed alerts
-                channels = await router.route_alert_group(group)
-                group.routed_to = channels
+    Args:
+        alerts: Alerts of one ingested payload
+        source: Alert source
+        entry_id: Ingest stream entry the alerts come from, if any
+    """
+    start_time = datetime.now(UTC)
+    progress = progress_key(entry_id) if entry_id else None
+    done = await redis_client.hgetall(progress) if progress else {}
+
+    # Correlate alerts; a retried entry does not count its alerts again
+    groups = await correlator.correlate_alerts(alerts, entry_id)
+
+    # Apply suppression rules
+    for group in groups:
+        if group["id"] in done:
+            continue
+
+        suppressed, reason = await suppression_engine.should_suppress(group)
+        group["suppressed"] = suppressed
+        group["suppression_reason"] = reason
+
+        # Statistics are recorded together with the progress of the entry
+        pipe = redis_client.pipeline()
+        if suppressed:
+            ALERTS_SUPPRESSED.labels(reason=reason).inc(group["batch_count"])
+            pipe.incr("stats:total_suppressed", group["batch_count"])
+        else:
+            # Route non-suppressed alerts
+            channels = await router.route_alert_group(group)
+            group["routed_to"] = channels
 
-                for channel in channels:
-                    ALERTS_ROUTED.labels(channel=channel).inc()
+            for channel in channels:
+                ALERTS_ROUTED.labels(channel=channel).inc()
 
-                await redis_client.incr("stats:total_routed", len(group.alerts))
+            pipe.incr("stats:total_routed", group["batch_count"])
 
-        await redis_client.incr("stats:total_received", len(alerts))
-        await redis_client.incr("stats:total_grouped", len(groups))
+        if progress:
+            pipe.hset(progress, group["id"], "suppressed" if suppressed else "routed")
+            pipe.expire(progress, INGEST_PROGRESS_TTL)
+        await pipe.execute()
 
-        duration = (datetime.now(UTC) - start_time).total_seconds()
-        PROCESSING_DURATION.observe(duration)
+    if "totals" not in done:
+        ALERT_GROUPS_CREATED.inc(len(groups))
+        pipe = redis_client.pipeline()
+        pipe.incr("stats:total_received", len(alerts))
+        pipe.incr("stats:total_grouped", len(groups))
+        if progress:
+            pipe.hset(progress, "totals", "recorded")
+        await pipe.execute()
 
-        logger.info(f"Processed {len(alerts)} alerts from {source} in {duration:.2f}s")
+    duration = (datetime.now(UTC) - start_time).total_seconds()
+    PROCESSING_DURATION.observe(duration)
 
-    except Exception as e:
-        logger.error(f"Error processing alerts: {e}", exc_info=True)
+    logger.info(f"Processed {len(alerts)} alerts from {source} in {duration:.2f}s")
 
 
 if __name__ == "__main__":
@@ -8,17 +8,37 @@ Routes alerts based on:
 - Escalation policies
 """
 
+import asyncio
+import json
 import logging
 import os
+import time
+import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List
 
 import httpx
+import redis.asyncio as redis
 
 logger = logging.getLogger(__name__)
 
 # Configuration
 ESCALATION_TIMEOUT = int(os.getenv("ESCALATION_TIMEOUT", "900"))  # 15 minutes
+OWNER_CACHE_TTL = int(os.getenv("OWNER_CACHE_TTL", "600"))  # 10 minutes
+OWNER_NEGATIVE_CACHE_TTL = int(os.getenv("OWNER_NEGATIVE_CACHE_TTL", "60"))
+OWNER_LOOKUP_TIMEOUT = float(os.getenv("OWNER_LOOKUP_TIMEOUT", "5"))
+BACKSTAGE_PREFETCH_INTERVAL = int(os.getenv("BACKSTAGE_PREFETCH_INTERVAL", "300"))  # 0 disables prefetch
+NOTIFICATION_TIMEOUT = float(os.getenv("NOTIFICATION_TIMEOUT", "10"))
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "6"))
+NOTIFICATION_RETRY_BASE_DELAY = float(os.getenv("NOTIFICATION_RETRY_BASE_DELAY", "5"))
+NOTIFICATION_RETRY_MAX_DELAY = float(os.getenv("NOTIFICATION_RETRY_MAX_DELAY", "300"))
+NOTIFICATION_RETRY_POLL_INTERVAL = float(os.getenv("NOTIFICATION_RETRY_POLL_INTERVAL", "1"))
+
+PAGERDUTY_EVENTS_URL = "https://events.pagerduty.com/v2/enqueue"
+
+# Failed deliveries scored by the time they are due for retry
+RETRY_QUEUE_KEY = "notifications:retry"
+DEAD_LETTER_KEY = "notifications:dead"
 
 
 class AlertRouter:
@@ -31,23 +51,28 @@ class AlertRouter:
         mattermost_webhook: str = "",
         slack_webhook: str = "",
         pagerduty_api_key: str = "",
+        redis_client: redis.Redis | None = None,
     ):
         """Initialize alert router."""
         self.http_client = http_client
+        self.redis = redis_client
         self.backstage_url = backstage_url
         self.mattermost_webhook = mattermost_webhook
         self.slack_webhook = slack_webhook
         self.pagerduty_api_key = pagerduty_api_key
         self.escalation_timeout = timedelta(seconds=ESCALATION_TIMEOUT)
 
+        # Service -> (owner or None when unknown, monotonic expiry)
+        self._owner_cache: dict[str, tuple[str | None, float]] = {}
+        # In-flight lookups, shared by concurrent callers of the same service
+        self._owner_lookups: dict[str, asyncio.Task] = {}
+
     async def route_alert_group(self, alert_group: dict) -> list[str]:
         """
         Route alert group to appropriate channels.
 
         Returns list of channels where alerts were sent.
         """
-        channels = []
-
         # Determine severity
         priority_score = alert_group.get("priority_score", 0.0)
         severity = self._calculate_severity(priority_score)
@@ -59,31 +84,36 @@ class AlertRouter:
         context = await self._enrich_context(alert_group)
 
         # Route based on severity
+        deliveries = {}
+
         if severity == "P0":
             # Critical - page on-call
             if self.pagerduty_api_key:
-                success = await self._send_to_pagerduty(alert_group, owners, context)
-                if success:
-                    channels.append("pagerduty")
+                deliveries["pagerduty"] = self._format_pagerduty_event(alert_group, owners, context)
 
         if severity in ["P0", "P1"]:
             # High priority - Slack/Mattermost
             if self.slack_webhook:
-                success = await self._send_to_slack(alert_group, owners, context, severity)
-                if success:
-                    channels.append("slack")
+                deliveries["slack"] = self._format_slack_message(alert_group, owners, context, severity)
 
             if self.mattermost_webhook:
-                success = await self._send_to_mattermost(alert_group, owners, context, severity)
-                if success:
-                    channels.append("mattermost")
+                deliveries["mattermost"] = self._format_mattermost_message(alert_group, owners, context, severity)
 
         if severity in ["P2", "P3"]:
             # Medium/Low priority - Only Mattermost
             if self.mattermost_webhook:
-                success = await self._send_to_mattermost(alert_group, owners, context, severity)
-                if success:
-                    channels.append("mattermost")
+                deliveries["mattermost"] = self._format_mattermost_message(alert_group, owners, context, severity)
+
+        # Deliver to all channels at once; failed deliveries are retried in the background
+        results = await asyncio.gather(*(self._deliver(channel, message) for channel, message in deliveries.items()))
+
+        channels = []
+        for (channel, message), delivered in zip(deliveries.items(), results):
+            if delivered:
+                logger.info(f"Sent alert group {alert_group['id']} to {channel}")
+                channels.append(channel)
+            else:
+                await self._enqueue_retry(channel, message, alert_group["id"])
 
         return channels
 
@@ -99,8 +129,13 @@ class AlertRouter:
             return "P3"  # Low
 
     async def _get_service_owners(self, alert_group: dict) -> list[str]:
-        """Get service owners from Backstage."""
-        owners = []
+        """
+        Get service owners from Backstage.
+
+        Owners are served from a TTL cache. An expired entry is returned as is
+        while it is refreshed in the background, so only services never seen
+        before wait on Backstage, and those are looked up concurrently.
+        """
         services = set()
 
         # Extract services from alerts
@@ -109,25 +144,105 @@ class AlertRouter:
             if service:
                 services.add(service)
 
-        # Query Backstage for each service
+        now = time.monotonic()
+        owners = set()
+        missing = []
+
         for service in services:
-            try:
-                response = await self.http_client.get(
-                    f"{self.backstage_url}/api/catalog/entities/by-name/component/default/{service}", timeout=5.0
-                )
+            cached = self._owner_cache.get(service)
+            if cached is None:
+                missing.append(service)
+                continue
+
+            owner, expires_at = cached
+            if expires_at <= now:
+                self._lookup_owner(service)  # Refresh in the background
+            if owner:
+                owners.add(owner)
+
+        if missing:
+            for owner in await asyncio.gather(*(self._lookup_owner(service) for service in missing)):
+                if owner:
+                    owners.add(owner)
+
+        return list(owners)
+
+    def _lookup_owner(self, service: str) -> asyncio.Task:
+        """Start (or join) the Backstage lookup of ``service``; the task caches its result."""
+        task = self._owner_lookups.get(service)
+        if task is None:
+            task = asyncio.create_task(self._fetch_owner(service))
+            self._owner_lookups[service] = task
+            task.add_done_callback(lambda _: self._owner_lookups.pop(service, None))
+        return task
+
+    async def _fetch_owner(self, service: str) -> str | None:
+        """Fetch the owner of ``service`` from Backstage and cache it."""
+        try:
+            response = await self.http_client.get(
+                f"{self.backstage_url}/api/catalog/entities/by-name/component/default/{service}",
+                timeout=OWNER_LOOKUP_TIMEOUT,
+            )
+
+            if response.status_code == 404:
+                owner = None
+            else:
+                response.raise_for_status()
+                owner = response.json().get("spec", {}).get("owner")
+
+        except Exception as e:
+            logger.warning(f"Failed to get owner for service {service}: {e}")
+            return self._cache_lookup_failure(service)
+
+        self._cache_owner(service, owner)
+        return owner
+
+    def _cache_owner(self, service: str, owner: str | None):
+        """Cache the owner of ``service``; unknown owners expire sooner."""
+        ttl = OWNER_CACHE_TTL if owner else OWNER_NEGATIVE_CACHE_TTL
+        self._owner_cache[service] = (owner, time.monotonic() + ttl)
 
-                if response.status_code == 200:
-                    entity = response.json()
-                    spec = entity.get("spec", {})
-                    owner = spec.get("owner")
+    def _cache_lookup_failure(self, service: str) -> str | None:
+        """Keep serving a known owner through a Backstage outage, otherwise cache the miss briefly."""
+        owner = self._owner_cache.get(service, (None, 0.0))[0]
+        self._owner_cache[service] = (owner, time.monotonic() + OWNER_NEGATIVE_CACHE_TTL)
+        return owner
 
-                    if owner:
-                        owners.append(owner)
+    async def prefetch_owners(self) -> int:
+        """
+        Load the owners of every component of the Backstage catalog into the cache.
 
+        Returns:
+            Number of components cached
+        """
+        response = await self.http_client.get(
+            f"{self.backstage_url}/api/catalog/entities",
+            params={
+                "filter": "kind=component,metadata.namespace=default",
+                "fields": "metadata.name,spec.owner",
+            },
+            timeout=30.0,
+        )
+        response.raise_for_status()
+
+        entities = response.json()
+        for entity in entities:
+            name = entity.get("metadata", {}).get("name")
+            if name:
+                self._cache_owner(name, entity.get("spec", {}).get("owner"))
+
+        return len(entities)
+
+    async def refresh_owners_periodically(self, interval: int = BACKSTAGE_PREFETCH_INTERVAL):
+        """Prefetch the catalog now and then every ``interval`` seconds until cancelled."""
+        while True:
+            try:
+                count = await self.prefetch_owners()
+                logger.info(f"Prefetched owners of {count} Backstage components")
             except Exception as e:
-                logger.warning(f"Failed to get owner for service {service}: {e}")
+                logger.warning(f"Failed to prefetch Backstage owners: {e}")
 
-        return list(set(owners))  # Deduplicate
+            await asyncio.sleep(interval)
 
     async def _enrich_context(self, alert_group: dict) -> dict:
         """Enrich alert with context."""
@@ -151,132 +266,188 @@ class AlertRouter:
 
         return context
 
-    async def _send_to_pagerduty(self, alert_group: dict, owners: list[str], context: dict) -> bool:
-        """Send alert to PagerDuty."""
-        if not self.pagerduty_api_key:
-            return False
-
-        try:
-            # Create PagerDuty event
-            event = {
-                "routing_key": self.pagerduty_api_key,
-                "event_action": "trigger",
-                "payload": {
-                    "summary": self._format_summary(alert_group),
-                    "severity": "critical",
-                    "source": "fawkes-smart-alerting",
-                    "custom_details": {
-                        "alert_count": alert_group.get("count", 0),
-                        "priority_score": alert_group.get("priority_score", 0),
-                        "owners": owners,
-                        "context": context,
-                    },
+    def _format_pagerduty_event(self, alert_group: dict, owners: list[str], context: dict) -> dict:
+        """Format PagerDuty event; the routing key is added at delivery."""
+        return {
+            "event_action": "trigger",
+            "payload": {
+                "summary": self._format_summary(alert_group),
+                "severity": "critical",
+                "source": "fawkes-smart-alerting",
+                "custom_details": {
+                    "alert_count": alert_group.get("count", 0),
+                    "priority_score": alert_group.get("priority_score", 0),
+                    "owners": owners,
+                    "context": context,
                 },
-            }
-
-            response = await self.http_client.post("https://events.pagerduty.com/v2/enqueue", json=event, timeout=10.0)
+            },
+        }
+
+    def _format_slack_message(self, alert_group: dict, owners: list[str], context: dict, severity: str) -> dict:
+        """Format Slack message."""
+        color = self._get_severity_color(severity)
+
+        message = {
+            "attachments": [
+                {
+                    "color": color,
+                    "title": f"{severity} Alert: {self._format_summary(alert_group)}",
+                    "text": self._format_details(alert_group),
+                    "fields": [
+                        {"title": "Alert Count", "value": str(alert_group.get("count", 0)), "short": True},
+                        {
+                            "title": "Priority Score",
+                            "value": str(alert_group.get("priority_score", 0)),
+                            "short": True,
+                        },
+                        {"title": "Owners", "value": ", ".join(owners) if owners else "Unknown", "short": True},
+                        {"title": "First Seen", "value": alert_group.get("first_seen", "Unknown"), "short": True},
+                    ],
+                    "footer": "Fawkes Smart Alerting",
+                    "ts": int(datetime.now(timezone.utc).timestamp()),
+                }
+            ]
+        }
 
-            if response.status_code == 202:
-                logger.info(f"Sent alert group {alert_group['id']} to PagerDuty")
-                return True
-            else:
-                logger.error(f"Failed to send to PagerDuty: {response.status_code}")
-                return False
+        # Add context
+        if context.get("runbooks"):
+            message["attachments"][0]["fields"].append(
+                {
+                    "title": "Runbooks",
+                    "value": "\n".join([f"• {url}" for url in context["runbooks"]]),
+                    "short": False,
+                }
+            )
+
+        return message
+
+    def _format_mattermost_message(self, alert_group: dict, owners: list[str], context: dict, severity: str) -> dict:
+        """Format Mattermost message."""
+        emoji = self._get_severity_emoji(severity)
+
+        message_text = f"{emoji} **{severity} Alert: {self._format_summary(alert_group)}**\n\n"
+        message_text += f"{self._format_details(alert_group)}\n\n"
+        message_text += f"**Alert Count:** {alert_group.get('count', 0)}\n"
+        message_text += f"**Priority Score:** {alert_group.get('priority_score', 0)}\n"
+        message_text += f"**Owners:** {', '.join(owners) if owners else 'Unknown'}\n"
+        message_text += f"**First Seen:** {alert_group.get('first_seen', 'Unknown')}\n"
+
+        # Add runbooks
+        if context.get("runbooks"):
+            message_text += "\n**Runbooks:**\n"
+            for url in context["runbooks"]:
+                message_text += f"• {url}\n"
+
+        return {"text": message_text, "username": "Fawkes Smart Alerting", "icon_emoji": ":bell:"}
+
+    async def _deliver(self, channel: str, message: dict) -> bool:
+        """
+        Post a formatted message to a channel and record its latency.
 
-        except Exception as e:
-            logger.error(f"Error sending to PagerDuty: {e}")
-            return False
+        Returns:
+            Whether the channel accepted the message
+        """
+        from .main import NOTIFICATION_DURATION
 
-    async def _send_to_slack(self, alert_group: dict, owners: list[str], context: dict, severity: str) -> bool:
-        """Send alert to Slack."""
-        if not self.slack_webhook:
-            return False
+        if channel == "pagerduty":
+            url, expected_status = PAGERDUTY_EVENTS_URL, 202
+            message = {"routing_key": self.pagerduty_api_key, **message}
+        else:
+            url, expected_status = {"slack": self.slack_webhook, "mattermost": self.mattermost_webhook}[channel], 200
 
+        start = time.perf_counter()
         try:
-            # Format Slack message
-            color = self._get_severity_color(severity)
-
-            message = {
-                "attachments": [
-                    {
-                        "color": color,
-                        "title": f"{severity} Alert: {self._format_summary(alert_group)}",
-                        "text": self._format_details(alert_group),
-                        "fields": [
-                            {"title": "Alert Count", "value": str(alert_group.get("count", 0)), "short": True},
-                            {
-                                "title": "Priority Score",
-                                "value": str(alert_group.get("priority_score", 0)),
-                                "short": True,
-                            },
-                            {"title": "Owners", "value": ", ".join(owners) if owners else "Unknown", "short": True},
-                            {"title": "First Seen", "value": alert_group.get("first_seen", "Unknown"), "short": True},
-                        ],
-                        "footer": "Fawkes Smart Alerting",
-                        "ts": int(datetime.now(timezone.utc).timestamp()),
-                    }
-                ]
-            }
-
-            # Add context
-            if context.get("runbooks"):
-                message["attachments"][0]["fields"].append(
-                    {
-                        "title": "Runbooks",
-                        "value": "\n".join([f"• {url}" for url in context["runbooks"]]),
-                        "short": False,
-                    }
-                )
-
-            response = await self.http_client.post(self.slack_webhook, json=message, timeout=10.0)
-
-            if response.status_code == 200:
-                logger.info(f"Sent alert group {alert_group['id']} to Slack")
-                return True
-            else:
-                logger.error(f"Failed to send to Slack: {response.status_code}")
-                return False
-
+            response = await self.http_client.post(url, json=message, timeout=NOTIFICATION_TIMEOUT)
+            delivered = response.status_code == expected_status
+            if not delivered:
+                logger.error(f"Failed to send to {channel}: {response.status_code}")
         except Exception as e:
-            logger.error(f"Error sending to Slack: {e}")
-            return False
+            logger.error(f"Error sending to {channel}: {e}")
+            delivered = False
 
-    async def _send_to_mattermost(self, alert_group: dict, owners: list[str], context: dict, severity: str) -> bool:
-        """Send alert to Mattermost."""
-        if not self.mattermost_webhook:
-            return False
+        outcome = "delivered" if delivered else "failed"
+        NOTIFICATION_DURATION.labels(channel=channel, outcome=outcome).observe(time.perf_counter() - start)
+        return delivered
 
-        try:
-            # Format Mattermost message
-            emoji = self._get_severity_emoji(severity)
+    async def _enqueue_retry(self, channel: str, message: dict, group_id: str, attempt: int = 1):
+        """
+        Schedule a failed delivery for retry with exponential backoff.
+
+        ``attempt`` is the number of failed deliveries so far; after
+        NOTIFICATION_MAX_ATTEMPTS the message is moved to the dead-letter list.
+        """
+        from .main import NOTIFICATION_RETRIES, NOTIFICATIONS_DROPPED
+
+        entry = {
+            "id": str(uuid.uuid4()),
+            "channel": channel,
+            "group_id": group_id,
+            "attempt": attempt,
+            "message": message,
+        }
+
+        if self.redis is None:
+            logger.warning(f"Dropping {channel} notification of alert group {group_id}: no retry queue")
+            NOTIFICATIONS_DROPPED.labels(channel=channel).inc()
+            return
+
+        if attempt >= NOTIFICATION_MAX_ATTEMPTS:
+            logger.error(f"Giving up on {channel} notification of alert group {group_id} after {attempt} attempts")
+            NOTIFICATIONS_DROPPED.labels(channel=channel).inc()
+            pipe = self.redis.pipeline()
+            pipe.lpush(DEAD_LETTER_KEY, json.dumps(entry, default=str))
+            pipe.ltrim(DEAD_LETTER_KEY, 0, 999)  # Keep last 1000
+            await pipe.execute()
+            return
+
+        delay = min(NOTIFICATION_RETRY_BASE_DELAY * 2 ** (attempt - 1), NOTIFICATION_RETRY_MAX_DELAY)
+        await self.redis.zadd(RETRY_QUEUE_KEY, {json.dumps(entry, default=str): time.time() + delay})
+        NOTIFICATION_RETRIES.labels(channel=channel).inc()
+
+    async def retry_due_notifications(self, batch_size: int = 100) -> int:
+        """
+        Deliver the queued notifications whose retry time has come.
+
+        Each entry is claimed with ZREM before delivery, so replicas sharing
+        the queue never deliver the same entry twice.
 
-            message_text = f"{emoji} **{severity} Alert: {self._format_summary(alert_group)}**\n\n"
-            message_text += f"{self._format_details(alert_group)}\n\n"
-            message_text += f"**Alert Count:** {alert_group.get('count', 0)}\n"
-            message_text += f"**Priority Score:** {alert_group.get('priority_score', 0)}\n"
-            message_text += f"**Owners:** {', '.join(owners) if owners else 'Unknown'}\n"
-            message_text += f"**First Seen:** {alert_group.get('first_seen', 'Unknown')}\n"
+        Returns:
+            Number of notifications delivered
+        """
+        from .main import NOTIFICATION_RETRY_QUEUE_DEPTH
 
-            # Add runbooks
-            if context.get("runbooks"):
-                message_text += "\n**Runbooks:**\n"
-                for url in context["runbooks"]:
-                    message_text += f"• {url}\n"
+        due = await self.redis.zrangebyscore(RETRY_QUEUE_KEY, "-inf", time.time(), start=0, num=batch_size)
 
-            message = {"text": message_text, "username": "Fawkes Smart Alerting", "icon_emoji": ":bell:"}
+        pipe = self.redis.pipeline(transaction=False)
+        for entry in due:
+            pipe.zrem(RETRY_QUEUE_KEY, entry)
+        pipe.zcard(RETRY_QUEUE_KEY)
+        *removed, depth = await pipe.execute()
+        NOTIFICATION_RETRY_QUEUE_DEPTH.set(depth)
 
-            response = await self.http_client.post(self.mattermost_webhook, json=message, timeout=10.0)
+        claimed = [json.loads(entry) for entry, count in zip(due, removed) if count]
+        results = await asyncio.gather(*(self._deliver(entry["channel"], entry["message"]) for entry in claimed))
 
-            if response.status_code == 200:
-                logger.info(f"Sent alert group {alert_group['id']} to Mattermost")
-                return True
+        for entry, delivered in zip(claimed, results):
+            if delivered:
+                logger.info(f"Sent alert group {entry['group_id']} to {entry['channel']} on retry {entry['attempt']}")
             else:
-                logger.error(f"Failed to send to Mattermost: {response.status_code}")
-                return False
+                await self._enqueue_retry(entry["channel"], entry["message"], entry["group_id"], entry["attempt"] + 1)
 
-        except Exception as e:
-            logger.error(f"Error sending to Mattermost: {e}")
-            return False
+        return sum(results)
+
+    async def process_retries(self, poll_interval: float = NOTIFICATION_RETRY_POLL_INTERVAL):
+        """Retry failed notifications every ``poll_interval`` seconds until cancelled."""
+        if self.redis is None:
+            return
+
+        while True:
+            try:
+                await self.retry_due_notifications()
+            except Exception as e:
+                logger.error(f"Error retrying notifications: {e}")
+
+            await asyncio.sleep(poll_interval)
 
     def _format_summary(self, alert_group: dict) -> str:
         """Format alert group summary."""
@@ -13,8 +13,9 @@ import asyncio
 import logging
 import os
 import re
-from datetime import datetime, timedelta
-from pathlib import Path, timezone
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 import redis.asyncio as redis
@@ -27,6 +28,114 @@ logger = logging.getLogger(__name__)
 FLAPPING_THRESHOLD = int(os.getenv("FLAPPING_THRESHOLD", "3"))
 FLAPPING_WINDOW = int(os.getenv("FLAPPING_WINDOW", "600"))  # 10 minutes
 
+# Record an occurrence of a group and count its occurrences in each flapping rule's window.
+# KEYS[1]: occurrences sorted set
+# ARGV[1]: now (epoch seconds), ARGV[2]: unique occurrence member, ARGV[3]: longest window,
+# ARGV[4..]: window of each rule
+# Returns the count of each window, in ARGV order.
+FLAPPING_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1] - ARGV[3])
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3] * 2)
+
+local counts = {}
+for i = 4, #ARGV do
+    counts[#counts + 1] = redis.call('ZCOUNT', KEYS[1], '(' .. (ARGV[1] - ARGV[i]), '+inf')
+end
+return counts
+"""
+
+# Rule types whose ``services`` restrict the alerts they suppress
+SERVICE_SCOPED_TYPES = ("maintenance_window", "known_issue")
+
+# Bound on memoized (service, alertname) candidate lists; cleared when reached
+CANDIDATE_CACHE_SIZE = 10000
+
+
+class CompiledRule:
+    """A suppression rule prepared once for repeated evaluation."""
+
+    def __init__(self, rule: dict, position: int):
+        """
+        Compile a rule.
+
+        Args:
+            rule: Rule definition as loaded or submitted
+            position: Index of the rule in the engine, which decides precedence
+
+        Raises:
+            ValueError: If the rule's pattern, schedule or expiry is invalid
+        """
+        self.rule = rule
+        self.position = position
+        self.name = rule.get("name")
+        self.type = rule.get("type")
+        self.services = frozenset(rule.get("services") or ())
+
+        pattern = rule.get("alert_pattern")
+        try:
+            self.pattern = re.compile(pattern) if pattern else None
+        except re.error as e:
+            raise ValueError(f"invalid alert_pattern {pattern!r}: {e}") from e
+
+        self.expires_at = _parse_datetime(rule.get("expires_at"))
+
+        self.schedule = rule.get("schedule")
+        if self.schedule and not croniter.is_valid(self.schedule):
+            raise ValueError(f"invalid schedule {self.schedule!r}")
+        self.duration = timedelta(seconds=rule.get("duration", 3600))  # Default 1 hour
+        self._window_end: datetime | None = None
+        self._next_start: datetime | None = None
+
+        # Cascade names are matched exactly
+        self.root_cause_alert = rule.get("root_cause_alert")
+        self.dependent_alerts = frozenset(rule.get("dependent_alerts") or ())
+
+        self.suppress_hours = frozenset(rule.get("suppress_hours") or ())
+        self.suppress_days = frozenset(day.lower() for day in rule.get("suppress_days") or ())
+
+    def matches_alertname(self, alertname: str) -> bool:
+        """Check whether the rule can apply to alerts named ``alertname``."""
+        if self.type == "known_issue":
+            return self.pattern is not None and self.pattern.match(alertname) is not None
+        if self.type == "flapping":
+            return self.pattern is None or self.pattern.match(alertname) is not None
+        if self.type == "cascade":
+            return bool(self.root_cause_alert and self.dependent_alerts) and (
+                alertname == self.root_cause_alert or alertname in self.dependent_alerts
+            )
+        if self.type == "maintenance_window":
+            return bool(self.schedule)
+        return self.type == "time_based"
+
+    def in_maintenance_window(self, now: datetime) -> bool:
+        """
+        Check whether ``now`` falls within the rule's maintenance window.
+
+        The window boundaries are computed from the cron schedule only when
+        the next window starts, not on every check.
+        """
+        if self._next_start is None or now >= self._next_start:
+            # get_prev excludes ``now`` itself, so a check right on a start would see the previous window
+            after = now + timedelta(microseconds=1)
+            last_start = croniter(self.schedule, after).get_prev(datetime)
+            self._window_end = last_start + self.duration
+            self._next_start = croniter(self.schedule, after).get_next(datetime)
+
+        return now < self._window_end
+
+
+def _parse_datetime(value) -> datetime | None:
+    """Parse an ISO-8601 timestamp or pass a datetime through."""
+    if not value:
+        return None
+    try:
+        parsed = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    except ValueError as e:
+        raise ValueError(f"invalid expires_at {value!r}: {e}") from e
+    # Timestamps without an offset are taken as UTC
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
 
 class SuppressionEngine:
     """Engine for applying suppression rules to alerts."""
@@ -37,6 +146,65 @@ class SuppressionEngine:
         self.rules: list[dict] = []
         self.flapping_threshold = FLAPPING_THRESHOLD
         self.flapping_window = timedelta(seconds=FLAPPING_WINDOW)
+        self._flapping_script = redis_client.register_script(FLAPPING_SCRIPT)
+
+        # Compiled form of ``rules``, rebuilt whenever rules change
+        self._rules_by_service: dict[str, list[CompiledRule]] = {}
+        self._unscoped_rules: list[CompiledRule] = []
+        self._candidate_cache: dict[tuple[str | None, str], list[CompiledRule]] = {}
+
+    def _compile_rules(self):
+        """Compile enabled rules and index them by the services they are scoped to."""
+        self._rules_by_service = {}
+        self._unscoped_rules = []
+        self._candidate_cache = {}
+
+        for position, rule in enumerate(self.rules):
+            if not rule.get("enabled", True):
+                continue
+
+            try:
+                compiled = CompiledRule(rule, position)
+            except ValueError as e:
+                logger.error(f"Skipping rule {rule.get('name')}: {e}")
+                continue
+
+            if compiled.type in SERVICE_SCOPED_TYPES and compiled.services:
+                for service in compiled.services:
+                    self._rules_by_service.setdefault(service, []).append(compiled)
+            else:
+                self._unscoped_rules.append(compiled)
+
+    def _candidate_rules(self, service: str | None, alertname: str) -> list[CompiledRule]:
+        """Return the rules that can apply to alerts of ``service`` named ``alertname``, in precedence order."""
+        key = (service, alertname)
+        candidates = self._candidate_cache.get(key)
+
+        if candidates is None:
+            scoped = self._rules_by_service.get(service, [])
+            candidates = sorted(
+                (rule for rule in scoped + self._unscoped_rules if rule.matches_alertname(alertname)),
+                key=lambda rule: rule.position,
+            )
+            if len(self._candidate_cache) >= CANDIDATE_CACHE_SIZE:
+                self._candidate_cache.clear()
+            self._candidate_cache[key] = candidates
+
+        return candidates
+
+    def _group_candidate_rules(self, alert_group: dict) -> list[CompiledRule]:
+        """Return the rules that can apply to any alert of the group, in precedence order."""
+        keys = {
+            (alert.get("labels", {}).get("service"), alert.get("labels", {}).get("alertname", ""))
+            for alert in alert_group.get("alerts", [])
+        }
+
+        # Alerts of a group normally share service and alertname
+        if len(keys) == 1:
+            return self._candidate_rules(*keys.pop())
+
+        candidates = {rule.position: rule for key in keys for rule in self._candidate_rules(*key)}
+        return [candidates[position] for position in sorted(candidates)]
 
     async def load_rules_from_directory(self, rules_dir: str):
         """Load suppression rules from YAML files in directory."""
@@ -67,6 +235,8 @@ class SuppressionEngine:
             except Exception as e:
                 logger.error(f"Failed to load rule from {rule_file}: {e}")
 
+        self._compile_rules()
+
     async def _create_example_rules(self, rules_path: Path):
         """Create example suppression rules."""
         example_rules = [
@@ -103,93 +273,74 @@ class SuppressionEngine:
         """
         Check if alert group should be suppressed.
 
+        Only the rules indexed for the group's services and alertnames are
+        evaluated; the first one that matches wins. Flapping rules are
+        evaluated once no other rule matched, so occurrences are only
+        recorded for groups that would otherwise notify.
+
         Returns:
             (should_suppress: bool, reason: str)
         """
-        # Check each rule type
-        for rule in self.rules:
-            if not rule.get("enabled", True):
-                continue
+        now = datetime.now(timezone.utc)
 
-            rule_type = rule.get("type")
+        flapping_rules = []
 
-            if rule_type == "maintenance_window":
-                if await self._check_maintenance_window(alert_group, rule):
-                    return True, f"maintenance_window: {rule['name']}"
+        for rule in self._group_candidate_rules(alert_group):
+            if rule.type == "maintenance_window":
+                if await self._check_maintenance_window(alert_group, rule, now):
+                    return True, f"maintenance_window: {rule.name}"
 
-            elif rule_type == "known_issue":
-                if await self._check_known_issue(alert_group, rule):
-                    return True, f"known_issue: {rule['name']}"
+            elif rule.type == "known_issue":
+                if await self._check_known_issue(alert_group, rule, now):
+                    return True, f"known_issue: {rule.name}"
 
-            elif rule_type == "flapping":
-                if await self._check_flapping(alert_group, rule):
-                    return True, f"flapping: {rule['name']}"
+            elif rule.type == "flapping":
+                flapping_rules.append(rule)
 
-            elif rule_type == "cascade":
+            elif rule.type == "cascade":
                 if await self._check_cascade(alert_group, rule):
-                    return True, f"cascade: {rule['name']}"
+                    return True, f"cascade: {rule.name}"
+
+            elif rule.type == "time_based":
+                if await self._check_time_based(alert_group, rule, now):
+                    return True, f"time_based: {rule.name}"
 
-            elif rule_type == "time_based":
-                if await self._check_time_based(alert_group, rule):
-                    return True, f"time_based: {rule['name']}"
+        if flapping_rules:
+            rule = await self._check_flapping(alert_group, flapping_rules, now)
+            if rule:
+                return True, f"flapping: {rule.name}"
 
         return False, None
 
-    async def _check_maintenance_window(self, alert_group: dict, rule: dict) -> bool:
+    async def _check_maintenance_window(self, alert_group: dict, rule: CompiledRule, now: datetime) -> bool:
         """Check if alert falls within maintenance window."""
-        schedule = rule.get("schedule")
-        duration = rule.get("duration", 3600)  # Default 1 hour
-
-        if not schedule:
+        if not rule.in_maintenance_window(now):
             return False
 
-        # Check if we're in a maintenance window
-        try:
-            cron = croniter(schedule, datetime.now(timezone.utc))
-            last_run = cron.get_prev(datetime)
-
-            window_end = last_run + timedelta(seconds=duration)
+        # Check if alert matches services
+        suppress_severity = rule.rule.get("suppress_severity") or ()
 
-            if datetime.now(timezone.utc) < window_end:
-                # Check if alert matches services
-                services = rule.get("services", [])
-                suppress_severity = rule.get("suppress_severity", [])
-
-                for alert in alert_group.get("alerts", []):
-                    labels = alert.get("labels", {})
-                    service = labels.get("service")
-                    severity = labels.get("severity", "medium")
+        for alert in alert_group.get("alerts", []):
+            labels = alert.get("labels", {})
+            service = labels.get("service")
+            severity = labels.get("severity", "medium")
 
-                    if services and service not in services:
-                        continue
+            if rule.services and service not in rule.services:
+                continue
 
-                    if suppress_severity and severity not in suppress_severity:
-                        continue
+            if suppress_severity and severity not in suppress_severity:
+                continue
 
-                    # If we get here, alert matches maintenance window
-                    return True
-        except Exception as e:
-            logger.error(f"Error checking maintenance window: {e}")
+            # If we get here, alert matches maintenance window
+            return True
 
         return False
 
-    async def _check_known_issue(self, alert_group: dict, rule: dict) -> bool:
+    async def _check_known_issue(self, alert_group: dict, rule: CompiledRule, now: datetime) -> bool:
         """Check if alert matches a known issue."""
-        alert_pattern = rule.get("alert_pattern")
-        services = rule.get("services", [])
-        expires_at = rule.get("expires_at")
-
         # Check if rule has expired
-        if expires_at:
-            try:
-                expiry = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
-                # Compare with timezone-aware now
-                from datetime import timezone
-
-                if datetime.now(timezone.utc) > expiry:
-                    return False
-            except Exception as e:
-                logger.error(f"Error parsing expires_at: {e}")
+        if rule.expires_at and now > rule.expires_at:
+            return False
 
         # Check if any alert matches pattern
         for alert in alert_group.get("alerts", []):
@@ -197,66 +348,39 @@ class SuppressionEngine:
             alertname = labels.get("alertname", "")
             service = labels.get("service")
 
-            # Check pattern match
-            if alert_pattern:
-                try:
-                    if re.match(alert_pattern, alertname):
-                        # Check service if specified
-                        if not services or service in services:
-                            return True
-                except Exception as e:
-                    logger.error(f"Error matching pattern: {e}")
+            # Check pattern match and service if specified
+            if rule.pattern.match(alertname) and (not rule.services or service in rule.services):
+                return True
 
         return False
 
-    async def _check_flapping(self, alert_group: dict, rule: dict) -> bool:
-        """Check if alert is flapping (firing repeatedly)."""
-        threshold = rule.get("threshold", self.flapping_threshold)
-        window = rule.get("window", FLAPPING_WINDOW)
-        alert_pattern = rule.get("alert_pattern")
-
-        grouping_key = alert_group.get("grouping_key")
-
-        # Track alert occurrences
-        occurrences_key = f"flapping:{grouping_key}"
-
-        # Get recent occurrences
-        now = datetime.now(timezone.utc).timestamp()
-        window_start = now - window
-
-        # Remove old occurrences
-        await self.redis.zremrangebyscore(occurrences_key, 0, window_start)
+    async def _check_flapping(self, alert_group: dict, rules: list[CompiledRule], now: datetime) -> CompiledRule | None:
+        """
+        Record an occurrence of the group and find the first rule it is flapping under.
 
-        # Add current occurrence
-        await self.redis.zadd(occurrences_key, {str(now): now})
-        await self.redis.expire(occurrences_key, window * 2)
+        The occurrence is recorded and counted in each rule's window with a
+        single call to FLAPPING_SCRIPT, however many rules there are.
+        """
+        windows = [rule.rule.get("window", FLAPPING_WINDOW) for rule in rules]
+        occurrences_key = f"flapping:{alert_group.get('grouping_key')}"
+        timestamp = now.timestamp()
 
-        # Check if flapping
-        count = await self.redis.zcard(occurrences_key)
+        counts = await self._flapping_script(
+            keys=[occurrences_key], args=[timestamp, f"{timestamp}:{uuid.uuid4().hex}", max(windows), *windows]
+        )
 
-        if count >= threshold:
-            # Check if pattern matches if specified
-            if alert_pattern:
-                for alert in alert_group.get("alerts", []):
-                    alertname = alert.get("labels", {}).get("alertname", "")
-                    try:
-                        if re.match(alert_pattern, alertname):
-                            return True
-                    except Exception:
-                        logger.warning("Silent exception caught")
-            else:
-                return True
+        # Candidate selection already matched the pattern against the group's alertnames
+        for rule, count in zip(rules, counts):
+            if count >= rule.rule.get("threshold", self.flapping_threshold):
+                return rule
 
-        return False
+        return None
 
-    async def _check_cascade(self, alert_group: dict, rule: dict) -> bool:
+    async def _check_cascade(self, alert_group: dict, rule: CompiledRule) -> bool:
         """Check if alert is a cascade of a root cause alert."""
-        root_cause_alert = rule.get("root_cause_alert")
-        dependent_alerts = rule.get("dependent_alerts", [])
-        suppress_duration = rule.get("suppress_duration", 1800)  # 30 min default
-
-        if not root_cause_alert or not dependent_alerts:
-            return False
+        root_cause_alert = rule.root_cause_alert
+        dependent_alerts = rule.dependent_alerts
+        suppress_duration = rule.rule.get("suppress_duration", 1800)  # 30 min default
 
         # Check if root cause alert is active
         root_cause_key = f"cascade:root_cause:{root_cause_alert}"
@@ -281,14 +405,12 @@ class SuppressionEngine:
 
         return False
 
-    async def _check_time_based(self, alert_group: dict, rule: dict) -> bool:
+    async def _check_time_based(self, alert_group: dict, rule: CompiledRule, now: datetime) -> bool:
         """Check if alert should be suppressed based on time of day."""
         # Simple implementation: suppress non-critical alerts during off-hours
-        suppress_hours = rule.get("suppress_hours", [])  # e.g., [0, 1, 2, 3, 4, 5, 6]
-        suppress_days = rule.get("suppress_days", [])  # e.g., ["saturday", "sunday"]
-        suppress_severity = rule.get("suppress_severity", ["low", "info"])
-
-        now = datetime.now(timezone.utc)
+        suppress_hours = rule.suppress_hours  # e.g., [0, 1, 2, 3, 4, 5, 6]
+        suppress_days = rule.suppress_days  # e.g., ["saturday", "sunday"]
+        suppress_severity = rule.rule.get("suppress_severity", ["low", "info"])
 
         # Check hour
         if suppress_hours and now.hour in suppress_hours:
@@ -301,7 +423,7 @@ class SuppressionEngine:
         # Check day
         if suppress_days:
             day_name = now.strftime("%A").lower()
-            if day_name in [d.lower() for d in suppress_days]:
+            if day_name in suppress_days:
                 for alert in alert_group.get("alerts", []):
                     severity = alert.get("labels", {}).get("severity", "medium")
                     if severity in suppress_severity:
@@ -312,6 +434,7 @@ class SuppressionEngine:
     async def add_rule(self, rule: dict):
         """Add a new suppression rule."""
         self.rules.append(rule)
+        self._compile_rules()
         logger.info(f"Added rule: {rule.get('name')}")
 
     async def update_rule(self, rule: dict):
@@ -321,6 +444,7 @@ class SuppressionEngine:
         for i, existing_rule in enumerate(self.rules):
             if existing_rule.get("id") == rule_id:
                 self.rules[i] = rule
+                self._compile_rules()
                 logger.info(f"Updated rule: {rule.get('name')}")
                 return
 
@@ -330,4 +454,5 @@ class SuppressionEngine:
     async def delete_rule(self, rule_id: str):
         """Delete suppression rule."""
         self.rules = [r for r in self.rules if r.get("id") != rule_id]
+        self._compile_rules()
         logger.info(f"Deleted rule: {rule_id}")
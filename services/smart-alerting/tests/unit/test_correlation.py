@@ -1,33 +1,31 @@
 """Unit tests for alert correlation engine."""
 
+import asyncio
+import json
 from datetime import datetime, timezone
-from unittest.mock import AsyncMock
+from unittest.mock import patch
 
+import fakeredis
 import pytest
+from app import correlation
 from app.correlation import AlertCorrelator
 
 
 @pytest.fixture
-def redis_mock():
-    """Mock Redis client."""
-    mock = AsyncMock()
-    mock.get = AsyncMock(return_value=None)
-    mock.setex = AsyncMock()
-    mock.lpush = AsyncMock()
-    mock.ltrim = AsyncMock()
-    mock.lrange = AsyncMock(return_value=[])
-    return mock
+def redis_client():
+    """In-memory Redis client; runs the correlator's Lua scripts."""
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
 
 
 @pytest.fixture
-def correlator(redis_mock):
+def correlator(redis_client):
     """Create correlator instance."""
-    return AlertCorrelator(redis_mock)
+    return AlertCorrelator(redis_client)
 
 
 @pytest.mark.unit
 @pytest.mark.asyncio
-async def test_correlate_alerts_groups_by_service(correlator, redis_mock):
+async def test_correlate_alerts_groups_by_service(correlator):
     """Test that alerts are grouped by service and alertname."""
     alerts = [
         {
@@ -57,7 +55,7 @@ async def test_correlate_alerts_groups_by_service(correlator, redis_mock):
 
 @pytest.mark.unit
 @pytest.mark.asyncio
-async def test_correlate_alerts_separate_groups_different_services(correlator, redis_mock):
+async def test_correlate_alerts_separate_groups_different_services(correlator):
     """Test that alerts for different services create separate groups."""
     alerts = [
         {
@@ -81,6 +79,186 @@ async def test_correlate_alerts_separate_groups_different_services(correlator, r
     assert len(groups) == 2
 
 
+def _flood(count: int, services: int = 3) -> list[dict]:
+    """Alerts spread over a few services, each fingerprint sent twice."""
+    return [
+        {
+            "id": str(i),
+            "fingerprint": f"fp{i % (count // 2)}",
+            "labels": {"alertname": "HighErrorRate", "service": f"service-{i % services}", "severity": "critical"},
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_correlate_alerts_merges_into_existing_group(correlator):
+    """Test that later batches append unseen fingerprints to the stored group."""
+    alert = {"labels": {"alertname": "HighErrorRate", "service": "api-gateway", "severity": "critical"}}
+
+    first = await correlator.correlate_alerts([{**alert, "fingerprint": "fp1"}])
+    second = await correlator.correlate_alerts([{**alert, "fingerprint": "fp1"}, {**alert, "fingerprint": "fp2"}])
+
+    assert second[0]["id"] == first[0]["id"]
+    assert second[0]["first_seen"] == first[0]["first_seen"]
+    assert second[0]["count"] == 2
+    assert [a["fingerprint"] for a in second[0]["alerts"]] == ["fp1", "fp2"]
+    assert second[0]["priority_score"] > first[0]["priority_score"]
+    assert second[0].pop("batch_count") == 2
+    assert await correlator.get_group(first[0]["id"]) == second[0]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_correlate_alerts_grouping_is_independent_of_concurrency(redis_client):
+    """Test that a flood gives the same groups whether batches run one by one or concurrently."""
+    alerts = _flood(60)
+    batches = [alerts[i : i + 5] for i in range(0, len(alerts), 5)]
+
+    sequential = AlertCorrelator(fakeredis.FakeAsyncRedis(decode_responses=True))
+    for batch in batches:
+        await sequential.correlate_alerts(batch)
+
+    # Separate correlators stand in for replicas sharing one Redis
+    replicas = [AlertCorrelator(redis_client) for _ in batches]
+    await asyncio.gather(*(replica.correlate_alerts(batch) for replica, batch in zip(replicas, batches)))
+
+    def summary(groups):
+        return {g["grouping_key"]: (g["count"], sorted(a["fingerprint"] for a in g["alerts"])) for g in groups}
+
+    expected = summary(await sequential.get_recent_groups())
+    assert len(expected) == 3
+    assert sum(count for count, _ in expected.values()) == 30
+    assert summary(await replicas[0].get_recent_groups()) == expected
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_correlate_alerts_restarts_group_after_time_window(correlator, redis_client):
+    """Test that a group idle for longer than the window is replaced by a new one."""
+    alert = {"fingerprint": "fp1", "labels": {"alertname": "HighErrorRate", "service": "api-gateway"}}
+    first = await correlator.correlate_alerts([alert])
+
+    stale = (datetime.now(timezone.utc) - correlator.time_window).isoformat()
+    await redis_client.hset(f"alert_group:{first[0]['id']}", "last_seen", stale)
+
+    second = await correlator.correlate_alerts([{**alert, "fingerprint": "fp2"}])
+
+    assert second[0]["count"] == 1
+    assert second[0]["first_seen"] > first[0]["first_seen"]
+    assert await redis_client.lrange("alert_groups:recent", 0, -1) == [first[0]["id"]] * 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_correlate_alerts_reloads_flushed_script(correlator, redis_client):
+    """Test that the upsert script is loaded again after Redis drops its script cache."""
+    alert = {"labels": {"alertname": "HighErrorRate", "service": "api-gateway"}}
+    await correlator.correlate_alerts([alert])
+    await redis_client.script_flush()
+
+    groups = await correlator.correlate_alerts([alert])
+
+    assert groups[0]["count"] == 1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_correlate_alerts_upserts_batch_in_two_round_trips(correlator, redis_client):
+    """Test that a batch of groups costs one pipeline of upserts and one of alert reads."""
+    await correlator.correlate_alerts(_flood(4))
+    with (
+        patch.object(redis_client, "pipeline", wraps=redis_client.pipeline) as pipeline,
+        patch.object(redis_client, "execute_command", wraps=redis_client.execute_command) as execute_command,
+    ):
+        groups = await correlator.correlate_alerts(_flood(10, services=5))
+
+    assert len(groups) == 5
+    assert pipeline.call_count == 2
+    execute_command.assert_not_called()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_get_recent_groups_reads_in_constant_round_trips(correlator, redis_client):
+    """Test that listing groups costs one LRANGE and two pipelines whatever the limit."""
+    groups = await correlator.correlate_alerts(_flood(6))
+    await redis_client.delete(f"alert_group:{groups[1]['id']}")
+    with (
+        patch.object(redis_client, "pipeline", wraps=redis_client.pipeline) as pipeline,
+        patch.object(redis_client, "execute_command", wraps=redis_client.execute_command) as execute_command,
+    ):
+        recent = await correlator.get_recent_groups(limit=3)
+
+    assert {group["id"] for group in recent} == {groups[0]["id"], groups[2]["id"]}
+    assert all("priority_score" in group for group in recent)
+    assert pipeline.call_count == 2
+    assert execute_command.call_count == 1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_repeated_alert_is_stored_once(correlator, redis_client):
+    """Test that re-sending an alert refreshes its hash and counts an occurrence without growing the group."""
+    alert = {"fingerprint": "fp1", "labels": {"alertname": "HighErrorRate", "service": "api-gateway"}}
+
+    for status in ("firing", "firing", "resolved"):
+        [group] = await correlator.correlate_alerts([{**alert, "status": status}])
+
+    assert group["count"] == 1
+    assert group["occurrences"] == 3
+    assert group["batch_count"] == 1
+    assert [a["status"] for a in group["alerts"]] == ["resolved"]
+    assert await redis_client.zcard(f"alert_group:{group['id']}:alerts") == 1
+    assert json.loads(await redis_client.hget("alert:fp1", "alert"))["status"] == "resolved"
+    assert 0 < await redis_client.ttl("alert:fp1") <= correlator.time_window.total_seconds() * 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_redelivered_entry_is_not_counted_again(correlator):
+    """Test that upserting the alerts of the same ingest entry again adds no occurrences."""
+    alerts = [{"fingerprint": f"fp{i}", "labels": {"alertname": "HighErrorRate", "service": "api"}} for i in range(2)]
+
+    await correlator.correlate_alerts(alerts, "1-0")
+    [replayed] = await correlator.correlate_alerts(alerts, "1-0")
+    [group] = await correlator.correlate_alerts(alerts, "2-0")
+
+    assert replayed["occurrences"] == 2
+    assert group["occurrences"] == 4
+    assert group["count"] == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_group_keeps_newest_fingerprints_up_to_cap(correlator, redis_client, monkeypatch):
+    """Test that a long-running group keeps counting alerts but only holds the newest fingerprints."""
+    monkeypatch.setattr(correlation, "GROUP_MAX_ALERTS", 3)
+    labels = {"alertname": "NetworkFlapping", "service": "api-gateway"}
+
+    for i in range(10):
+        [group] = await correlator.correlate_alerts([{"fingerprint": f"fp{i}", "labels": {**labels, "pod": str(i)}}])
+
+    assert group["count"] == 10
+    assert [a["fingerprint"] for a in group["alerts"]] == ["fp7", "fp8", "fp9"]
+    assert await redis_client.zrange(f"alert_group:{group['id']}:alerts", 0, -1) == ["fp7", "fp8", "fp9"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_group_stored_as_json_is_replaced(correlator, redis_client):
+    """Test that a group left as a JSON string by an earlier version is started afresh."""
+    alert = {"fingerprint": "fp1", "labels": {"alertname": "HighErrorRate", "service": "api-gateway"}}
+    group_id = correlator._generate_group_id(correlator._generate_grouping_key(alert))
+    await redis_client.set(f"alert_group:{group_id}", json.dumps({"id": group_id, "alerts": []}))
+
+    [group] = await correlator.correlate_alerts([alert])
+
+    assert group["id"] == group_id
+    assert group["count"] == 1
+
+
 @pytest.mark.unit
 def test_calculate_priority_critical_severity(correlator):
     """Test priority calculation for critical alerts."""
@@ -108,20 +286,6 @@ def test_calculate_priority_increases_with_count(correlator):
     assert priority_multiple > priority_single
 
 
-@pytest.mark.unit
-def test_deduplicate_alerts(correlator):
-    """Test alert deduplication."""
-    alerts = [
-        {"fingerprint": "abc123", "labels": {"alertname": "Test"}},
-        {"fingerprint": "abc123", "labels": {"alertname": "Test"}},
-        {"fingerprint": "def456", "labels": {"alertname": "Test2"}},
-    ]
-
-    deduplicated = correlator._deduplicate_alerts(alerts)
-
-    assert len(deduplicated) == 2
-
-
 @pytest.mark.unit
 def test_generate_grouping_key(correlator):
     """Test grouping key generation."""
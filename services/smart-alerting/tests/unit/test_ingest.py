@@ -0,0 +1,199 @@
+"""Unit tests for the alert ingest queue."""
+
+import asyncio
+import copy
+from unittest.mock import AsyncMock
+
+import fakeredis
+import pytest
+from app import ingest, main
+from app.ingest import INGEST_GROUP, INGEST_STREAM, IngestQueue
+
+
+class Recorder:
+    """Ingest handler that records payloads, optionally marks progress, and fails on demand."""
+
+    def __init__(self, failures: int = 0, redis_client=None):
+        self.failures = failures
+        self.redis = redis_client
+        self.calls: list[tuple[list[dict], str]] = []
+
+    async def __call__(self, alerts: list[dict], source: str, entry_id: str):
+        self.calls.append((alerts, source))
+        if self.redis:
+            await self.redis.hset(ingest.progress_key(entry_id), "group-1", "routed")
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("processing failed")
+
+
+@pytest.fixture
+def redis_client():
+    """In-memory Redis client."""
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+async def _queue(redis_client, handler) -> IngestQueue:
+    queue = IngestQueue(redis_client, handler)
+    await queue.setup()
+    await queue.setup()  # Idempotent
+    return queue
+
+
+async def _consume_once(redis_client, queue: IngestQueue, consumer: str):
+    response = await redis_client.xreadgroup(INGEST_GROUP, consumer, {INGEST_STREAM: ">"}, count=10)
+    for _, entries in response:
+        await queue._process(entries)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_processed_entries_are_acknowledged_and_removed(redis_client):
+    """Test that a processed payload leaves neither a pending entry, a backlog nor its progress."""
+    handler = Recorder(redis_client=redis_client)
+    queue = await _queue(redis_client, handler)
+    alert = {"labels": {"alertname": "HighErrorRate"}}
+
+    assert await queue.enqueue([alert], "prometheus")
+    await _consume_once(redis_client, queue, "worker-1")
+
+    assert handler.calls == [([alert], "prometheus")]
+    assert await redis_client.xlen(INGEST_STREAM) == 0
+    assert await redis_client.keys("alerts:ingest:progress:*") == []
+    assert (await redis_client.xpending(INGEST_STREAM, INGEST_GROUP))["pending"] == 0
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_failed_entry_is_reclaimed_by_another_consumer(redis_client, monkeypatch):
+    """Test that a payload left pending by a failing consumer is processed by another once idle."""
+    monkeypatch.setattr(ingest, "INGEST_CLAIM_IDLE_MS", 10)
+    handler = Recorder(failures=1)
+    queue = await _queue(redis_client, handler)
+
+    await queue.enqueue([{"labels": {"alertname": "A"}}], "grafana")
+    await _consume_once(redis_client, queue, "worker-1")
+    assert (await redis_client.xpending(INGEST_STREAM, INGEST_GROUP))["pending"] == 1
+
+    await asyncio.sleep(0.02)
+    assert await queue.reclaim("worker-2") == 1
+
+    assert len(handler.calls) == 2
+    assert await redis_client.xlen(INGEST_STREAM) == 0
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_entry_dropped_after_max_deliveries(redis_client, monkeypatch):
+    """Test that a payload failing on every delivery is eventually dropped."""
+    monkeypatch.setattr(ingest, "INGEST_CLAIM_IDLE_MS", 10)
+    monkeypatch.setattr(ingest, "INGEST_MAX_DELIVERIES", 3)
+    handler = Recorder(failures=100)
+    queue = await _queue(redis_client, handler)
+
+    await queue.enqueue([{"labels": {"alertname": "A"}}], "generic")
+    await _consume_once(redis_client, queue, "worker-1")
+    reclaimed = []
+    for _ in range(3):
+        await asyncio.sleep(0.02)
+        reclaimed.append(await queue.reclaim("worker-1"))
+
+    assert reclaimed == [1, 1, 0]
+
+    assert len(handler.calls) == 3
+    assert await redis_client.xlen(INGEST_STREAM) == 0
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_enqueue_refused_when_backlog_full(redis_client, monkeypatch):
+    """Test that ingestion pushes back once the backlog limit is reached."""
+    monkeypatch.setattr(ingest, "INGEST_MAX_BACKLOG", 2)
+    queue = await _queue(redis_client, Recorder())
+
+    results = [await queue.enqueue([{"labels": {}}], "prometheus") for _ in range(3)]
+
+    assert results == [True, True, False]
+    assert await redis_client.xlen(INGEST_STREAM) == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_consumer_pool_processes_burst(redis_client, monkeypatch):
+    """Test that several consumers share a burst and process each payload once."""
+    monkeypatch.setattr(ingest, "INGEST_BLOCK_MS", 10)
+    handler = Recorder()
+    queue = await _queue(redis_client, handler)
+    for i in range(200):
+        await queue.enqueue([{"labels": {"alertname": f"A{i}"}}], "prometheus")
+
+    consumers = [asyncio.create_task(queue.run_consumer(f"worker-{i}")) for i in range(4)]
+    for _ in range(100):
+        if await redis_client.xlen(INGEST_STREAM) == 0:
+            break
+        await asyncio.sleep(0.01)
+    queue.stop()
+    await asyncio.wait_for(asyncio.gather(*consumers), timeout=5)
+
+    assert sorted(alerts[0]["labels"]["alertname"] for alerts, _ in handler.calls) == sorted(
+        f"A{i}" for i in range(200)
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_process_alerts_updates_dict_groups(monkeypatch):
+    """Test that processing marks suppressed and routed groups."""
+    groups = [
+        {"id": "g1", "alerts": [{"labels": {}}], "grouping_key": "a", "batch_count": 1},
+        {"id": "g2", "alerts": [{"labels": {}}, {"labels": {}}], "grouping_key": "b", "batch_count": 2},
+    ]
+    suppression_engine = AsyncMock()
+    suppression_engine.should_suppress.side_effect = [(True, "known_issue: db"), (False, None)]
+    router = AsyncMock()
+    router.route_alert_group.return_value = ["slack"]
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    monkeypatch.setattr(main, "correlator", AsyncMock(correlate_alerts=AsyncMock(return_value=groups)))
+    monkeypatch.setattr(main, "suppression_engine", suppression_engine)
+    monkeypatch.setattr(main, "router", router)
+    monkeypatch.setattr(main, "redis_client", redis_client)
+
+    await main.process_alerts([{"labels": {}}] * 3, "prometheus")
+
+    assert groups[0]["suppressed"] and groups[0]["suppression_reason"] == "known_issue: db"
+    assert groups[1]["routed_to"] == ["slack"]
+    assert await redis_client.get("stats:total_suppressed") == "1"
+    assert await redis_client.get("stats:total_routed") == "2"
+    assert await redis_client.get("stats:total_received") == "3"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_process_alerts_retry_skips_groups_already_handled(monkeypatch):
+    """Test that a redelivered entry neither notifies nor counts the groups its failed delivery handled."""
+    groups = [
+        {"id": "g1", "alerts": [{"labels": {}}], "grouping_key": "a", "batch_count": 1},
+        {"id": "g2", "alerts": [{"labels": {}}], "grouping_key": "b", "batch_count": 1},
+    ]
+    correlator = AsyncMock()
+    correlator.correlate_alerts.side_effect = lambda alerts, entry_id: copy.deepcopy(groups)
+    suppression_engine = AsyncMock()
+    suppression_engine.should_suppress.return_value = (False, None)
+    router = AsyncMock()
+    router.route_alert_group.side_effect = [["slack"], RuntimeError("slack down"), ["slack"]]
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    monkeypatch.setattr(main, "correlator", correlator)
+    monkeypatch.setattr(main, "suppression_engine", suppression_engine)
+    monkeypatch.setattr(main, "router", router)
+    monkeypatch.setattr(main, "redis_client", redis_client)
+
+    with pytest.raises(RuntimeError):
+        await main.process_alerts([{"labels": {}}] * 2, "prometheus", "1-0")
+    await main.process_alerts([{"labels": {}}] * 2, "prometheus", "1-0")
+
+    assert [call.args[0]["id"] for call in router.route_alert_group.await_args_list] == ["g1", "g2", "g2"]
+    assert correlator.correlate_alerts.await_args.args[1] == "1-0"
+    assert await redis_client.get("stats:total_routed") == "2"
+    assert await redis_client.get("stats:total_received") == "2"
@@ -0,0 +1,247 @@
+"""Unit tests for alert routing."""
+
+import asyncio
+import json
+import time
+
+import fakeredis
+import httpx
+import pytest
+from app import main, routing  # main defines the routing metrics
+from app.routing import AlertRouter
+
+BACKSTAGE_URL = "http://backstage.test"
+
+
+class FakeBackstage:
+    """Backstage catalog stand-in that records requests."""
+
+    def __init__(self, owners: dict[str, str], delay: float = 0.0):
+        self.owners = owners
+        self.delay = delay
+        self.requests: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.url.path)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+
+        if request.url.path == "/api/catalog/entities":
+            return httpx.Response(
+                200,
+                json=[{"metadata": {"name": name}, "spec": {"owner": owner}} for name, owner in self.owners.items()],
+            )
+
+        service = request.url.path.rsplit("/", 1)[-1]
+        if service not in self.owners:
+            return httpx.Response(404)
+        return httpx.Response(200, json={"spec": {"owner": self.owners[service]}})
+
+
+def _router(backstage: FakeBackstage) -> AlertRouter:
+    return AlertRouter(
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(backstage)), backstage_url=BACKSTAGE_URL
+    )
+
+
+def _group(*services: str) -> dict:
+    return {"alerts": [{"labels": {"alertname": "HighErrorRate", "service": service}} for service in services]}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_owners_are_cached():
+    """Test that repeated groups of a service query Backstage once."""
+    backstage = FakeBackstage({"api": "team-a"})
+    router = _router(backstage)
+
+    for _ in range(5):
+        assert await router._get_service_owners(_group("api")) == ["team-a"]
+
+    assert len(backstage.requests) == 1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_unknown_services_are_negatively_cached():
+    """Test that a service missing from the catalog is not looked up again until its entry expires."""
+    backstage = FakeBackstage({})
+    router = _router(backstage)
+
+    assert await router._get_service_owners(_group("ghost")) == []
+    assert await router._get_service_owners(_group("ghost")) == []
+
+    assert len(backstage.requests) == 1
+    owner, expires_at = router._owner_cache["ghost"]
+    assert owner is None
+    assert expires_at < time.monotonic() + 120
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_distinct_services_are_looked_up_concurrently():
+    """Test that the services of a group are resolved in parallel and shared between groups."""
+    backstage = FakeBackstage({"a": "team-a", "b": "team-b", "c": "team-c"}, delay=0.05)
+    router = _router(backstage)
+
+    results = await asyncio.gather(
+        router._get_service_owners(_group("a", "b", "c")), router._get_service_owners(_group("a", "b"))
+    )
+
+    assert sorted(results[0]) == ["team-a", "team-b", "team-c"]
+    assert sorted(results[1]) == ["team-a", "team-b"]
+    assert backstage.max_in_flight == 3
+    assert len(backstage.requests) == 3
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_expired_owner_is_served_while_refreshed():
+    """Test that an expired entry is returned at once and refreshed in the background."""
+    backstage = FakeBackstage({"api": "team-b"})
+    router = _router(backstage)
+    router._owner_cache["api"] = ("team-a", time.monotonic() - 1)
+
+    assert await router._get_service_owners(_group("api")) == ["team-a"]
+    await asyncio.gather(*router._owner_lookups.values())
+
+    assert await router._get_service_owners(_group("api")) == ["team-b"]
+    assert len(backstage.requests) == 1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_known_owner_kept_when_backstage_fails():
+    """Test that a Backstage error does not discard a cached owner."""
+
+    def failing(request):
+        return httpx.Response(503)
+
+    router = AlertRouter(
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(failing)), backstage_url=BACKSTAGE_URL
+    )
+    router._owner_cache["api"] = ("team-a", time.monotonic() - 1)
+
+    await router._fetch_owner("api")
+
+    assert router._owner_cache["api"][0] == "team-a"
+    assert await router._get_service_owners(_group("api")) == ["team-a"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_prefetch_fills_cache():
+    """Test that prefetching the catalog avoids per-service lookups."""
+    backstage = FakeBackstage({"a": "team-a", "b": "team-b"})
+    router = _router(backstage)
+
+    assert await router.prefetch_owners() == 2
+    assert sorted(await router._get_service_owners(_group("a", "b"))) == ["team-a", "team-b"]
+
+    assert backstage.requests == ["/api/catalog/entities"]
+
+
+class FakeChannels:
+    """Notification endpoints answering with a fixed status after a delay."""
+
+    def __init__(self, status: dict[str, int], delay: float = 0.0):
+        self.status = status
+        self.delay = delay
+        self.received: list[tuple[str, dict]] = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.delay)
+        channel = request.url.host.split(".")[-2]
+        self.received.append((channel, json.loads(request.content)))
+        return httpx.Response(self.status[channel])
+
+
+def _notifying_router(channels: FakeChannels) -> AlertRouter:
+    router = AlertRouter(
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(channels)),
+        backstage_url=BACKSTAGE_URL,
+        mattermost_webhook="http://hooks.mattermost.test/hook",
+        slack_webhook="http://hooks.slack.test/hook",
+        pagerduty_api_key="routing-key",
+        redis_client=fakeredis.FakeAsyncRedis(decode_responses=True),
+    )
+    router._owner_cache["api"] = ("team-a", time.monotonic() + 600)
+    return router
+
+
+def _critical_group() -> dict:
+    return {"id": "group-1", "priority_score": 9.0, "count": 1, **_group("api")}
+
+
+@pytest.fixture
+def pagerduty_url(monkeypatch):
+    monkeypatch.setattr(routing, "PAGERDUTY_EVENTS_URL", "http://events.pagerduty.test/v2/enqueue")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_channels_are_notified_concurrently(pagerduty_url):
+    """Test that P0 routing takes as long as the slowest channel, not the sum."""
+    channels = FakeChannels({"pagerduty": 202, "slack": 200, "mattermost": 200}, delay=0.2)
+    router = _notifying_router(channels)
+
+    start = time.perf_counter()
+    routed = await router.route_alert_group(_critical_group())
+
+    assert time.perf_counter() - start < 0.4
+    assert routed == ["pagerduty", "slack", "mattermost"]
+    assert dict(channels.received)["pagerduty"]["routing_key"] == "routing-key"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_failed_delivery_is_queued_and_retried(pagerduty_url):
+    """Test that a failed channel is queued with backoff and delivered by the retry worker."""
+    channels = FakeChannels({"pagerduty": 500, "slack": 200, "mattermost": 200})
+    router = _notifying_router(channels)
+
+    assert await router.route_alert_group(_critical_group()) == ["slack", "mattermost"]
+
+    [(entry, due)] = await router.redis.zrange(routing.RETRY_QUEUE_KEY, 0, -1, withscores=True)
+    assert json.loads(entry)["attempt"] == 1
+    assert "routing_key" not in json.loads(entry)["message"]
+    assert due == pytest.approx(time.time() + routing.NOTIFICATION_RETRY_BASE_DELAY, abs=1)
+
+    # Not due yet
+    assert await router.retry_due_notifications() == 0
+
+    channels.status["pagerduty"] = 202
+    await router.redis.zadd(routing.RETRY_QUEUE_KEY, {entry: 0})
+    assert await router.retry_due_notifications() == 1
+    assert await router.redis.zcard(routing.RETRY_QUEUE_KEY) == 0
+    assert channels.received[-1] == ("pagerduty", {"routing_key": "routing-key", **json.loads(entry)["message"]})
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_retries_back_off_then_dead_letter(pagerduty_url, monkeypatch):
+    """Test that each failed retry doubles the delay until the message is given up."""
+    monkeypatch.setattr(routing, "NOTIFICATION_MAX_ATTEMPTS", 3)
+    channels = FakeChannels({"pagerduty": 500, "slack": 500, "mattermost": 200})
+    router = _notifying_router(channels)
+    await router._enqueue_retry("slack", {"text": "down"}, "group-1")
+
+    for attempt in (2, 3):
+        [(entry, _)] = await router.redis.zrange(routing.RETRY_QUEUE_KEY, 0, -1, withscores=True)
+        await router.redis.zadd(routing.RETRY_QUEUE_KEY, {entry: 0})
+        assert await router.retry_due_notifications() == 0
+
+        if attempt < 3:
+            [(entry, due)] = await router.redis.zrange(routing.RETRY_QUEUE_KEY, 0, -1, withscores=True)
+            assert json.loads(entry)["attempt"] == attempt
+            assert due == pytest.approx(time.time() + routing.NOTIFICATION_RETRY_BASE_DELAY * 2, abs=1)
+
+    assert await router.redis.zcard(routing.RETRY_QUEUE_KEY) == 0
+    [dead] = await router.redis.lrange(routing.DEAD_LETTER_KEY, 0, -1)
+    assert json.loads(dead)["message"] == {"text": "down"}
@@ -0,0 +1,183 @@
+"""Unit tests for alert suppression engine."""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+from app import suppression
+from app.suppression import CompiledRule, SuppressionEngine
+
+
+@pytest.fixture
+def engine():
+    """Create suppression engine instance."""
+    return SuppressionEngine(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+def _group(alertname: str, service: str = "api-gateway", severity: str = "critical") -> dict:
+    labels = {"alertname": alertname, "service": service, "severity": severity}
+    return {"grouping_key": f"{service}:{alertname}:{severity}", "alerts": [{"labels": labels}]}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_known_issue_matches_pattern_and_service(engine):
+    """Test that a known issue suppresses matching alerts of its services only."""
+    await engine.add_rule(
+        {"name": "db", "type": "known_issue", "alert_pattern": "DatabaseConnection.*", "services": ["api-gateway"]}
+    )
+
+    assert await engine.should_suppress(_group("DatabaseConnectionLost")) == (True, "known_issue: db")
+    assert await engine.should_suppress(_group("DatabaseConnectionLost", service="billing")) == (False, None)
+    assert await engine.should_suppress(_group("HighLatency")) == (False, None)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_known_issue_expiry(engine):
+    """Test that expired known issues stop suppressing, whether expiry is a string or a datetime."""
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    await engine.add_rule(
+        {"name": "old", "type": "known_issue", "alert_pattern": "A", "expires_at": "2020-01-01T00:00:00Z"}
+    )
+    await engine.add_rule({"name": "older", "type": "known_issue", "alert_pattern": "A", "expires_at": past})
+    await engine.add_rule({"name": "current", "type": "known_issue", "alert_pattern": "A", "expires_at": "2999-01-01"})
+
+    assert await engine.should_suppress(_group("A")) == (True, "known_issue: current")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_first_matching_rule_wins_across_index(engine):
+    """Test that rules keep their order whether they are service scoped or not."""
+    await engine.add_rule({"name": "off-hours", "type": "time_based", "suppress_hours": list(range(24))})
+    await engine.add_rule(
+        {"name": "known", "type": "known_issue", "alert_pattern": "Disk", "services": ["api-gateway"]}
+    )
+
+    assert await engine.should_suppress(_group("DiskFull", severity="low")) == (True, "time_based: off-hours")
+    assert await engine.should_suppress(_group("DiskFull")) == (True, "known_issue: known")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_candidate_rules_only_include_applicable_rules(engine):
+    """Test that a group is only evaluated against rules indexed for its service and alertname."""
+    for i in range(50):
+        await engine.add_rule(
+            {"name": f"issue-{i}", "type": "known_issue", "alert_pattern": "X", "services": [f"s{i}"]}
+        )
+    await engine.add_rule(
+        {"name": "cascade", "type": "cascade", "root_cause_alert": "DatabaseDown", "dependent_alerts": ["X"]}
+    )
+    await engine.add_rule({"name": "flapping", "type": "flapping", "alert_pattern": "Network.*"})
+
+    names = [rule.name for rule in engine._group_candidate_rules(_group("X", service="s7"))]
+
+    assert names == ["issue-7", "cascade"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_invalid_and_disabled_rules_are_skipped(engine):
+    """Test that a broken or disabled rule does not stop the others from applying."""
+    await engine.add_rule({"name": "broken", "type": "known_issue", "alert_pattern": "(unclosed"})
+    await engine.add_rule({"name": "disabled", "type": "known_issue", "alert_pattern": "A", "enabled": False})
+    await engine.add_rule({"name": "valid", "type": "known_issue", "alert_pattern": "A"})
+
+    assert await engine.should_suppress(_group("A")) == (True, "known_issue: valid")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_rule_changes_rebuild_index(engine):
+    """Test that updated and deleted rules take effect immediately."""
+    await engine.add_rule({"id": "r1", "name": "known", "type": "known_issue", "alert_pattern": "A"})
+    assert (await engine.should_suppress(_group("A")))[0]
+
+    await engine.update_rule({"id": "r1", "name": "known", "type": "known_issue", "alert_pattern": "B"})
+    assert not (await engine.should_suppress(_group("A")))[0]
+    assert (await engine.should_suppress(_group("B")))[0]
+
+    await engine.delete_rule("r1")
+    assert not (await engine.should_suppress(_group("B")))[0]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_cascade_suppresses_dependents_while_root_cause_active(engine):
+    """Test that dependent alerts are suppressed after the root cause fires."""
+    await engine.add_rule(
+        {"name": "db", "type": "cascade", "root_cause_alert": "DatabaseDown", "dependent_alerts": ["HighLatency"]}
+    )
+
+    assert await engine.should_suppress(_group("HighLatency")) == (False, None)
+    assert await engine.should_suppress(_group("DatabaseDown")) == (False, None)
+    assert await engine.should_suppress(_group("HighLatency")) == (True, "cascade: db")
+
+
+@pytest.mark.unit
+def test_maintenance_window_boundaries_computed_once_per_window():
+    """Test that cron boundaries are only recomputed when the next window starts."""
+    rule = CompiledRule({"name": "mw", "type": "maintenance_window", "schedule": "0 2 * * *", "duration": 3600}, 0)
+    start = datetime(2026, 1, 5, 2, 0, tzinfo=timezone.utc)
+
+    with patch.object(suppression, "croniter", wraps=suppression.croniter) as cron:
+        assert rule.in_maintenance_window(start + timedelta(minutes=10))
+        assert rule.in_maintenance_window(start + timedelta(minutes=59))
+        assert not rule.in_maintenance_window(start + timedelta(hours=5))
+        assert cron.call_count == 2
+
+        assert rule.in_maintenance_window(start + timedelta(days=1, minutes=1))
+        assert cron.call_count == 4
+
+
+@pytest.mark.unit
+def test_maintenance_window_starts_exactly_on_schedule():
+    """Test that a check right on the cron start falls within the window that starts then."""
+    rule = CompiledRule({"name": "mw", "type": "maintenance_window", "schedule": "0 2 * * *", "duration": 3600}, 0)
+    start = datetime(2026, 1, 5, 2, 0, tzinfo=timezone.utc)
+
+    assert rule.in_maintenance_window(start)
+    assert rule.in_maintenance_window(start + timedelta(minutes=30))
+    assert not rule.in_maintenance_window(start + timedelta(hours=1))
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_flapping_counts_occurrences_within_each_rule_window(engine):
+    """Test that each flapping rule compares the occurrences within its own window against its threshold."""
+    await engine.add_rule({"name": "fast", "type": "flapping", "alert_pattern": "Net.*", "threshold": 2, "window": 60})
+    await engine.add_rule({"name": "slow", "type": "flapping", "alert_pattern": "Net.*", "threshold": 2, "window": 600})
+    five_minutes_ago = datetime.now(timezone.utc).timestamp() - 300
+    await engine.redis.zadd("flapping:api-gateway:NetworkFlapping:critical", {"earlier": five_minutes_ago})
+
+    assert await engine.should_suppress(_group("NetworkFlapping")) == (True, "flapping: slow")
+    assert await engine.should_suppress(_group("NetworkFlapping")) == (True, "flapping: fast")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_flapping_rules_share_one_redis_call(engine):
+    """Test that all flapping rules of a group cost a single round trip once the script is loaded."""
+    for i in range(5):
+        await engine.add_rule({"name": f"flapping-{i}", "type": "flapping", "threshold": 10 + i})
+    await engine.should_suppress(_group("Warmup"))
+
+    with patch.object(engine.redis, "execute_command", wraps=engine.redis.execute_command) as execute_command:
+        assert await engine.should_suppress(_group("NetworkFlapping")) == (False, None)
+
+    assert execute_command.call_count == 1
+    assert await engine.redis.zcard("flapping:api-gateway:NetworkFlapping:critical") == 1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_flapping_ignores_groups_suppressed_by_other_rules(engine):
+    """Test that no occurrence is recorded for a group another rule suppresses, whatever the rule order."""
+    await engine.add_rule({"name": "flapping", "type": "flapping", "threshold": 1})
+    await engine.add_rule({"name": "db", "type": "known_issue", "alert_pattern": "DatabaseConnection.*"})
+
+    assert await engine.should_suppress(_group("DatabaseConnectionLost")) == (True, "known_issue: db")
+    assert await engine.redis.exists("flapping:api-gateway:DatabaseConnectionLost:critical") == 0